@@ -0,0 +1,74 @@
+'''
+Benchmark of the evaluation of formulae on lasso traces.
+The refinement check of two contracts is evaluated on random lassos with
+the scalar evaluator and with the numpy batch evaluator, and the number
+of trace evaluations per second is reported.
+Does not require nuxmv. Requires numpy.
+
+Usage: python benchmarks/bench_batch_evaluation.py [batch_size]
+
+Author: Antonio Iannopollo
+'''
+
+import sys
+from time import time
+import numpy as np
+from pycolite.contract import Contract
+from pycolite.nuxmv import NuxmvRefinementStrategy
+from pycolite.formula import Conjunction
+from pycolite.formula_analysis import get_literals, post_order
+from pycolite.lasso import LassoFalsifier, evaluate
+from pycolite.batch_evaluation import random_batch, evaluate_batch
+
+
+def check_formula():
+    '''
+    Returns the formula checked to verify a valid refinement
+    '''
+    abstract = Contract('A', ['a', 'b', ('x', 0, 15)], ['c', 'd', ('y', 0, 31)],
+                        'G(a -> F(b)) & G(x <= 10)',
+                        'G(a -> X(c)) & G(y >= x) & GF(d)')
+    refined = Contract('R', ['a', 'b', ('x', 0, 15)], ['c', 'd', ('y', 0, 31)],
+                       'G(x <= 12)',
+                       'G(a -> X(c)) & G(y >= x + 1) & G(d | X(d))')
+    refined.connect_to_port(refined.a, abstract.a)
+    refined.connect_to_port(refined.b, abstract.b)
+    refined.connect_to_port(refined.x, abstract.x)
+    refined.connect_to_port(refined.c, abstract.c)
+    refined.connect_to_port(refined.d, abstract.d)
+    refined.connect_to_port(refined.y, abstract.y)
+
+    strategy = NuxmvRefinementStrategy(refined)
+    return Conjunction(strategy._get_assumptions_check_formula(abstract),
+                       strategy._get_guarantee_check_formula(abstract))
+
+
+def main(batch_size):
+    '''
+    runs the benchmark
+    '''
+    formula = check_formula()
+    literals = get_literals(formula)
+
+    falsifier = LassoFalsifier(seed=0)
+    lassos = [falsifier.random_lasso(literals) for _ in range(2000)]
+    start = time()
+    for lasso in lassos:
+        evaluate(formula, lasso)
+    scalar_rate = len(lassos) / (time() - start)
+
+    rand = np.random.RandomState(0)
+    repetitions = 20
+    start = time()
+    for _ in range(repetitions):
+        evaluate_batch(formula, random_batch(literals, batch_size, 6, rand))
+    batch_rate = repetitions * batch_size / (time() - start)
+
+    print 'formula size: %d nodes, %d variables' % (len(post_order(formula)),
+                                                    len(literals))
+    print 'scalar: %.0f traces/s' % scalar_rate
+    print 'batch (%d traces): %.0f traces/s' % (batch_size, batch_rate)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4096)
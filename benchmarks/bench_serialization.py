@@ -0,0 +1,88 @@
+'''
+Benchmark of the serialization of contracts.
+Contracts with growing formulae are pickled with the compact format of the
+serialization module, deep copied with and without the __reduce__ hooks
+and copied with Contract.copy, and times and sizes are reported.
+The __reduce__ hooks make deepcopy go through the compact format as well,
+thus the plain deep copy, without the hooks, is the baseline. It is
+reported as failing if it cannot complete (e.g., formulae deeper than the
+recursion limit).
+Does not require nuxmv.
+
+Usage: python benchmarks/bench_serialization.py [max_size]
+
+Author: Antonio Iannopollo
+'''
+
+import sys
+import cPickle
+from copy import deepcopy
+from time import time
+from pycolite.contract import Contract
+from pycolite.formula import LTLFormula
+
+
+def contract(size):
+    '''
+    Returns a contract whose guarantee is a conjunction of size clauses
+    '''
+    inputs = ['i%d' % index for index in range(size)]
+    outputs = ['o%d' % index for index in range(size)]
+    guarantee = ' & '.join(['G(i%d -> X(o%d))' % (index, index)
+                            for index in range(size)])
+
+    return Contract('C', inputs, outputs, 'true', guarantee)
+
+
+def plain_deepcopy(obj):
+    '''
+    Deep copies obj without the __reduce__ hooks
+    '''
+    hooks = (LTLFormula.__reduce__.im_func, Contract.__reduce__.im_func)
+    del LTLFormula.__reduce__
+    del Contract.__reduce__
+    try:
+        return deepcopy(obj)
+    finally:
+        (LTLFormula.__reduce__, Contract.__reduce__) = hooks
+
+
+def timed(function, repetitions):
+    '''
+    Returns the average time of function, in milliseconds, and its result
+    '''
+    start = time()
+    for _ in range(repetitions):
+        result = function()
+    return ((time() - start) * 1000. / repetitions, result)
+
+
+def main(max_size):
+    '''
+    runs the benchmark
+    '''
+    size = 8
+    while size <= max_size:
+        obj = contract(size)
+        repetitions = max(1, 256 / size)
+
+        (dump_time, data) = timed(lambda: cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL),
+                                  repetitions)
+        (load_time, _) = timed(lambda: cPickle.loads(data), repetitions)
+        (deepcopy_time, _) = timed(lambda: deepcopy(obj), repetitions)
+        (copy_time, _) = timed(obj.copy, repetitions)
+        try:
+            (plain_time, _) = timed(lambda: plain_deepcopy(obj), repetitions)
+            plain = '%.2f ms' % plain_time
+        except RuntimeError as error:
+            plain = 'failed (%s)' % error
+
+        print '%d clauses: compact dump %.2f ms, load %.2f ms, %d bytes; ' \
+              'deepcopy %.2f ms; plain deepcopy %s; copy %.2f ms' % \
+              (size, dump_time, load_time, len(data), deepcopy_time, plain,
+               copy_time)
+        size *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 256)
@@ -0,0 +1,75 @@
+'''
+Benchmark of the static BDD variable ordering on composed contracts.
+A chain of components is composed, and compatibility, consistency and
+refinement of the composition are checked with the alphabetical ordering
+and with the ordering derived from the contract structure.
+Requires nuxmv to be configured (see README.md).
+
+Usage: python benchmarks/bench_variable_ordering.py [max_chain_length]
+
+Author: Antonio Iannopollo
+'''
+
+import sys
+from time import time
+from pycolite.contract import Contract, CompositionMapping
+from pycolite.nuxmv import (NuxmvCompatibilityStrategy, NuxmvConsistencyStrategy,
+                            NuxmvRefinementStrategy, NUXMV_ENGINES)
+
+
+def chain(length):
+    '''
+    Returns a composition of length components, where the output of each
+    component is connected to the input of the next one
+    '''
+    components = [Contract('stage%d' % index, ['i', 'x'], ['o', 'y'],
+                           'G(F(i))',
+                           'G(i -> X(o)) & G(x -> F(y)) & G(o -> X(!o))')
+                  for index in range(length)]
+
+    mapping = CompositionMapping(components)
+    for (index, component) in enumerate(components):
+        mapping.add(component.x, 'x%d' % index)
+        mapping.add(component.y, 'y%d' % index)
+        if index > 0:
+            mapping.connect(components[index - 1].o, component.i,
+                            'w%d' % index)
+
+    mapping.add(components[0].i, 'i')
+    mapping.add(components[-1].o, 'o')
+
+    return components[0].compose(components[1:], composition_mapping=mapping)
+
+
+def run(strategy, check, *args):
+    '''
+    returns the time needed to run check
+    '''
+    start = time()
+    getattr(strategy, check)(*args)
+    return time() - start
+
+
+def main(max_length):
+    '''
+    run the benchmark
+    '''
+    print 'length  engine       check          alpha    static'
+    for length in range(2, max_length + 1):
+        composition = chain(length)
+        abstract = composition.copy()
+
+        for engine in ('bdd', 'bdd_dynamic'):
+            for (strategy_cls, check, args) in \
+                    ((NuxmvCompatibilityStrategy, 'check_compatibility', ()),
+                     (NuxmvConsistencyStrategy, 'check_consistency', ()),
+                     (NuxmvRefinementStrategy, 'check_refinement', (abstract,))):
+                times = [run(strategy_cls(composition, engine=NUXMV_ENGINES[engine],
+                                          static_ordering=static), check, *args)
+                         for static in (False, True)]
+                print '%6d  %-11s  %-13s  %7.3f  %7.3f' % ((length, engine, check[6:])
+                                                            + tuple(times))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6)
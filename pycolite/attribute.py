@@ -4,16 +4,58 @@ Attributes are interesting animals.
 In fact, we need a machanism to provide new literals, as well as
 a mechanism to merge different attributes into the same one.
 This module uses the observer pattern.
+Naming and merging are serialized by locks, so that attributes can be
+created and merged from several threads.
 
 Author: Antonio Iannopollo
 '''
 
+from contextlib import contextmanager
+from threading import Lock, RLock, local
+from weakref import ref
 from pycolite.observer import Subject
 
+class _UidCounter(object):
+    '''
+    Counter of the integer identities of the attributes, which can be
+    advanced past the uids of another process
+    '''
+
+    def __init__(self):
+        '''
+        constructor
+        '''
+        self.value = 0
+        self.lock = Lock()
+
+    def next(self):
+        '''
+        Returns the next uid
+        '''
+        with self.lock:
+            value = self.value
+            self.value += 1
+        return value
+
+    def advance(self, value):
+        '''
+        Makes sure that the next uids are not lower than value
+        '''
+        with self.lock:
+            self.value = max(self.value, value)
+
+_UIDS = _UidCounter()
+
+#serializes merges, since notifications update the formulae observing
+#the merged attributes
+_MERGE_LOCK = RLock()
+
 class UniqueIdExtractor(object):
     '''
     This class returns a unique integer associated un a give object.
     It is use to generate unique attribute names.
+    Counters of objects which can be weakly referenced are released when
+    the objects are garbage collected.
     '''
 
     def __init__(self):
@@ -23,6 +65,7 @@ class UniqueIdExtractor(object):
 
         self.__index = 0
         self.__dictionary = {}
+        self.__references = {}
 
 
     def get_id(self, registering_obj = None, reset = False):
@@ -36,17 +79,163 @@ class UniqueIdExtractor(object):
 
         if (obj_id not in self.__dictionary) or reset:
             self.__dictionary[obj_id] = self.__index
+            self._watch(obj_id, registering_obj)
         else:
             self.__dictionary[obj_id] +=  1
 
         return self.__dictionary[obj_id]
 
+    def _watch(self, obj_id, registering_obj):
+        '''
+        releases the counter of registering_obj when it is garbage collected,
+        since its id can be reused
+        '''
+        if registering_obj is None or obj_id in self.__references:
+            return
+
+        def release(_, dictionary=self.__dictionary, references=self.__references):
+            '''
+            weak reference callback
+            '''
+            dictionary.pop(obj_id, None)
+            references.pop(obj_id, None)
+
+        try:
+            self.__references[obj_id] = ref(registering_obj, release)
+        except TypeError:
+            #the object cannot be weakly referenced
+            pass
+
+    def last_id(self, registering_obj=None):
+        '''
+        Returns the last integer returned for registering_obj, or None
+        '''
+        return self.__dictionary.get(id(registering_obj))
+
+    def advance(self, value, registering_obj=None):
+        '''
+        Makes sure that the next integers returned for registering_obj are
+        greater than value
+        '''
+        obj_id = id(registering_obj)
+        if self.__dictionary.get(obj_id, value - 1) < value:
+            self.__dictionary[obj_id] = value
+            self._watch(obj_id, registering_obj)
+
+    def restore(self, obj_id, last_id):
+        '''
+        Sets back the counter of the object whose id is obj_id to last_id,
+        the value returned by last_id before it changed. Counters already
+        released are left alone
+        '''
+        if obj_id not in self.__dictionary:
+            return
+        if last_id is None:
+            del self.__dictionary[obj_id]
+        else:
+            self.__dictionary[obj_id] = last_id
+
+    def __len__(self):
+        '''
+        number of counters
+        '''
+        return len(self.__dictionary)
+
+
+class NamingScope(object):
+    '''
+    Naming state of AttributeNamePool. The counters of the root scope are
+    shared by all the scopes of all the threads, so that names generated in
+    different scopes differ. A scope records the counters it advances, and
+    sets them back when it ends, provided no name was generated out of it
+    in the meantime. compact is the naming mode of the scope, inherited
+    from the parent if None.
+    In compact mode, names are built from the uids of the attributes, thus
+    the compact counter is shared by all the scopes
+    '''
+
+    def __init__(self, parent=None, compact=None):
+        '''
+        constructor
+        '''
+        self.parent = parent
+        #extractors used by the scope, by base name. Only the root scope
+        #owns its extractors
+        self.extractors = {}
+        #tuples (extractor, object id, last id) for the names generated in
+        #the scope, and value of the generation counter of the pool when
+        #the scope was opened
+        self.generated = []
+        self.generation = 0
+        if compact is None and parent is not None:
+            compact = parent.compact
+        self.compact = compact
+
+    @property
+    def counter(self):
+        '''
+        the next integer of the compact mode
+        '''
+        return _UIDS.value
+
+    def extractor(self, base_name):
+        '''
+        Returns the UniqueIdExtractor for base_name
+        '''
+        try:
+            return self.extractors[base_name]
+        except KeyError:
+            extractor = UniqueIdExtractor()
+            self.extractors[base_name] = extractor
+            return extractor
+
+
 class AttributeNamePool(object):
     '''
-    This class is used to generate unique names starting from a base string
+    This class is used to generate unique names starting from a base string.
+    All the scopes share the same counters, thus names are unique among
+    the attributes created in any scope of any thread. When a scope ends,
+    its counters are released, and names can be reused, unless names were
+    generated out of the scope while it was open. Attributes created in a
+    scope must not be mixed with attributes created after the scope ends.
+    Each thread has its own stack of scopes, rooted at the scope shared by
+    all the threads, thus scopes opened by a thread neither capture the
+    attributes nor change the mode of the other threads.
+    In compact mode, the integer appended to the base name is the uid of
+    the attribute, instead of a counter for each pair (base name, context),
+    and the name is only built when it is first used, e.g. when a model
+    is written. The
+    two modes can produce the same names, thus the mode should only be
+    changed when opening a scope or before creating any attribute.
+    compact is the mode used outside of the scopes which set one.
     '''
 
-    __dictionary = {}
+    __root = NamingScope()
+    __local = local()
+    __lock = RLock()
+    #number of the changes of the counters, used to tell if a scope is the
+    #last one which changed them
+    __generation = 0
+    compact = False
+
+    @classmethod
+    def _scopes(cls):
+        '''
+        Returns the stack of scopes of the calling thread
+        '''
+        try:
+            return cls.__local.scopes
+        except AttributeError:
+            cls.__local.scopes = [cls.__root]
+            return cls.__local.scopes
+
+    @classmethod
+    def is_compact(cls):
+        '''
+        True if the calling thread is naming attributes in compact mode
+        '''
+        mode = cls._scopes()[-1].compact
+        return cls.compact if mode is None else mode
 
     @classmethod
     def get_unique_name(cls, registering_obj = None, base_name = '', reset = False):
@@ -63,21 +252,112 @@ class AttributeNamePool(object):
         :param base_name: base string
         :type base_name: string
         '''
+        with cls.__lock:
+            scope = cls._scopes()[-1]
 
-        try:
-            number_extractor = cls.__dictionary[base_name]
-        except KeyError:
-            cls.__dictionary[base_name] = UniqueIdExtractor()
-            number_extractor = cls.__dictionary[base_name]
+            if cls.is_compact():
+                return '%s_%d' % (base_name, _UIDS.next())
 
+            number_extractor = cls.__root.extractor(base_name)
+            if scope is not cls.__root:
+                scope.extractors[base_name] = number_extractor
+                scope.generated.append((number_extractor, id(registering_obj),
+                                        number_extractor.last_id(registering_obj)))
 
-        obj_number = number_extractor.get_id(registering_obj, reset)
+            obj_number = number_extractor.get_id(registering_obj, reset)
+            cls.__generation += 1
 
         #if base_name != '' and obj_number == -1:
         #    return base_name
 
         return '%s_%d' % (base_name, obj_number)
 
+    @classmethod
+    @contextmanager
+    def scope(cls, compact=None):
+        '''
+        Context manager opening a naming scope in the calling thread, whose
+        counters are released when it ends, unless names were generated
+        out of it while it was open.
+
+        :param compact: if not None, enables or disables the compact mode
+            within the scope
+        :type compact: bool
+        '''
+        scopes = cls._scopes()
+        with cls.__lock:
+            scope = NamingScope(scopes[-1], compact)
+            scope.generation = cls.__generation
+        scopes.append(scope)
+        try:
+            yield scope
+        finally:
+            scopes.remove(scope)
+            with cls.__lock:
+                #scopes nested in this one have already been released
+                if cls.__generation == scope.generation + len(scope.generated):
+                    for (extractor, obj_id, last_id) in reversed(scope.generated):
+                        extractor.restore(obj_id, last_id)
+                    cls.__generation = scope.generation
+
+    @classmethod
+    def scope_depth(cls):
+        '''
+        Returns the number of naming scopes open in the calling thread
+        '''
+        return len(cls._scopes()) - 1
+
+    @classmethod
+    def reserve_name(cls, base_name, unique_name):
+        '''
+        Makes sure that the names generated from now on for base_name,
+        without context, differ from unique_name, e.g. the name of an
+        attribute created by another process. Names which do not end with
+        an integer are ignored, since they cannot be generated
+        '''
+        (prefix, _, suffix) = unique_name.rpartition('_')
+        if prefix != base_name or not suffix.isdigit():
+            return
+
+        value = int(suffix)
+        with cls.__lock:
+            cls.__root.extractor(base_name).advance(value)
+            _UIDS.advance(value + 1)
+            cls.__generation += 1
+
+    @classmethod
+    def naming_state(cls):
+        '''
+        Returns the state needed to keep generating fresh names in another
+        process, as a dictionary with the counters of the attributes without
+        context, by base name, and the next uid, which is also the compact
+        mode counter.
+        Counters of other contexts are not included, since contexts do not
+        outlive the process
+        '''
+        with cls.__lock:
+            names = {}
+            for (base_name, extractor) in cls.__root.extractors.items():
+                last_id = extractor.last_id()
+                if last_id is not None:
+                    names[base_name] = last_id
+
+            return {'names': names, 'uid': _UIDS.value}
+
+    @classmethod
+    def restore_naming_state(cls, state):
+        '''
+        Advances the counters of the root scope and the uids, so that
+        the names and uids generated from now on differ from the ones
+        generated before state was taken
+        '''
+        with cls.__lock:
+            root = cls.__root
+            for (base_name, last_id) in state['names'].items():
+                root.extractor(base_name).advance(last_id)
+            _UIDS.advance(state['uid'])
+            cls.__generation += 1
+
 
 class Attribute(Subject):
     '''
@@ -86,8 +366,16 @@ class Attribute(Subject):
     It can notify the referencing objects if two attribute are merged together.
     Whatever object is going to interact with a Attribute has to inherit from
     Observer.
+    Each attribute has an integer identity, uid, which is shared by the
+    attributes merged together and it is cheaper to compare than the unique
+    name. In compact mode, the unique name is built from the uid when it is
+    first used.
+    merge_count counts the merges of all the attributes, so that indexes
+    built on attributes can be invalidated when any of them is merged.
     '''
 
+    merge_count = 0
+
     def __init__(self, base_name, context = None):
         '''
         Create a new attribute, initializing the Subject class structures and
@@ -105,7 +393,28 @@ class Attribute(Subject):
         self.merging_attribute = None
         self.base_name = base_name
         self.context = context
-        self.unique_name = AttributeNamePool.get_unique_name(context, self.base_name)
+        self.uid = _UIDS.next()
+        if AttributeNamePool.is_compact():
+            self._unique_name = None
+        else:
+            self._unique_name = AttributeNamePool.get_unique_name(context,
+                                                                  self.base_name)
+
+    @property
+    def unique_name(self):
+        '''
+        unique name of the attribute
+        '''
+        if self._unique_name is None:
+            self._unique_name = '%s_%d' % (self.base_name, self.uid)
+        return self._unique_name
+
+    @unique_name.setter
+    def unique_name(self, unique_name):
+        '''
+        renames the attribute
+        '''
+        self._unique_name = unique_name
 
     def set_state(self, merging_attribute):
         '''
@@ -120,8 +429,10 @@ class Attribute(Subject):
         if merging_attribute == None:
             raise AttributeStateError('merging_attribute set to be None')
 
-        self.merging_attribute = merging_attribute
-        self.notify()
+        with _MERGE_LOCK:
+            Attribute.merge_count += 1
+            self.merging_attribute = merging_attribute
+            self.notify()
 
     def merge(self, merging_attribute):
         '''
@@ -138,6 +449,106 @@ class Attribute(Subject):
             raise AttributeStateError('requesting attribute state before it is set')
         return self.merging_attribute
 
+class MergeBatch(object):
+    '''
+    Collects merges of attributes and performs them at once.
+    Merges are resolved into equivalence classes with a union-find structure,
+    and each attribute is merged directly into the representative of its
+    class, thus its observers are updated once instead of following a chain
+    of merges. The representative is the attribute which the same merges,
+    performed one at a time, would end with.
+    '''
+
+    __local = local()
+
+    def __init__(self):
+        '''
+        constructor
+        '''
+        self.parents = {}
+
+    def _find(self, attribute):
+        '''
+        Returns the representative of the class of attribute
+        '''
+        root = attribute
+        while self.parents.get(root, root) is not root:
+            root = self.parents[root]
+
+        #path compression
+        while attribute is not root:
+            parent = self.parents[attribute]
+            self.parents[attribute] = root
+            attribute = parent
+
+        return root
+
+    def merge(self, attribute, merging_attribute):
+        '''
+        Records that attribute is merged into merging_attribute
+        '''
+        self.parents.setdefault(attribute, attribute)
+        self.parents.setdefault(merging_attribute, merging_attribute)
+
+        root = self._find(attribute)
+        merging_root = self._find(merging_attribute)
+        if root is not merging_root:
+            self.parents[root] = merging_root
+
+    def commit(self):
+        '''
+        Performs the recorded merges
+        '''
+        with _MERGE_LOCK:
+            for attribute in list(self.parents):
+                root = self._find(attribute)
+                if root is not attribute:
+                    attribute.merge(root)
+
+        self.parents.clear()
+
+    def __len__(self):
+        '''
+        number of attributes involved in the recorded merges
+        '''
+        return len(self.parents)
+
+    @classmethod
+    def active(cls):
+        '''
+        Returns the batch open in the calling thread, or None
+        '''
+        return getattr(cls.__local, 'batch', None)
+
+    @classmethod
+    @contextmanager
+    def open(cls):
+        '''
+        Context manager opening a batch in the calling thread, committed
+        when the block ends. If the block raises an exception, the merges
+        recorded in it are discarded. Batches opened within a batch join it:
+        their merges are committed with the outer batch, unless the inner
+        block raises an exception
+        '''
+        batch = cls.active()
+        if batch is not None:
+            parents = dict(batch.parents)
+            try:
+                yield batch
+            except:
+                batch.parents = parents
+                raise
+            return
+
+        batch = MergeBatch()
+        cls.__local.batch = batch
+        try:
+            yield batch
+        finally:
+            cls.__local.batch = None
+        batch.commit()
+
+
 class AttributeStateError(Exception):
     '''
     Exception returned if an Attribute is required his
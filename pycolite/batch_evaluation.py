@@ -0,0 +1,277 @@
+'''
+This module implements the evaluation of LTLFormula objects on batches of
+lasso traces using numpy.
+A batch of K lassos of length L is stored as one (K, L) array for each
+literal, and each lasso has its own loop start. Each subformula is
+evaluated on all the traces and positions at once.
+Shorter lassos are unrolled to length L, which does not change the infinite
+traces they represent.
+Requires numpy (pip install -e .[batch]).
+
+Author: Antonio Iannopollo
+'''
+
+import numpy as np
+from pycolite.formula import (TrueFormula, FalseFormula, Constant, Negation,
+                              Conjunction, Disjunction, Implication, Equivalence,
+                              Globally, Eventually, Next, Addition, Subtraction,
+                              Multiplication, Division, Ge, Geq, Le, Leq)
+from pycolite.formula_analysis import post_order, get_literals
+from pycolite.lasso import Lasso, LassoFalsifier, LassoError
+from pycolite.types import Int
+from pycolite import LOG
+
+
+class LassoBatch(object):
+    '''
+    Batch of lassos with the same length
+    '''
+
+    def __init__(self, arrays, loop_starts, length):
+        '''
+        constructor
+
+        :param arrays: dictionary mapping names to (K, L) arrays
+        :type arrays: dict
+        :param loop_starts: array of K loop starts
+        :type loop_starts: numpy array
+        :param length: number of states L of each lasso
+        :type length: int
+        '''
+        self.arrays = arrays
+        self.loop_starts = np.asarray(loop_starts, dtype=np.intp)
+        self.count = len(self.loop_starts)
+        self.length = length
+
+        positions = np.arange(self.length)
+        #successor of each position. From positions in the loop, all the
+        #loop is visited, thus they share the suffix starting at the loop start
+        self.successors = np.tile(positions + 1, (self.count, 1))
+        self.successors[:, -1] = self.loop_starts
+        self.loop_positions = np.minimum(positions[np.newaxis, :],
+                                         self.loop_starts[:, np.newaxis])
+        self.rows = np.arange(self.count)[:, np.newaxis]
+
+    @classmethod
+    def from_lassos(cls, lassos, names):
+        '''
+        Builds a batch from a list of Lasso objects, keeping only the given
+        names. Lassos are unrolled to the length of the longest one
+        '''
+        length = max([len(lasso) for lasso in lassos])
+        loop_starts = []
+        arrays = dict([(name, [None] * len(lassos)) for name in names])
+
+        for (index, lasso) in enumerate(lassos):
+            (indices, loop_start) = unrolled_indices(len(lasso), lasso.loop_start, length)
+            loop_starts.append(loop_start)
+            for name in names:
+                values = lasso.values(name)
+                arrays[name][index] = [values[position] for position in indices]
+
+        return cls(dict([(name, np.array(rows)) for (name, rows) in arrays.items()]),
+                   loop_starts, length)
+
+    def lasso(self, index):
+        '''
+        Returns the lasso with the given index as a Lasso object
+        '''
+        states = [dict([(name, array[index, position].item())
+                        for (name, array) in self.arrays.items()])
+                  for position in range(self.length)]
+
+        return Lasso(states, int(self.loop_starts[index]))
+
+    def __len__(self):
+        '''
+        number of lassos
+        '''
+        return self.count
+
+
+def unrolled_indices(length, loop_start, new_length):
+    '''
+    Returns the indices of the states of a lasso unrolled to new_length
+    states, and the new loop start
+    '''
+    if new_length < length:
+        raise LassoError('cannot shorten a lasso')
+
+    period = length - loop_start
+    indices = range(length) + [loop_start + (position - loop_start) % period
+                               for position in range(length, new_length)]
+    new_loop_start = loop_start + (new_length - loop_start) % period
+
+    return (indices, new_loop_start)
+
+
+def random_batch(literals, count, max_length, rand):
+    '''
+    Returns a batch of count random lassos with at most max_length states,
+    unrolled to max_length states
+
+    :param rand: random generator
+    :type rand: numpy.random.RandomState
+    '''
+    lengths = rand.randint(1, max_length + 1, size=count)
+    loop_starts = (rand.random_sample(count) * lengths).astype(np.intp)
+
+    #positions after the end of each lasso go back to its loop
+    positions = np.arange(max_length)[np.newaxis, :]
+    starts = loop_starts[:, np.newaxis]
+    periods = (lengths - loop_starts)[:, np.newaxis]
+    indices = np.where(positions < lengths[:, np.newaxis], positions,
+                       starts + (positions - starts) % periods)
+    rows = np.arange(count)[:, np.newaxis]
+
+    arrays = {}
+    for literal in literals:
+        if isinstance(literal.l_type, Int):
+            values = rand.randint(literal.l_type.lower, literal.l_type.upper + 1,
+                                  size=(count, max_length))
+        else:
+            values = rand.randint(0, 2, size=(count, max_length)).astype(np.bool_)
+        arrays[literal.unique_name] = values[rows, indices]
+
+    new_loop_starts = loop_starts + (max_length - loop_starts) % (lengths - loop_starts)
+
+    return LassoBatch(arrays, new_loop_starts, max_length)
+
+
+def _divide(left, right, valid):
+    '''
+    Integer division rounding toward zero. Traces dividing by zero are
+    marked as not valid
+    '''
+    zero = right == 0
+    valid &= ~zero.any(axis=1)
+    right = np.where(zero, 1, right)
+    quotient = np.abs(left) // np.abs(right)
+
+    return np.where((left < 0) != (right < 0), -quotient, quotient)
+
+
+_BINARY_OPERATIONS = {
+    Conjunction: np.logical_and,
+    Disjunction: np.logical_or,
+    Implication: lambda l, r: np.logical_or(np.logical_not(l), r),
+    Equivalence: np.equal,
+    Addition: np.add,
+    Subtraction: np.subtract,
+    Multiplication: np.multiply,
+    Ge: np.greater,
+    Geq: np.greater_equal,
+    Le: np.less,
+    Leq: np.less_equal,
+    }
+
+
+def evaluate_batch(formula, batch, name_of=None):
+    '''
+    Evaluates formula on all the lassos of batch.
+
+    :param name_of: function returning the name used in the batch for a
+        literal. By default, the unique name of the literal is used
+    :type name_of: function
+    :returns: tuple (values, valid) of boolean arrays with one element per
+        lasso. values tells if the lasso satisfies formula, valid is False
+        for lassos on which formula cannot be evaluated (division by zero)
+    '''
+    if name_of is None:
+        name_of = lambda literal: literal.unique_name
+
+    shape = (batch.count, batch.length)
+    valid = np.ones(batch.count, dtype=np.bool_)
+    values = {}
+
+    for node in post_order(formula):
+        if node.is_literal:
+            result = batch.arrays[name_of(node)]
+        elif isinstance(node, TrueFormula):
+            result = np.ones(shape, dtype=np.bool_)
+        elif isinstance(node, FalseFormula):
+            result = np.zeros(shape, dtype=np.bool_)
+        elif isinstance(node, Constant):
+            result = np.full(shape, int(node.value), dtype=np.int64)
+        elif isinstance(node, Negation):
+            result = np.logical_not(values[id(node.right_formula)])
+        elif isinstance(node, Next):
+            result = values[id(node.right_formula)][batch.rows, batch.successors]
+        elif isinstance(node, (Globally, Eventually)):
+            accumulate = np.logical_and if isinstance(node, Globally) else np.logical_or
+            child = values[id(node.right_formula)]
+            #suffix[k, i] combines the values of positions i..L-1
+            suffix = accumulate.accumulate(child[:, ::-1], axis=1)[:, ::-1]
+            result = suffix[batch.rows, batch.loop_positions]
+        elif isinstance(node, Division):
+            result = _divide(values[id(node.left_formula)],
+                             values[id(node.right_formula)], valid)
+        else:
+            try:
+                operation = _BINARY_OPERATIONS[type(node)]
+            except KeyError:
+                raise LassoError('cannot evaluate %s' % node.Symbol)
+            result = operation(values[id(node.left_formula)],
+                               values[id(node.right_formula)])
+
+        values[id(node)] = result
+
+    return (values[id(formula)][:, 0].astype(np.bool_), valid)
+
+
+class BatchLassoFalsifier(LassoFalsifier):
+    '''
+    LassoFalsifier evaluating all the candidate lassos at once
+    '''
+
+    def __init__(self, trace_count=1024, max_length=6, max_stored=256, seed=None):
+        '''
+        override constructor
+        '''
+        super(BatchLassoFalsifier, self).__init__(trace_count, max_length,
+                                                  max_stored, seed)
+        self.np_rand = np.random.RandomState(seed)
+
+    def find_witness(self, formula, names=None):
+        '''
+        Override of LassoFalsifier.find_witness
+        '''
+        if names is None:
+            names = {}
+
+        literals = get_literals(formula)
+        names = dict([(literal.unique_name,
+                       names.get(literal.unique_name, literal.unique_name))
+                      for literal in literals])
+        unique_names = [literal.unique_name for literal in literals]
+
+        if self.seen and literals:
+            stored = [self._complete(lasso, literals, names) for lasso in self.seen]
+            witness = self._first_witness(formula, LassoBatch.from_lassos(stored,
+                                                                          unique_names))
+            if witness is not None:
+                self.replayed_witnesses += 1
+                return witness
+
+        witness = self._first_witness(formula, random_batch(literals, self.trace_count,
+                                                            self.max_length,
+                                                            self.np_rand))
+        if witness is not None:
+            self.remember(witness.renamed(names))
+
+        return witness
+
+    def _first_witness(self, formula, batch):
+        '''
+        Returns the first lasso of batch violating formula, or None
+        '''
+        (satisfied, valid) = evaluate_batch(formula, batch)
+        violations = np.flatnonzero(valid & ~satisfied)
+        if violations.size == 0:
+            return None
+
+        witness = batch.lasso(violations[0])
+        LOG.debug('found lasso counterexample %s' % witness)
+        self.witnesses_found += 1
+
+        return witness
@@ -0,0 +1,211 @@
+'''
+This module contains a small reduced ordered binary decision diagram (ROBDD)
+package.
+Nodes are integers, indexing the arrays of a BDD manager. The two terminal
+nodes are BDD.FALSE and BDD.TRUE. All the operations are built on the
+if-then-else operator, which is memoized.
+
+Author: Antonio Iannopollo
+'''
+
+#maximum number of nodes of a BDD manager
+MAX_NODES = 200000
+
+
+class BDD(object):
+    '''
+    BDD manager
+    '''
+
+    FALSE = 0
+    TRUE = 1
+
+    def __init__(self, max_nodes=MAX_NODES):
+        '''
+        constructor
+
+        :param max_nodes: maximum number of nodes. BDDLimitError is raised
+            if an operation needs more nodes
+        :type max_nodes: int
+        '''
+        self.max_nodes = max_nodes
+        #terminal nodes are below all the variables
+        terminal_level = float('inf')
+        self.variables = [terminal_level, terminal_level]
+        self.lows = [self.FALSE, self.TRUE]
+        self.highs = [self.FALSE, self.TRUE]
+        self.unique_table = {}
+        self.ite_cache = {}
+        self.var_count = 0
+
+    def __len__(self):
+        '''
+        number of nodes
+        '''
+        return len(self.variables)
+
+    def new_var(self):
+        '''
+        Returns the BDD of a new variable, ordered after all the existing ones
+        '''
+        index = self.var_count
+        self.var_count += 1
+        return self.node(index, self.FALSE, self.TRUE)
+
+    def node(self, variable, low, high):
+        '''
+        Returns the node (variable ? high : low)
+        '''
+        if low == high:
+            return low
+
+        key = (variable, low, high)
+        try:
+            return self.unique_table[key]
+        except KeyError:
+            pass
+
+        if len(self.variables) >= self.max_nodes:
+            raise BDDLimitError('more than %d BDD nodes' % self.max_nodes)
+
+        index = len(self.variables)
+        self.variables.append(variable)
+        self.lows.append(low)
+        self.highs.append(high)
+        self.unique_table[key] = index
+
+        return index
+
+    def _cofactors(self, node, variable):
+        '''
+        Returns the cofactors of node with respect to variable
+        '''
+        if self.variables[node] == variable:
+            return (self.lows[node], self.highs[node])
+        return (node, node)
+
+    def ite(self, cond, then, other):
+        '''
+        Returns the BDD of (cond ? then : other)
+        '''
+        if cond == self.TRUE:
+            return then
+        if cond == self.FALSE:
+            return other
+        if then == other:
+            return then
+        if then == self.TRUE and other == self.FALSE:
+            return cond
+
+        key = (cond, then, other)
+        try:
+            return self.ite_cache[key]
+        except KeyError:
+            pass
+
+        variable = min(self.variables[cond], self.variables[then],
+                       self.variables[other])
+        (cond_low, cond_high) = self._cofactors(cond, variable)
+        (then_low, then_high) = self._cofactors(then, variable)
+        (other_low, other_high) = self._cofactors(other, variable)
+
+        result = self.node(variable,
+                           self.ite(cond_low, then_low, other_low),
+                           self.ite(cond_high, then_high, other_high))
+        self.ite_cache[key] = result
+
+        return result
+
+    def negation(self, node):
+        '''
+        Returns !node
+        '''
+        return self.ite(node, self.FALSE, self.TRUE)
+
+    def conjunction(self, left, right):
+        '''
+        Returns left & right
+        '''
+        return self.ite(left, right, self.FALSE)
+
+    def disjunction(self, left, right):
+        '''
+        Returns left | right
+        '''
+        return self.ite(left, self.TRUE, right)
+
+    def implication(self, left, right):
+        '''
+        Returns left -> right
+        '''
+        return self.ite(left, right, self.TRUE)
+
+    def equivalence(self, left, right):
+        '''
+        Returns left = right
+        '''
+        return self.ite(left, right, self.negation(right))
+
+    def conjunction_all(self, nodes):
+        '''
+        Returns the conjunction of all the nodes
+        '''
+        result = self.TRUE
+        for node in nodes:
+            result = self.conjunction(result, node)
+        return result
+
+    def disjunction_all(self, nodes):
+        '''
+        Returns the disjunction of all the nodes
+        '''
+        result = self.FALSE
+        for node in nodes:
+            result = self.disjunction(result, node)
+        return result
+
+    def restrict(self, node, assignment):
+        '''
+        Returns node with the variables in assignment replaced by their
+        values
+
+        :param assignment: dictionary mapping variable indices to booleans
+        :type assignment: dict
+        '''
+        cache = {}
+
+        def visit(current):
+            '''
+            recursive restriction
+            '''
+            if current <= self.TRUE:
+                return current
+            try:
+                return cache[current]
+            except KeyError:
+                pass
+
+            variable = self.variables[current]
+            if variable in assignment:
+                result = visit(self.highs[current] if assignment[variable]
+                               else self.lows[current])
+            else:
+                result = self.node(variable, visit(self.lows[current]),
+                                   visit(self.highs[current]))
+            cache[current] = result
+            return result
+
+        return visit(node)
+
+    def variable_index(self, node):
+        '''
+        Returns the variable index of node
+        '''
+        return self.variables[node]
+
+
+class BDDLimitError(Exception):
+    '''
+    Raised if a BDD manager exceeds its maximum number of nodes
+    '''
+    pass
@@ -0,0 +1,426 @@
+'''
+This module contains a representation of Buchi automata, a parser for the
+never claims produced by ltl3ba, and an in-process emptiness check.
+Formulae are translated after abstracting their maximal propositional
+subformulae as atoms p0 ... pn, thus the automaton only depends on the
+temporal skeleton of a formula and it can be shared among all the formulae
+with the same skeleton. Edge guards are cubes over the atoms, whose
+satisfiability is decided on the actual atoms with BDDs.
+
+Author: Antonio Iannopollo
+'''
+
+import re
+from pycolite.bdd import BDD, BDDLimitError
+from pycolite.formula import (TrueFormula, FalseFormula, Negation, Conjunction,
+                              Disjunction, Implication, Equivalence, Globally,
+                              Eventually, Next)
+from pycolite.formula_analysis import (post_order, children, canonical_form,
+                                       TEMPORAL_CLASSES)
+from pycolite.propositional import PropositionalEncoder, EncodingError
+
+ATOM_PREFIX = 'p'
+
+#operators of the skeleton, in ltl3ba syntax
+_SKELETON_BINARY = {
+    Conjunction: '&&',
+    Disjunction: '||',
+    Implication: '->',
+    Equivalence: '<->',
+    }
+
+_SKELETON_UNARY = {
+    Negation: '!',
+    Globally: 'G',
+    Eventually: 'F',
+    Next: 'X',
+    }
+
+_COMMENT_RE = re.compile(r'/\*.*?\*/')
+_LABEL_RE = re.compile(r'^(\w+)\s*:$')
+_EDGE_RE = re.compile(r'^::\s*(.*?)\s*->\s*goto\s+(\w+)$')
+_ATOM_RE = re.compile(r'^(!?)%s(\d+)$' % ATOM_PREFIX)
+_TRUE_GUARDS = ('1', 'true')
+_FALSE_GUARDS = ('0', 'false')
+
+
+class BuchiAutomaton(object):
+    '''
+    Buchi automaton whose edges are labelled with cubes over atoms.
+    A cube is a sorted tuple of pairs (atom index, value)
+    '''
+
+    def __init__(self, initial, accepting, transitions):
+        '''
+        constructor
+
+        :param initial: initial state
+        :param accepting: set of accepting states
+        :type accepting: set
+        :param transitions: dictionary mapping each state to a list of
+            pairs (cube, target)
+        :type transitions: dict
+        '''
+        self.initial = initial
+        self.accepting = frozenset(accepting)
+        self.transitions = transitions
+
+    @property
+    def states(self):
+        '''
+        list of states
+        '''
+        return self.transitions.keys()
+
+    def edges(self, state):
+        '''
+        Returns the list of pairs (cube, target) leaving state
+        '''
+        return self.transitions.get(state, [])
+
+    def successors(self, state, feasible=None):
+        '''
+        Returns the targets of the edges leaving state whose cube is
+        feasible
+        '''
+        return [target for (cube, target) in self.edges(state)
+                if feasible is None or feasible(cube)]
+
+    def is_empty(self, feasible=None):
+        '''
+        Returns True if the language of the automaton is empty, considering
+        only the edges whose cube is feasible
+        '''
+        return not has_accepting_cycle([self.initial],
+                                       lambda state: self.successors(state, feasible),
+                                       self.accepting.__contains__)
+
+    def __len__(self):
+        '''
+        number of states
+        '''
+        return len(self.transitions)
+
+
+class ProductAutomaton(object):
+    '''
+    Synchronous product of two Buchi automata, whose language is the
+    intersection of their languages. The atoms of the right automaton are
+    shifted by offset, so that the cubes of the product are over the atoms
+    of both. States are triples (left state, right state, turn) and are
+    built on the fly: turn is 0 while waiting for an accepting state of the
+    left automaton, and 1 while waiting for one of the right automaton
+    '''
+
+    def __init__(self, left, right, offset):
+        '''
+        constructor
+
+        :param offset: number of atoms of the left automaton
+        :type offset: int
+        '''
+        self.left = left
+        self.right = right
+        self.offset = offset
+        self.initial = (left.initial, right.initial, 0)
+
+    def _turn(self, state):
+        '''
+        Returns the turn of the successors of state
+        '''
+        (left_state, right_state, turn) = state
+        if turn == 0 and left_state in self.left.accepting:
+            return 1
+        elif turn == 1 and right_state in self.right.accepting:
+            return 0
+        return turn
+
+    def edges(self, state):
+        '''
+        Returns the list of pairs (cube, target) leaving state
+        '''
+        (left_state, right_state, _) = state
+        turn = self._turn(state)
+        shifted = [(tuple([(index + self.offset, value) for (index, value) in cube]),
+                    target) for (cube, target) in self.right.edges(right_state)]
+
+        return [(left_cube + right_cube, (left_target, right_target, turn))
+                for (left_cube, left_target) in self.left.edges(left_state)
+                for (right_cube, right_target) in shifted]
+
+    def successors(self, state, feasible=None):
+        '''
+        Returns the targets of the edges leaving state whose cube is
+        feasible
+        '''
+        return [target for (cube, target) in self.edges(state)
+                if feasible is None or feasible(cube)]
+
+    def is_accepting(self, state):
+        '''
+        Returns True if state is accepting
+        '''
+        return state[2] == 0 and state[0] in self.left.accepting
+
+    def is_empty(self, feasible=None):
+        '''
+        Returns True if the intersection of the languages is empty,
+        considering only the edges whose cube is feasible
+        '''
+        return not has_accepting_cycle([self.initial],
+                                       lambda state: self.successors(state, feasible),
+                                       self.is_accepting)
+
+
+def _parse_guard(guard):
+    '''
+    Returns the list of cubes of a guard in disjunctive normal form
+    '''
+    cubes = []
+    for disjunct in guard.split('||'):
+        cube = {}
+        feasible = True
+        for literal in disjunct.split('&&'):
+            literal = literal.replace('(', '').replace(')', '').strip()
+            if literal in _TRUE_GUARDS:
+                continue
+            elif literal in _FALSE_GUARDS:
+                feasible = False
+                continue
+
+            match = _ATOM_RE.match(literal)
+            if match is None:
+                raise BuchiParseError('unexpected guard %s' % guard)
+
+            index = int(match.group(2))
+            value = match.group(1) != '!'
+            if cube.setdefault(index, value) != value:
+                feasible = False
+
+        if feasible:
+            cubes.append(tuple(sorted(cube.items())))
+
+    return cubes
+
+
+def parse_never_claim(output):
+    '''
+    Parses the never claim printed by ltl3ba.
+
+    :returns: BuchiAutomaton
+    '''
+    start = output.find('never')
+    if start < 0:
+        raise BuchiParseError('never claim not found')
+
+    initial = None
+    accepting = set()
+    transitions = {}
+    state = None
+
+    for line in _COMMENT_RE.sub('', output[start:]).splitlines():
+        line = line.strip()
+        if not line or line.startswith('never') or line in ('if', 'fi;', '}'):
+            continue
+
+        match = _LABEL_RE.match(line)
+        if match is not None:
+            state = match.group(1)
+            transitions[state] = []
+            if state.endswith('init'):
+                initial = state
+            if state.startswith('accept'):
+                accepting.add(state)
+            continue
+
+        if state is None:
+            raise BuchiParseError('transition outside of a state: %s' % line)
+
+        if line.startswith('skip'):
+            transitions[state].append(((), state))
+        elif line.startswith('false'):
+            continue
+        else:
+            match = _EDGE_RE.match(line)
+            if match is None:
+                raise BuchiParseError('unexpected line %s' % line)
+            target = match.group(2)
+            transitions[state].extend([(cube, target)
+                                       for cube in _parse_guard(match.group(1))])
+
+    if initial is None:
+        raise BuchiParseError('initial state not found')
+
+    return BuchiAutomaton(initial, accepting, transitions)
+
+
+def has_accepting_cycle(initial_states, successors, is_accepting):
+    '''
+    Returns True if an accepting state in a cycle is reachable from
+    initial_states. States are explored on the fly, with an iterative
+    version of Tarjan's algorithm, and the search ends as soon as a strongly
+    connected component with an accepting cycle is closed.
+
+    :param successors: function returning the list of successors of a state
+    :param is_accepting: function returning True for accepting states
+    '''
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    component_stack = []
+    self_loops = set()
+
+    for root in initial_states:
+        if root in index:
+            continue
+
+        index[root] = lowlink[root] = len(index)
+        component_stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+
+        while work:
+            (node, pending) = work[-1]
+            descended = False
+            for successor in pending:
+                if successor == node:
+                    self_loops.add(node)
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    component_stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(successors(successor))))
+                    descended = True
+                    break
+                elif successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            if descended:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = component_stack.pop()
+                    on_stack.remove(member)
+                    component.append(member)
+                    if member == node:
+                        break
+
+                if (len(component) > 1 or node in self_loops) and \
+                        any([is_accepting(member) for member in component]):
+                    return True
+
+    return False
+
+
+def abstract_formula(formula):
+    '''
+    Returns the skeleton of formula in ltl3ba syntax, in which the maximal
+    propositional subformulae are replaced by atoms p0 ... pn.
+    Equal subformulae (up to the same renaming of literals) share the same
+    atom.
+
+    :returns: tuple (skeleton string, list of atom formulae)
+    '''
+    temporal = {}
+    for node in post_order(formula):
+        temporal[id(node)] = isinstance(node, TEMPORAL_CLASSES) or \
+                any([temporal[id(child)] for child in children(node)])
+
+    #atoms are numbered in reading order
+    names = {}
+    atom_indices = {}
+    atoms = []
+    strings = {}
+    nodes = []
+    stack = [formula]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, TrueFormula):
+            strings[id(node)] = 'true'
+        elif isinstance(node, FalseFormula):
+            strings[id(node)] = 'false'
+        elif not temporal[id(node)]:
+            atom_key = canonical_form(node, names)
+            try:
+                index = atom_indices[atom_key]
+            except KeyError:
+                index = len(atoms)
+                atom_indices[atom_key] = index
+                atoms.append(node)
+            strings[id(node)] = '%s%d' % (ATOM_PREFIX, index)
+        else:
+            nodes.append(node)
+            stack.extend(reversed(children(node)))
+
+    for node in reversed(nodes):
+        if type(node) in _SKELETON_UNARY:
+            strings[id(node)] = '%s(%s)' % (_SKELETON_UNARY[type(node)],
+                                            strings[id(node.right_formula)])
+        elif type(node) in _SKELETON_BINARY:
+            strings[id(node)] = '(%s %s %s)' % (strings[id(node.left_formula)],
+                                                _SKELETON_BINARY[type(node)],
+                                                strings[id(node.right_formula)])
+        else:
+            raise BuchiParseError('unsupported operator %s' % node.Symbol)
+
+    return (strings[id(formula)], atoms)
+
+
+class AtomDomain(object):
+    '''
+    Decides the feasibility of cubes over a list of atoms
+    '''
+
+    def __init__(self, atoms):
+        '''
+        constructor. If the atoms cannot be encoded as BDDs, all the cubes
+        are considered feasible and exact is False
+        '''
+        self.atoms = atoms
+        self.cache = {}
+        self.exact = True
+        self.encoder = PropositionalEncoder()
+        try:
+            self.atom_bdds = [self.encoder.encode(atom) for atom in atoms]
+        except (EncodingError, BDDLimitError):
+            self.exact = False
+            self.atom_bdds = None
+
+    def feasible(self, cube):
+        '''
+        Returns True if some assignment to the literals gives the values in
+        cube to the atoms
+        '''
+        try:
+            return self.cache[cube]
+        except KeyError:
+            pass
+
+        if not self.exact:
+            return True
+
+        bdd = self.encoder.bdd
+        try:
+            result = bdd.conjunction_all(
+                [self.encoder.domain] +
+                [self.atom_bdds[index] if value else bdd.negation(self.atom_bdds[index])
+                 for (index, value) in cube]) != BDD.FALSE
+        except BDDLimitError:
+            self.exact = False
+            result = True
+
+        self.cache[cube] = result
+        return result
+
+
+class BuchiParseError(Exception):
+    '''
+    Raised if an automaton cannot be parsed or a formula cannot be abstracted
+    '''
+    pass
@@ -6,10 +6,12 @@ Author: Antonio Iannopollo
 
 from pycolite.parser.parser import LTL_PARSER
 from pycolite.parser.lexer import BaseSymbolSet
-from pycolite.attribute import Attribute
+from pycolite.attribute import Attribute, MergeBatch
 from pycolite.formula import Literal, Conjunction, Disjunction, Negation
 from pycolite.observer import Observer
-from copy import deepcopy
+from pycolite.formula_analysis import iter_subformulae
+from pycolite.serialization import contract_state, contract_from_state
+from copy import copy, deepcopy
 #from pycolite.ltl3ba import (Ltl3baRefinementStrategy, Ltl3baCompatibilityStrategy,
 #                         Ltl3baConsistencyStrategy)
 
@@ -22,9 +24,25 @@ from pycolite.types import Int, Bool
 LOG.debug('in contract.py')
 
 
+def _connected_ports(contract, other_contract):
+    '''
+    Returns the pairs of ports (port of contract, port of other_contract)
+    which reference the same literal
+    '''
+    other_ports = {}
+    for port in other_contract.ports_dict.values():
+        other_ports.setdefault(port.literal.uid, []).append(port)
+
+    return [(port, other_port) for port in contract.ports_dict.values()
+            for other_port in other_ports.get(port.literal.uid, [])]
+
+
 def verify_refinement(refined, abstract, refinement_mapping=None, strategy_obj=None):
     '''
     Verifies that refined refines abstract.
+    The check is performed on copies of the contracts. If strategy_obj is
+    provided, a shallow copy of it is bound to the copy of refined, thus
+    strategy_obj is not modified.
 
     :returns: boolean
     '''
@@ -42,22 +60,22 @@ def verify_refinement(refined, abstract, refinement_mapping=None, strategy_obj=N
     #     LOG.debug(p.literal.l_type)
 
 
-    #connect ports previously connected and not in the mapping
-    #TODO
-    #inefficient
-    for port_a in refined.ports_dict.values():
-        for port_b in abstract.ports_dict.values():
-            if port_a.is_connected_to(port_b):
-                refined_copy.connect_to_port(refined_copy.ports_dict[port_a.base_name],
-                                     abstract_copy.ports_dict[port_b.base_name])
+    with Contract.batch_connect():
+        #connect ports previously connected and not in the mapping
+        for (port_a, port_b) in _connected_ports(refined, abstract):
+            refined_copy.connect_to_port(refined_copy.ports_dict[port_a.base_name],
+                                         abstract_copy.ports_dict[port_b.base_name])
 
-    #connect ports according to mapping relation
-    for (port_a, port_b) in mapping_copy.mapping:
-        port_a.contract.connect_to_port(port_a, port_b)
+        #connect ports according to mapping relation
+        for (port_a, port_b) in mapping_copy.mapping:
+            port_a.contract.connect_to_port(port_a, port_b)
 
     #If a strategy is not defined, uses Nuxmv
     if strategy_obj is None:
         strategy_obj = NuxmvRefinementStrategy(refined_copy, delete_files=False)
+    else:
+        strategy_obj = copy(strategy_obj)
+        strategy_obj.contract = refined_copy
 
     #LOG.debug('refinement')
     #LOG.debug(refined)
@@ -74,6 +92,9 @@ def verify_refinement(refined, abstract, refinement_mapping=None, strategy_obj=N
 def verify_approximation(approximate, more_defined, approximation_mapping=None, strategy_obj=None):
     '''
     Verifies that refined refines abstract.
+    The check is performed on copies of the contracts. If strategy_obj is
+    provided, a shallow copy of it is bound to the copy of approximate, thus
+    strategy_obj is not modified.
 
     :returns: boolean
     '''
@@ -86,22 +107,22 @@ def verify_approximation(approximate, more_defined, approximation_mapping=None,
     approximate_copy = contract_copies[approximate]
 
 
-    #connect ports previously connected and not in the mapping
-    #TODO
-    #inefficient
-    for port_a in more_defined.ports_dict.values():
-        for port_b in approximate.ports_dict.values():
-            if port_a.is_connected_to(port_b):
-                defined_copy.connect_to_port(defined_copy.ports_dict[port_a.base_name],
-                                     approximate_copy.ports_dict[port_b.base_name])
+    with Contract.batch_connect():
+        #connect ports previously connected and not in the mapping
+        for (port_a, port_b) in _connected_ports(more_defined, approximate):
+            defined_copy.connect_to_port(defined_copy.ports_dict[port_a.base_name],
+                                         approximate_copy.ports_dict[port_b.base_name])
 
-    #connect ports according to mapping relation
-    for (port_a, port_b) in mapping_copy.mapping:
-        port_a.contract.connect_to_port(port_a, port_b)
+        #connect ports according to mapping relation
+        for (port_a, port_b) in mapping_copy.mapping:
+            port_a.contract.connect_to_port(port_a, port_b)
 
     #If a strategy is not defined, uses Nuxmv
     if strategy_obj is None:
         strategy_obj = NuxmvApproximationStrategy(approximate_copy, delete_files=False)
+    else:
+        strategy_obj = copy(strategy_obj)
+        strategy_obj.contract = approximate_copy
 
     #LOG.debug('refinement')
     #LOG.debug(refined)
@@ -174,7 +195,8 @@ class Port(Observer):
 
     def merge(self, port):
         '''
-        Merges the current port literal with another port or literal
+        Merges the current port literal with another port or literal.
+        If a MergeBatch is open, the merge is performed when it is committed
         '''
 
         assert self.l_type == port.l_type
@@ -183,7 +205,11 @@ class Port(Observer):
         # LOG.debug(port.literal.l_type)
 
         if self.literal != port.literal:
-            self.literal.merge(port.literal)
+            batch = MergeBatch.active()
+            if batch is None:
+                self.literal.merge(port.literal)
+            else:
+                batch.merge(self.literal, port.literal)
         else:
             LOG.warning('merging port with its own literal: %s'
                         % self.literal.unique_name)
@@ -194,7 +220,7 @@ class Port(Observer):
         '''
         Returns true if self references the same literal than port
         '''
-        if self.unique_name == port.unique_name:
+        if self.literal.uid == port.literal.uid:
             return True
         else:
             return False
@@ -304,6 +330,11 @@ class Contract(object):
         #TODO
         #check for saturated formulas automatically
 
+        #cached port and literal indexes, see _index
+        self._indexes = {}
+        self._indexes_key = None
+        self._indexes_owners = None
+
         self.symbol_set_cls = symbol_set_cls
         self.context = context
 
@@ -451,6 +482,9 @@ class Contract(object):
             ##observer pattern - attach to the subject
             #port_dict[literal_name].attach(self)
 
+        #ports have been assigned in place
+        self.invalidate_indexes()
+
         #check if there is something wrong
 
         #we need to make sure there are not ports which are both input and
@@ -484,7 +518,7 @@ class Contract(object):
                         literal.l_type = self.ports_dict[literal.base_name].l_type
                         literal.merge(self.ports_dict[literal.base_name].literal)
                     except KeyError:
-                        raise PortMappingError(key)
+                        raise PortMappingError(literal.unique_name)
 
 
         #Initialize a dict in which there is a reference to all the contracts
@@ -665,6 +699,28 @@ class Contract(object):
         else:
             raise PortDeclarationError()
 
+    @staticmethod
+    def batch_connect():
+        '''
+        Returns a context manager in which port connections, of any
+        contract, are collected and performed together when the block ends.
+        Ports connected within the block are not connected until it ends,
+        and the connections of the block are discarded if it raises an
+        exception. Blocks nested in another one are performed with it
+        '''
+        return MergeBatch.open()
+
+    def connect_many(self, port_pairs):
+        '''
+        Connects each pair (port of the current contract, other port) at once
+
+        :param port_pairs: pairs of ports
+        :type port_pairs: iterable
+        '''
+        with self.batch_connect():
+            for (port_ref, other_port_ref) in port_pairs:
+                self.connect_to_port(port_ref, other_port_ref)
+
     def is_refinement(self, abstract_contract, refinement_mapping=None, strategy_obj=None):
         '''
         Checks whether the calling contract refines abstract_contract
@@ -795,52 +851,91 @@ class Contract(object):
                 self.output_ports_dict.viewkeys()
 
 
+    def _index(self, name, build):
+        '''
+        Returns the index called name, calling build to compute it if
+        needed. Indexes are cached until a port dictionary or a formula
+        of the contract is replaced, the number of ports changes or any
+        attribute is merged. Ports assigned in place require a call to
+        invalidate_indexes
+        '''
+        owners = (self.input_ports_dict, self.output_ports_dict,
+                  self.assume_formula, self.guarantee_formula)
+        key = (Attribute.merge_count, len(self.input_ports_dict),
+               len(self.output_ports_dict)) + tuple([id(owner) for owner in owners])
+
+        if key != self._indexes_key:
+            self._indexes = {}
+            self._indexes_key = key
+            #keep the owners alive, so that their ids are not reused
+            self._indexes_owners = owners
+
+        try:
+            return self._indexes[name]
+        except KeyError:
+            index = build()
+            self._indexes[name] = index
+            return index
+
+    def invalidate_indexes(self):
+        '''
+        Discards the cached port and literal indexes
+        '''
+        self._indexes = {}
+        self._indexes_key = None
+        self._indexes_owners = None
+
+    @staticmethod
+    def _group_by_literal(items):
+        '''
+        Returns a dictionary mapping uids to the list of objects with that
+        uid, given pairs (literal, object)
+        '''
+        groups = {}
+        for (literal, item) in items:
+            groups.setdefault(literal.uid, []).append(item)
+
+        return groups
+
     @property
     def ports_dict(self):
         '''
         Return an update dict of all the contract ports
         '''
-        return dict( self.input_ports_dict.items() + \
-                        self.output_ports_dict.items() )
+        return self._index('ports', lambda: dict(self.input_ports_dict.items() + \
+                                                 self.output_ports_dict.items()))
 
     @property
     def reverse_ports_dict(self):
         '''
-        Returns a dict which has uniques names as keys, and ports as values
+        Returns a dict which has literal uids as keys, and ports as values
         '''
-        return dict( self.reverse_input_ports_dict.items() + \
-                        self.reverse_output_ports_dict.items())
+        return self._index('reverse_ports',
+                           lambda: dict(self.reverse_input_ports_dict.items() + \
+                                        self.reverse_output_ports_dict.items()))
 
     @property
     def reverse_input_ports_dict(self):
         '''
-        Returns a dict which has uniques names as keys, and ports as values
+        Returns a dict which has literal uids as keys, and ports as values
         '''
-        return {key_port.unique_name:
-                [port for port in self.input_ports_dict.values()
-                 if port.unique_name == key_port.unique_name]
-                for key_port in self.input_ports_dict.viewvalues()}
-
-        #return {key: value for (key, value) in zip( \
-        #        [port.unique_name \
-        #            for port in self.input_ports_dict.viewvalues()], \
-        #        self.input_ports_dict.viewvalues() )}
+        return self._index('reverse_inputs', lambda: self._group_by_literal(
+            [(port.literal, port) for port in self.input_ports_dict.viewvalues()]))
 
     @property
     def reverse_output_ports_dict(self):
         '''
-        Returns a dict which has uniques names as keys, and ports as values
+        Returns a dict which has literal uids as keys, and ports as values
         '''
-        return {key_port.unique_name:
-                [port for port in self.output_ports_dict.values()
-                 if port.unique_name == key_port.unique_name]
-                for key_port in self.output_ports_dict.viewvalues()}
-
-        #return {key: value for (key, value) in zip( \
-        #        [port.unique_name \
-        #            for port in self.output_ports_dict.viewvalues()], \
-        #        self.output_ports_dict.viewvalues() )}
+        return self._index('reverse_outputs', lambda: self._group_by_literal(
+            [(port.literal, port) for port in self.output_ports_dict.viewvalues()]))
 
+    def _literal_items(self):
+        '''
+        Returns the set of pairs (base name, literal) of the formulae
+        '''
+        return self.assume_formula.get_literal_items() | \
+                self.guarantee_formula.get_literal_items()
 
     @property
     def formulae_dict(self):
@@ -848,33 +943,19 @@ class Contract(object):
         return a dict of literals used in contract formulae, indexed by
         base_name
         '''
-        return dict(self.assume_formula.get_literal_items() | \
-                    self.guarantee_formula.get_literal_items() )
+        return self._index('formulae', lambda: dict(self._literal_items()))
 
     @property
     def formulae_reverse_dict(self):
         '''
         return a dict of lterals used in contract formulae, indexed by
-        unique_name
+        uid
         '''
         #use the formulae instead of the dict because the dicts
         #overrides duplicates
-
-        try:
-            #unzip
-            _, values = zip(* (self.assume_formula.get_literal_items() | \
-                            self.guarantee_formula.get_literal_items()))
-        except ValueError:
-            LOG.debug('no literals??')
-            return {}
-        else:
-            return {key_lit.unique_name:
-                    [literal for literal in values if literal.unique_name == key_lit.unique_name]
-                    for key_lit in set(values)}
-
-            #return {key: value for (key, value) in zip( \
-            #    [literal.unique_name for literal in values], \
-            #        values)}
+        return self._index('formulae_reverse', lambda: self._group_by_literal(
+            [(literal, literal) for literal in set([literal for (_, literal)
+                                                    in self._literal_items()])]))
 
     def non_composite_origin_set(self):
         '''
@@ -897,6 +978,34 @@ class Contract(object):
 
         return origin_set
 
+    def dispose(self):
+        '''
+        Detaches the ports and the formulae of the contract from their
+        literals. Observers are weak references, thus this is only needed to
+        release a contract immediately when some of its literals are shared
+        with long-lived objects. The contract cannot be used afterwards
+        '''
+        for port in self.ports_dict.values():
+            port.literal.discard(port)
+
+        for formula in (self.assume_formula, self.guarantee_formula):
+            for node in iter_subformulae(formula):
+                for literal in node.literals.values():
+                    literal.discard(node)
+
+        self.input_ports_dict = {}
+        self.output_ports_dict = {}
+        self.invalidate_indexes()
+
+    def __reduce__(self):
+        '''
+        Pickles the contract in the compact format of the serialization
+        module. Ports connected to other contracts are not connected in the
+        unpickled contract. copy.copy and copy.deepcopy use this method as
+        well, thus their copies are not connected either
+        '''
+        return (contract_from_state, (contract_state(self),))
+
     @property
     def base_name(self):
         '''
@@ -1146,29 +1255,34 @@ class CompositionMapping(object):
 
         #connect and check port consistency
         #LOG.debug(self.mapping)
-        for (name, port_set) in self.mapping.viewitems():
+        connected = []
+        with Contract.batch_connect():
+            for (name, port_set) in self.mapping.viewitems():
 
-            #we need to connects all the ports in port_set
-            #error if we try to connect mulptiple outputs
+                #we need to connects all the ports in port_set
+                #error if we try to connect mulptiple outputs
 
-            outputs = [port for port in port_set if port.is_output]
+                outputs = [port for port in port_set if port.is_output]
 
-            if len(outputs) > 1:
-                raise PortConnectionError('cannot connect multiple outputs')
-            else:
-                #merge port literals
-                #LOG.debug([p.unique_name + ':'+p.l_type + ':'+p.literal.l_type for p in port_set])
-                port = port_set.pop()
-                for p in port_set:
-                    port.merge(p)
-                #port = reduce(lambda x, y: x.merge(y), port_set)
-
-                if len(outputs) == 0:
-                    #all inputs -> input
-                    new_input_ports[name] = Port(name, l_type = port.l_type, literal=port.literal, context=self.context)
+                if len(outputs) > 1:
+                    raise PortConnectionError('cannot connect multiple outputs')
                 else:
-                    #1 output -> output
-                    new_output_ports[name] = Port(name, l_type = port.l_type, literal=port.literal, context=self.context)
+                    #merge port literals
+                    #LOG.debug([p.unique_name + ':'+p.l_type + ':'+p.literal.l_type for p in port_set])
+                    port = port_set.pop()
+                    for p in port_set:
+                        port.merge(p)
+                    #port = reduce(lambda x, y: x.merge(y), port_set)
+                    connected.append((name, port, outputs))
+
+        #new ports reference the merged literals
+        for (name, port, outputs) in connected:
+            if len(outputs) == 0:
+                #all inputs -> input
+                new_input_ports[name] = Port(name, l_type = port.l_type, literal=port.literal, context=self.context)
+            else:
+                #1 output -> output
+                new_output_ports[name] = Port(name, l_type = port.l_type, literal=port.literal, context=self.context)
 
 
         #complete with implicit ports from contracts
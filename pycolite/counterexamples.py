@@ -0,0 +1,92 @@
+'''
+This module implements a bank of counterexamples found by the solvers.
+Counterexamples are stored for each abstract contract (the contract playing
+the role of the specification in a refinement or approximation check), with
+the variables named after the contract ports. When a new candidate is
+checked against the same abstract contract, the stored counterexamples are
+replayed in-process before calling a solver.
+
+Author: Antonio Iannopollo
+'''
+
+from pycolite.fingerprint import fingerprint
+from pycolite.lasso import LassoFalsifier
+
+
+class CounterexampleBank(object):
+    '''
+    Stores lasso counterexamples, indexed by abstract contract
+    '''
+
+    def __init__(self, max_traces=64):
+        '''
+        constructor
+
+        :param max_traces: maximum number of counterexamples stored for
+            each abstract contract
+        :type max_traces: int
+        '''
+        self.max_traces = max_traces
+        self.falsifiers = {}
+        self.stored = 0
+        self.replayed = 0
+
+    def key(self, contract):
+        '''
+        Returns the key used to store the counterexamples of contract.
+        Copies of the same contract have the same key, regardless of the
+        connections of their ports. The key only selects the counterexamples
+        to replay, and not a verdict: a replayed counterexample is evaluated
+        on the formula of the check, thus it refutes the check only if it is
+        an actual counterexample of it
+        '''
+        return fingerprint(contract)
+
+    def store(self, contract, lasso, names):
+        '''
+        Stores a counterexample for contract.
+
+        :param names: dictionary mapping the names used in lasso to port
+            names. Other names are stored unchanged
+        :type names: dict
+        '''
+        key = self.key(contract)
+        try:
+            falsifier = self.falsifiers[key]
+        except KeyError:
+            falsifier = LassoFalsifier(trace_count=0, max_stored=self.max_traces)
+            self.falsifiers[key] = falsifier
+
+        lasso_names = set()
+        for state in lasso.states:
+            lasso_names.update(state.keys())
+
+        falsifier.remember(lasso.renamed({name: names.get(name, name)
+                                          for name in lasso_names}))
+        self.stored += 1
+
+    def replay(self, contract, formula, names):
+        '''
+        Evaluates formula on the counterexamples stored for contract.
+
+        :param names: dictionary mapping the unique names of the literals of
+            formula to port names
+        :type names: dict
+        :returns: the first stored Lasso violating formula, or None
+        '''
+        try:
+            falsifier = self.falsifiers[self.key(contract)]
+        except KeyError:
+            return None
+
+        witness = falsifier.find_witness(formula, names)
+        if witness is not None:
+            self.replayed += 1
+
+        return witness
+
+    def __len__(self):
+        '''
+        number of stored counterexamples
+        '''
+        return sum([len(falsifier.seen) for falsifier in self.falsifiers.values()])
@@ -0,0 +1,221 @@
+'''
+This module implements the adaptive selection of the nuxmv engine used to
+check a formula.
+An EngineSelector computes cheap syntactic features of the formula and
+looks up the engine in a table of rules. The selector behaves like a
+NuxmvEngine, thus it can be passed wherever an engine is expected.
+Each decision and its outcome are logged, and the most recent ones are
+stored, so that the table can be tuned from real runs.
+
+Author: Antonio Iannopollo
+'''
+
+from collections import deque
+from time import time
+from pycolite.nuxmv import NuxmvPathLoader, NUXMV_ENGINES, DEFAULT_ENGINE
+from pycolite.formula_analysis import FormulaFeatures
+from pycolite import LOG
+
+#each rule is a tuple (rule name, predicate on FormulaFeatures, engine name)
+#rules are evaluated in order, the first matching rule is used
+DEFAULT_SELECTION_TABLE = (
+    ('propositional', lambda f: f.temporal_depth == 0, 'bdd'),
+    ('wide_integers', lambda f: f.max_int_range > 256, 'ic3'),
+    ('safety', lambda f: f.is_safety, 'ic3'),
+    ('many_state_bits', lambda f: f.state_bits > 60, 'bdd_dynamic'),
+    ('deep_nesting', lambda f: f.temporal_depth > 4, 'klive'),
+    ('default', lambda f: True, 'bdd'),
+    )
+
+#number of selection records kept by default
+MAX_HISTORY = 1024
+
+
+class SelectionRecord(object):
+    '''
+    Stores a selection decision and its outcome
+    '''
+
+    def __init__(self, features, rule, engine_name):
+        '''
+        constructor
+        '''
+        self.features = features
+        self.rule = rule
+        self.engine_name = engine_name
+        self.verdict = None
+        self.elapsed = None
+
+    def __repr__(self):
+        '''
+        pretty print
+        '''
+        return 'SelectionRecord(rule=%s, engine=%s, verdict=%s, elapsed=%s, %s)' % \
+                (self.rule, self.engine_name, self.verdict, self.elapsed,
+                 self.features)
+
+
+class EngineSelector(object):
+    '''
+    Selects a nuxmv engine based on the features of the formula to check
+    '''
+
+    def __init__(self, table=DEFAULT_SELECTION_TABLE, engines=None,
+                 fallback_engine=DEFAULT_ENGINE, max_history=MAX_HISTORY):
+        '''
+        constructor
+
+        :param table: sequence of rules (name, predicate, engine name)
+        :type table: sequence of tuples
+        :param engines: dictionary of available engines, indexed by name.
+            If None, nuxmv.NUXMV_ENGINES is used
+        :type engines: dict
+        :param fallback_engine: engine used if the selected one does not give
+            a definitive answer
+        :type fallback_engine: NuxmvEngine
+        :param max_history: number of most recent selection records kept.
+            If 0, records are only logged
+        :type max_history: int
+        '''
+        if engines is None:
+            engines = NUXMV_ENGINES
+
+        self.table = list(table)
+        self.engines = engines
+        self.fallback_engine = fallback_engine
+        self.history = deque(maxlen=max_history)
+
+    def override(self, rule_name, predicate=None, engine_name=None):
+        '''
+        Changes the predicate and/or the engine of an existing rule.
+        If the rule does not exist, a new rule is added on top of the table
+        '''
+        for (index, (name, old_predicate, old_engine)) in enumerate(self.table):
+            if name == rule_name:
+                self.table[index] = (name,
+                                     old_predicate if predicate is None else predicate,
+                                     old_engine if engine_name is None else engine_name)
+                return
+
+        if predicate is None or engine_name is None:
+            raise KeyError('rule %s not found' % rule_name)
+
+        self.table.insert(0, (rule_name, predicate, engine_name))
+
+    def select(self, formula):
+        '''
+        Returns the SelectionRecord associated to formula
+        '''
+        features = FormulaFeatures(formula)
+
+        for (name, predicate, engine_name) in self.table:
+            if predicate(features):
+                return SelectionRecord(features, name, engine_name)
+
+        return SelectionRecord(features, None, self.fallback_engine.name)
+
+    def start(self, formula, prefix='', tool_location=NuxmvPathLoader.get_path(),
+              delete_file=True, variable_order=None):
+        '''
+        Starts the engine selected for formula.
+        Has the same interface of NuxmvEngine.start
+        '''
+        record = self.select(formula)
+        LOG.debug('selected engine %s (rule %s) for %s' %
+                  (record.engine_name, record.rule, record.features))
+
+        return _SelectedProcess(self, record, formula, prefix, tool_location,
+                                delete_file, variable_order)
+
+    def _record(self, record):
+        '''
+        stores the outcome of a selection
+        '''
+        self.history.append(record)
+        LOG.info('engine selection: %s' % record)
+
+    def write_history(self, filep):
+        '''
+        Writes the selection history as comma separated values in filep
+        '''
+        keys = sorted(FormulaFeatures.FEATURE_NAMES)
+        filep.write(','.join(['rule', 'engine', 'verdict', 'elapsed'] + keys) + '\n')
+        for record in self.history:
+            features = record.features.as_dict()
+            filep.write(','.join([str(record.rule), record.engine_name,
+                                  str(record.verdict), '%f' % record.elapsed] +
+                                 [str(features[key]) for key in keys]) + '\n')
+
+
+class _SelectedProcess(object):
+    '''
+    Process started by an EngineSelector. Retries with the fallback engine if
+    the selected one does not give a definitive answer, and records the
+    outcome of the selection
+    '''
+
+    def __init__(self, selector, record, formula, prefix, tool_location, delete_file,
+                 variable_order):
+        '''
+        starts the selected engine
+        '''
+        self.selector = selector
+        self.record = record
+        self.formula = formula
+        self.prefix = prefix
+        self.tool_location = tool_location
+        self.delete_file = delete_file
+        self.variable_order = variable_order
+        self.start_time = time()
+
+        self.process = selector.engines[record.engine_name].start(formula,
+                            prefix=prefix, tool_location=tool_location,
+                            delete_file=delete_file, variable_order=variable_order)
+
+    def wait(self):
+        '''
+        Waits for the selected engine, and the fallback one if needed
+        '''
+        verdict = self.process.wait()
+
+        if verdict is None and not self.process.killed:
+            LOG.debug('engine %s gave no verdict, using %s' %
+                      (self.record.engine_name, self.selector.fallback_engine.name))
+            self.process = self.selector.fallback_engine.start(self.formula,
+                                prefix=self.prefix, tool_location=self.tool_location,
+                                delete_file=self.delete_file,
+                                variable_order=self.variable_order)
+            verdict = self.process.wait()
+
+        self.record.verdict = verdict
+        self.record.elapsed = time() - self.start_time
+        self.selector._record(self.record)
+
+        return verdict
+
+    @property
+    def output(self):
+        '''
+        output of the last engine run
+        '''
+        return self.process.output
+
+    @property
+    def solver_names(self):
+        '''
+        names of the variables given to the last engine run
+        '''
+        return self.process.solver_names
+
+    @property
+    def killed(self):
+        '''
+        True if the process has been killed
+        '''
+        return self.process.killed
+
+    def kill(self):
+        '''
+        Terminates the running engine
+        '''
+        self.process.kill()
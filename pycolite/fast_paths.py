@@ -0,0 +1,186 @@
+'''
+This module implements a layer of cheap deciders which are tried before
+calling an external solver.
+Each decider takes a LTLFormula and returns True if the formula is a
+tautology, False if it is not, or None if it cannot decide.
+Deciders are tried in order, and the number of checks decided by each of
+them is counted in FAST_PATH_STATS.
+
+Author: Antonio Iannopollo
+'''
+
+from collections import Counter
+from pycolite.formula import (TrueFormula, FalseFormula, Negation, Conjunction,
+                              Disjunction, Implication, Equivalence, Globally,
+                              Eventually, Next, Constant)
+from pycolite.formula_analysis import post_order, children, conjuncts
+from pycolite.propositional import decide_propositional
+from pycolite.progression import decide_progression
+from pycolite import LOG
+
+#key used in FAST_PATH_STATS for checks no decider could decide
+UNDECIDED = 'undecided'
+
+FAST_PATH_STATS = Counter()
+
+
+def structure_ids(formula):
+    '''
+    Returns a dictionary mapping the id of each subformula of formula to an
+    integer, such that two subformulae have the same integer if and only if
+    they are structurally identical and use the same literals.
+
+    :returns: tuple (dictionary of ids, dictionary of structures)
+    '''
+    ids = {}
+    table = {}
+    for node in post_order(formula):
+        if node.is_literal:
+            structure = ('LIT', node.uid)
+        elif isinstance(node, Constant):
+            structure = ('CONST', node.value)
+        else:
+            structure = (node.Symbol,) + tuple([ids[id(child)]
+                                                for child in children(node)])
+        ids[id(node)] = table.setdefault(structure, len(table))
+
+    return (ids, table)
+
+
+def fold_constants(formula):
+    '''
+    Evaluates the parts of formula which do not depend on literals, using
+    the constants TRUE and FALSE and the identities x -> x, x = x, x | !x,
+    x & !x, and A -> B where all the conjuncts of B are conjuncts of A.
+
+    :returns: True if formula is equivalent to TRUE, False if it is
+        equivalent to FALSE, None otherwise
+    '''
+    (ids, table) = structure_ids(formula)
+    value = {}
+
+    def negated(left, right):
+        '''
+        True if right is the negation of left
+        '''
+        return table.get(('NOT', ids[id(left)])) == ids[id(right)]
+
+    for node in post_order(formula):
+        if isinstance(node, TrueFormula):
+            result = True
+        elif isinstance(node, FalseFormula):
+            result = False
+        elif isinstance(node, Negation):
+            result = value[id(node.right_formula)]
+            if result is not None:
+                result = not result
+        elif isinstance(node, (Globally, Eventually, Next)):
+            result = value[id(node.right_formula)]
+        elif isinstance(node, (Conjunction, Disjunction, Implication, Equivalence)):
+            left = node.left_formula
+            right = node.right_formula
+            left_value = value[id(left)]
+            right_value = value[id(right)]
+            same = ids[id(left)] == ids[id(right)]
+
+            if isinstance(node, Implication):
+                left_value = None if left_value is None else not left_value
+
+            if isinstance(node, Conjunction):
+                if left_value is False or right_value is False:
+                    result = False
+                elif left_value is True and right_value is True:
+                    result = True
+                elif negated(left, right) or negated(right, left):
+                    result = False
+                else:
+                    result = left_value if same else None
+            elif isinstance(node, Equivalence):
+                if left_value is not None and right_value is not None:
+                    result = left_value == right_value
+                elif same:
+                    result = True
+                else:
+                    result = None
+            else:
+                #disjunction, or implication seen as !left | right
+                if left_value is True or right_value is True:
+                    result = True
+                elif left_value is False and right_value is False:
+                    result = False
+                elif isinstance(node, Disjunction) and \
+                        (negated(left, right) or negated(right, left)):
+                    result = True
+                elif same:
+                    result = True if isinstance(node, Implication) else left_value
+                elif isinstance(node, Implication) and \
+                        set([ids[id(c)] for c in conjuncts(right)]) <= \
+                        set([ids[id(c)] for c in conjuncts(left)]):
+                    result = True
+                else:
+                    result = None
+        else:
+            result = None
+
+        value[id(node)] = result
+
+    return value[id(formula)]
+
+
+#list of pairs (name, decider), tried in order
+FAST_PATH_DECIDERS = [('constant_folding', fold_constants),
+                      ('propositional', decide_propositional),
+                      ('progression', decide_progression)]
+
+
+def register_decider(name, decider, index=None):
+    '''
+    Adds a decider to FAST_PATH_DECIDERS. If index is None, the decider is
+    tried after the existing ones
+    '''
+    if index is None:
+        index = len(FAST_PATH_DECIDERS)
+
+    FAST_PATH_DECIDERS.insert(index, (name, decider))
+
+
+def unregister_decider(name):
+    '''
+    Removes the decider called name from FAST_PATH_DECIDERS
+    '''
+    FAST_PATH_DECIDERS[:] = [(decider_name, decider) for (decider_name, decider)
+                             in FAST_PATH_DECIDERS if decider_name != name]
+
+
+def decide_tautology(formula):
+    '''
+    Tries to decide if formula is a tautology without calling a solver
+
+    :returns: True or False if a decider succeeds, None otherwise
+    '''
+    for (name, decider) in FAST_PATH_DECIDERS:
+        verdict = decider(formula)
+        if verdict is not None:
+            FAST_PATH_STATS[name] += 1
+            LOG.debug('fast path %s decided %s' % (name, verdict))
+            return verdict
+
+    FAST_PATH_STATS[UNDECIDED] += 1
+    return None
+
+
+def decide_emptiness(formula):
+    '''
+    Tries to decide if formula is empty (unsatisfiable) without calling
+    a solver
+
+    :returns: True or False if a decider succeeds, None otherwise
+    '''
+    return decide_tautology(Negation(formula))
+
+
+def reset_stats():
+    '''
+    Clears FAST_PATH_STATS
+    '''
+    FAST_PATH_STATS.clear()
@@ -0,0 +1,64 @@
+'''
+This module computes canonical fingerprints of contracts.
+Unique names of literals depend on the order in which attributes are
+created, thus two contracts built from the same specification have
+different formulae. The fingerprint renames the literals of the assume and
+guarantee formulae after the role (input or output) and the position of
+their port, in alphabetical order of port names, and hashes the result
+together with the port names and types.
+Identical contracts have the same fingerprint, regardless of when and how
+they were created.
+The fingerprint identifies a contract up to the renaming of its literals
+only: it does not encode the connections of its ports to other contracts.
+A verdict about a pair of contracts can be keyed by their fingerprints only
+if the check fixes the correspondence among their ports, e.g. by port name,
+as the refinement_graph module does.
+
+Author: Antonio Iannopollo
+'''
+
+from hashlib import sha1
+from pycolite.formula_analysis import canonical_form
+
+INPUT_ROLE = 'i'
+OUTPUT_ROLE = 'o'
+
+
+def port_names_map(contract):
+    '''
+    Returns a dictionary mapping the uids of the literals of the ports of
+    contract to names made of role and position, e.g. i0, o1
+    '''
+    names = {}
+    for (role, ports) in ((INPUT_ROLE, contract.input_ports_dict),
+                          (OUTPUT_ROLE, contract.output_ports_dict)):
+        for (position, base_name) in enumerate(sorted(ports)):
+            names.setdefault(ports[base_name].literal.uid,
+                             '%s%d' % (role, position))
+
+    return names
+
+
+def canonical_contract(contract):
+    '''
+    Returns the canonical text of contract, used to compute its fingerprint
+    '''
+    names = port_names_map(contract)
+    lines = [canonical_form(contract.assume_formula, names),
+             canonical_form(contract.guarantee_formula, names)]
+
+    for (role, ports) in ((INPUT_ROLE, contract.input_ports_dict),
+                          (OUTPUT_ROLE, contract.output_ports_dict)):
+        lines.extend(['%s %s %s' % (role, base_name, contract.type_dir[base_name])
+                      for base_name in sorted(ports)])
+
+    return '\n'.join(lines)
+
+
+def fingerprint(contract):
+    '''
+    Returns the fingerprint of contract, as a hexadecimal string. Contracts
+    identical up to the renaming of their literals have the same fingerprint,
+    regardless of the connections of their ports
+    '''
+    return sha1(canonical_contract(contract)).hexdigest()
@@ -61,7 +61,8 @@ class LTLFormula(Observer):
         '''
         self.literals = {}
 
-    def generate(self, symbol_set=None, with_base_names=False, ignore_precedence=False):
+    def generate(self, symbol_set=None, with_base_names=False, ignore_precedence=False,
+                 names=None):
         '''
         doc
         '''
@@ -70,6 +71,16 @@ class LTLFormula(Observer):
 
         return symbol_set.symbols[self.Symbol]
 
+    def __reduce__(self):
+        '''
+        Pickles the formula in the compact format of the serialization
+        module
+        '''
+        #imported here, since serialization imports this module
+        from pycolite.serialization import formula_state, formula_from_state
+
+        return (formula_from_state, (formula_state(self),))
+
     def update(self, updated_subject):
         '''
         Implementation of the update method from a attribute according to
@@ -168,17 +179,23 @@ class Literal(Attribute, LTLFormula):
         self.attach(self)
         self.literals[base_name] = self
 
-    def generate(self, symbol_set=None, with_base_names=False, ignore_precendence=False):
+    def generate(self, symbol_set=None, with_base_names=False, ignore_precendence=False,
+                 names=None):
         '''
-        doc
+        Returns the unique name of the literal, or its base name if
+        with_base_names is True, or the name names maps its uid to, if
+        names is provided
         '''
         if symbol_set == None:
             symbol_set = BaseSymbolSet
 
-        if with_base_names:
-            return self.literals.values()[0].base_name
+        literal = self.literals.values()[0]
+        if names is not None:
+            return names[literal.uid]
+        elif with_base_names:
+            return literal.base_name
         else:
-            return self.literals.values()[0].unique_name
+            return literal.unique_name
 
     def update(self, updated_subject):
         '''
@@ -190,6 +207,7 @@ class Literal(Attribute, LTLFormula):
 
         super(Literal, self).update(updated_subject)
 
+        self.uid = updated_attribute.uid
         self.unique_name = updated_attribute.unique_name
         self.l_type = updated_subject.l_type
 
@@ -228,7 +246,8 @@ class Constant(LTLFormula):
         self.value = value
 
 
-    def generate(self, symbol_set=None, with_base_names=False, ignore_precendence=False):
+    def generate(self, symbol_set=None, with_base_names=False, ignore_precendence=False,
+                 names=None):
         '''
         doc
         '''
@@ -424,12 +443,15 @@ class BinaryFormula(LTLFormula):
 
         return '%s %s %s' % (left_string, symbol_set.symbols[self.Symbol], right_string)
 
-    def generate(self, symbol_set=None, with_base_names=False, ignore_precedence=False):
+    def generate(self, symbol_set=None, with_base_names=False, ignore_precedence=False,
+                 names=None):
         '''
         generate full formula string
         '''
-        left_string = self.left_formula.generate(symbol_set, with_base_names, ignore_precedence)
-        right_string = self.right_formula.generate(symbol_set, with_base_names, ignore_precedence)
+        left_string = self.left_formula.generate(symbol_set, with_base_names,
+                                                 ignore_precedence, names)
+        right_string = self.right_formula.generate(symbol_set, with_base_names,
+                                                   ignore_precedence, names)
 
         return self.__generate_binary(left_string, right_string, symbol_set, with_base_names, ignore_precedence)
 
@@ -507,11 +529,13 @@ class UnaryFormula(LTLFormula):
 
         return '%s %s' % (symbol_set.symbols[self.Symbol], right_string)
 
-    def generate(self, symbol_set=None, with_base_names=False, ignore_precedence=False):
+    def generate(self, symbol_set=None, with_base_names=False, ignore_precedence=False,
+                 names=None):
         '''
         generate full formula string
         '''
-        right_string = self.right_formula.generate(symbol_set, with_base_names, ignore_precedence)
+        right_string = self.right_formula.generate(symbol_set, with_base_names,
+                                                   ignore_precedence, names)
 
         return self.__generate_unary(right_string, symbol_set, with_base_names, ignore_precedence)
 
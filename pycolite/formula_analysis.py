@@ -0,0 +1,280 @@
+'''
+This module contains a set of functions to inspect the structure of
+LTLFormula objects without using external tools.
+All the visits are iterative, to support very deep formulae.
+
+Author: Antonio Iannopollo
+'''
+
+from math import ceil, log
+from pycolite.formula import (BinaryFormula, UnaryFormula, Globally, Eventually,
+                              Next, Negation, Implication, Equivalence,
+                              Conjunction, Disjunction, Addition, Multiplication)
+from pycolite.types import Bool, Int
+
+TEMPORAL_CLASSES = (Globally, Eventually, Next)
+
+#commutative operators, and the associative ones among them
+COMMUTATIVE_CLASSES = (Conjunction, Disjunction, Equivalence, Addition, Multiplication)
+ASSOCIATIVE_CLASSES = (Conjunction, Disjunction, Addition, Multiplication)
+
+
+def children(formula):
+    '''
+    Returns a tuple with the direct subformulae of formula
+    '''
+    if isinstance(formula, BinaryFormula):
+        return (formula.left_formula, formula.right_formula)
+    elif isinstance(formula, UnaryFormula):
+        return (formula.right_formula,)
+    else:
+        return ()
+
+
+def iter_subformulae(formula):
+    '''
+    Generates all the subformulae of formula (formula included), in pre-order
+    '''
+    stack = [formula]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(children(current)))
+
+
+def post_order(formula):
+    '''
+    Returns a list with all the subformulae of formula, in post-order
+    '''
+    result = []
+    stack = [(formula, False)]
+    while stack:
+        (current, expanded) = stack.pop()
+        if expanded:
+            result.append(current)
+        else:
+            stack.append((current, True))
+            stack.extend([(child, False) for child in reversed(children(current))])
+
+    return result
+
+
+def conjuncts(formula):
+    '''
+    Returns the list of the top-level conjuncts of formula
+    '''
+    result = []
+    stack = [formula]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, Conjunction):
+            stack.append(current.right_formula)
+            stack.append(current.left_formula)
+        else:
+            result.append(current)
+
+    return result
+
+
+def get_literals(formula):
+    '''
+    Returns a list of the distinct literals in formula, ordered by first
+    occurrence
+    '''
+    seen = set()
+    literals = []
+    for node in iter_subformulae(formula):
+        if node.is_literal and node.uid not in seen:
+            seen.add(node.uid)
+            literals.append(node)
+
+    return literals
+
+
+def canonical_form(formula, names=None):
+    '''
+    Returns a string representing formula in prefix notation, in which
+    literals are renamed following the order of their first occurrence.
+    Formulae which are equal up to a renaming of their literals have the
+    same canonical form.
+
+    :param names: dictionary mapping literal uids to canonical names. It is
+        updated with the literals found in formula, thus it can be shared
+        among several calls to obtain a consistent renaming
+    :type names: dict
+    '''
+    if names is None:
+        names = {}
+
+    tokens = []
+    for node in iter_subformulae(formula):
+        if node.is_literal:
+            try:
+                name = names[node.uid]
+            except KeyError:
+                name = 'v%d' % len(names)
+                names[node.uid] = name
+            tokens.append('%s:%s' % (name, node.l_type))
+        elif node.Symbol is None:
+            tokens.append(str(node.generate()))
+        else:
+            tokens.append(node.Symbol)
+
+    return ' '.join(tokens)
+
+
+def commutative_form(formula, names=None):
+    '''
+    Returns a string representing formula up to commutativity and
+    associativity of its operators (e.g., a & (b & c) and (c & a) & b have
+    the same form). Literals are replaced by names[uid], if present, and
+    by their uid otherwise.
+
+    :param names: dictionary mapping literal uids to names
+    :type names: dict
+    '''
+    if names is None:
+        names = {}
+
+    forms = {}
+    #flattened operands of associative operators
+    operands = {}
+    for node in post_order(formula):
+        if node.is_literal:
+            form = '%s:%s' % (names.get(node.uid, 'u%d' % node.uid),
+                              node.l_type)
+        elif node.Symbol is None:
+            form = str(node.generate())
+        elif isinstance(node, COMMUTATIVE_CLASSES):
+            node_operands = []
+            for child in children(node):
+                if type(child) is type(node) and isinstance(node, ASSOCIATIVE_CLASSES):
+                    node_operands.extend(operands.pop(id(child)))
+                else:
+                    node_operands.append(forms[id(child)])
+            operands[id(node)] = node_operands
+            form = '(%s %s)' % (node.Symbol, ' '.join(sorted(node_operands)))
+        else:
+            form = '(%s %s)' % (node.Symbol,
+                                ' '.join([forms[id(child)] for child in children(node)]))
+        forms[id(node)] = form
+
+    return forms[id(formula)]
+
+
+def temporal_depth(formula):
+    '''
+    Returns the maximum nesting depth of temporal operators in formula
+    '''
+    depth = {}
+    for node in post_order(formula):
+        sub_depth = max([depth[id(child)] for child in children(node)] or [0])
+        if isinstance(node, TEMPORAL_CLASSES):
+            sub_depth += 1
+        depth[id(node)] = sub_depth
+
+    return depth[id(formula)]
+
+
+def is_syntactic_safety(formula):
+    '''
+    Returns True if formula belongs to the syntactic safety fragment, that is,
+    once negations are pushed to literals only Globally and Next operators
+    are left
+    '''
+    return _check_polarity(formula, Globally, Eventually)
+
+
+def is_syntactic_cosafety(formula):
+    '''
+    Returns True if formula belongs to the syntactic co-safety fragment, that
+    is, once negations are pushed to literals only Eventually and Next
+    operators are left
+    '''
+    return _check_polarity(formula, Eventually, Globally)
+
+
+def temporal_class(formula):
+    '''
+    Returns 'propositional', 'safety', 'cosafety' or 'general', the first
+    syntactic fragment formula belongs to
+    '''
+    if temporal_depth(formula) == 0:
+        return 'propositional'
+    elif is_syntactic_safety(formula):
+        return 'safety'
+    elif is_syntactic_cosafety(formula):
+        return 'cosafety'
+    else:
+        return 'general'
+
+
+def _check_polarity(formula, positive_cls, negative_cls):
+    '''
+    Returns True if, in negation normal form, formula only uses Next and
+    the temporal operators of class positive_cls.
+    It means that in the original formula positive_cls only appears with
+    positive polarity, and negative_cls only with negative polarity
+    '''
+    #polarity is 1 for positive, -1 for negative and 0 for both
+    stack = [(formula, 1)]
+    while stack:
+        (node, polarity) = stack.pop()
+
+        if isinstance(node, positive_cls) and polarity != 1:
+            return False
+        if isinstance(node, negative_cls) and polarity != -1:
+            return False
+
+        if isinstance(node, Negation):
+            stack.append((node.right_formula, -polarity))
+        elif isinstance(node, Implication):
+            stack.append((node.left_formula, -polarity))
+            stack.append((node.right_formula, polarity))
+        elif isinstance(node, Equivalence):
+            stack.append((node.left_formula, 0))
+            stack.append((node.right_formula, 0))
+        else:
+            stack.extend([(child, polarity) for child in children(node)])
+
+    return True
+
+
+class FormulaFeatures(object):
+    '''
+    Collects cheap syntactic features of a formula
+    '''
+
+    FEATURE_NAMES = ('var_count', 'bool_count', 'int_count', 'max_int_range',
+                     'state_bits', 'size', 'temporal_depth', 'is_safety')
+
+    def __init__(self, formula):
+        '''
+        compute features
+        '''
+        literals = get_literals(formula)
+
+        self.var_count = len(literals)
+        self.bool_count = len([l for l in literals if isinstance(l.l_type, Bool)])
+        self.int_ranges = [l.l_type.upper - l.l_type.lower + 1
+                           for l in literals if isinstance(l.l_type, Int)]
+        self.int_count = len(self.int_ranges)
+        self.max_int_range = max(self.int_ranges or [0])
+        self.state_bits = self.bool_count + \
+                sum([int(ceil(log(max(width, 2), 2))) for width in self.int_ranges])
+        self.size = len(post_order(formula))
+        self.temporal_depth = temporal_depth(formula)
+        self.is_safety = is_syntactic_safety(formula)
+
+    def as_dict(self):
+        '''
+        Returns the features as a dictionary
+        '''
+        return {name: getattr(self, name) for name in self.FEATURE_NAMES}
+
+    def __repr__(self):
+        '''
+        pretty print
+        '''
+        return 'FormulaFeatures(%s)' % ', '.join(['%s=%s' % item for item in
+                                                   sorted(self.as_dict().items())])
@@ -0,0 +1,337 @@
+'''
+This module implements the evaluation of LTLFormula objects on lasso
+(ultimately periodic) traces, and a falsifier which looks for lasso
+counterexamples before a solver is called.
+A lasso is a finite sequence of states s0 ... sn-1 with a loop position l,
+and it represents the infinite trace s0 ... sl-1 (sl ... sn-1)^omega.
+
+Author: Antonio Iannopollo
+'''
+
+from random import Random
+from pycolite.formula import (TrueFormula, FalseFormula, Constant, Negation,
+                              Conjunction, Disjunction, Implication, Equivalence,
+                              Globally, Eventually, Next, Addition, Subtraction,
+                              Multiplication, Division, Ge, Geq, Le, Leq)
+from pycolite.formula_analysis import post_order, get_literals
+from pycolite.types import Int
+from pycolite import LOG
+
+
+class Lasso(object):
+    '''
+    Ultimately periodic trace
+    '''
+
+    def __init__(self, states, loop_start=0):
+        '''
+        constructor
+
+        :param states: list of dictionaries, mapping names to values
+        :type states: list of dict
+        :param loop_start: index of the first state of the loop
+        :type loop_start: int
+        '''
+        if not 0 <= loop_start < len(states):
+            raise LassoError('loop start %d out of range' % loop_start)
+
+        self.states = states
+        self.loop_start = loop_start
+
+    def __len__(self):
+        '''
+        number of states
+        '''
+        return len(self.states)
+
+    def values(self, name):
+        '''
+        Returns the list of the values of name in each state
+        '''
+        return [state[name] for state in self.states]
+
+    def renamed(self, names):
+        '''
+        Returns a copy of this lasso, in which each name n is replaced by
+        names[n]. Names not in names are dropped
+        '''
+        return Lasso([{names[name]: value for (name, value) in state.items()
+                       if name in names}
+                      for state in self.states], self.loop_start)
+
+    def __repr__(self):
+        '''
+        pretty print
+        '''
+        return 'Lasso(%s, loop_start=%d)' % (self.states, self.loop_start)
+
+
+def _next_values(values, loop_start):
+    '''
+    Shifts values by one position along the lasso
+    '''
+    return values[1:] + [values[loop_start]]
+
+
+def _globally_values(values, loop_start):
+    '''
+    Computes G on the lasso with a backward sweep
+    '''
+    length = len(values)
+    result = [False] * length
+    loop_value = all(values[loop_start:])
+    for index in range(loop_start, length):
+        result[index] = loop_value
+
+    acc = loop_value
+    for index in range(loop_start - 1, -1, -1):
+        acc = values[index] and acc
+        result[index] = acc
+
+    return result
+
+
+def _eventually_values(values, loop_start):
+    '''
+    Computes F on the lasso with a backward sweep
+    '''
+    length = len(values)
+    result = [False] * length
+    loop_value = any(values[loop_start:])
+    for index in range(loop_start, length):
+        result[index] = loop_value
+
+    acc = loop_value
+    for index in range(loop_start - 1, -1, -1):
+        acc = values[index] or acc
+        result[index] = acc
+
+    return result
+
+
+def _divide(left, right):
+    '''
+    Integer division rounding toward zero
+    '''
+    quotient = abs(left) // abs(right)
+    if (left < 0) != (right < 0):
+        return -quotient
+    return quotient
+
+
+_BINARY_OPERATIONS = {
+    Conjunction: lambda l, r: l and r,
+    Disjunction: lambda l, r: l or r,
+    Implication: lambda l, r: (not l) or r,
+    Equivalence: lambda l, r: l == r,
+    Addition: lambda l, r: l + r,
+    Subtraction: lambda l, r: l - r,
+    Multiplication: lambda l, r: l * r,
+    Division: _divide,
+    Ge: lambda l, r: l > r,
+    Geq: lambda l, r: l >= r,
+    Le: lambda l, r: l < r,
+    Leq: lambda l, r: l <= r,
+    }
+
+
+def evaluate_positions(formula, lasso, name_of=None):
+    '''
+    Evaluates formula in each position of lasso.
+
+    :param name_of: function returning the name used in the lasso for a
+        literal. By default, the unique name of the literal is used
+    :type name_of: function
+    :returns: list of values, one for each state of the lasso
+    '''
+    if name_of is None:
+        name_of = lambda literal: literal.unique_name
+
+    length = len(lasso)
+    loop_start = lasso.loop_start
+    values = {}
+
+    for node in post_order(formula):
+        if node.is_literal:
+            result = lasso.values(name_of(node))
+        elif isinstance(node, TrueFormula):
+            result = [True] * length
+        elif isinstance(node, FalseFormula):
+            result = [False] * length
+        elif isinstance(node, Constant):
+            result = [int(node.value)] * length
+        elif isinstance(node, Negation):
+            result = [not value for value in values[id(node.right_formula)]]
+        elif isinstance(node, Next):
+            result = _next_values(values[id(node.right_formula)], loop_start)
+        elif isinstance(node, Globally):
+            result = _globally_values(values[id(node.right_formula)], loop_start)
+        elif isinstance(node, Eventually):
+            result = _eventually_values(values[id(node.right_formula)], loop_start)
+        else:
+            try:
+                operation = _BINARY_OPERATIONS[type(node)]
+            except KeyError:
+                raise LassoError('cannot evaluate %s' % node.Symbol)
+            result = map(operation, values[id(node.left_formula)],
+                         values[id(node.right_formula)])
+
+        values[id(node)] = result
+
+    return values[id(formula)]
+
+
+def evaluate(formula, lasso, name_of=None):
+    '''
+    Returns True if the trace represented by lasso satisfies formula
+    '''
+    return bool(evaluate_positions(formula, lasso, name_of)[0])
+
+
+def random_value(l_type, rand):
+    '''
+    Returns a random value of type l_type
+    '''
+    if isinstance(l_type, Int):
+        return rand.randint(l_type.lower, l_type.upper)
+    else:
+        return rand.random() < 0.5
+
+
+def is_valid_value(value, l_type):
+    '''
+    Returns True if value belongs to l_type
+    '''
+    if isinstance(l_type, Int):
+        return not isinstance(value, bool) and isinstance(value, (int, long)) \
+                and l_type.lower <= value <= l_type.upper
+    else:
+        return isinstance(value, bool)
+
+
+class LassoFalsifier(object):
+    '''
+    Looks for lasso traces violating a formula, using the traces which
+    falsified previous formulae and random traces.
+    Traces are stored using external names (e.g., port base names), so that
+    they can be replayed on formulae built from different copies of the
+    same contracts
+    '''
+
+    def __init__(self, trace_count=64, max_length=6, max_stored=256, seed=None):
+        '''
+        constructor
+
+        :param trace_count: number of random traces tried for each formula
+        :type trace_count: int
+        :param max_length: maximum number of states of random traces
+        :type max_length: int
+        :param max_stored: maximum number of stored traces
+        :type max_stored: int
+        '''
+        self.trace_count = trace_count
+        self.max_length = max_length
+        self.max_stored = max_stored
+        self.rand = Random(seed)
+        self.seen = []
+        self.witnesses_found = 0
+        self.replayed_witnesses = 0
+
+    def remember(self, lasso):
+        '''
+        Stores a lasso, with external names. The oldest lassos are dropped
+        when more than max_stored lassos are stored
+        '''
+        self.seen.insert(0, lasso)
+        del self.seen[self.max_stored:]
+
+    def _complete(self, lasso, literals, names):
+        '''
+        Returns a lasso on the unique names of literals from a lasso with
+        external names. Missing or invalid values are chosen randomly
+        '''
+        states = []
+        for state in lasso.states:
+            new_state = {}
+            for literal in literals:
+                value = state.get(names.get(literal.unique_name))
+                if not is_valid_value(value, literal.l_type):
+                    value = random_value(literal.l_type, self.rand)
+                new_state[literal.unique_name] = value
+            states.append(new_state)
+
+        return Lasso(states, lasso.loop_start)
+
+    def random_lasso(self, literals):
+        '''
+        Returns a random lasso for the given literals
+        '''
+        length = self.rand.randint(1, self.max_length)
+        states = [{literal.unique_name: random_value(literal.l_type, self.rand)
+                   for literal in literals} for _ in range(length)]
+
+        return Lasso(states, self.rand.randint(0, length - 1))
+
+    def candidates(self, literals, names):
+        '''
+        Generates the lassos to try: stored ones first, then random ones
+        '''
+        for lasso in list(self.seen):
+            yield (True, self._complete(lasso, literals, names))
+
+        for _ in range(self.trace_count):
+            yield (False, self.random_lasso(literals))
+
+    def find_witness(self, formula, names=None):
+        '''
+        Looks for a lasso that does not satisfy formula.
+
+        :param names: dictionary mapping unique names of literals to the
+            external names used to store traces. Literals not in names are
+            stored with their unique name
+        :type names: dict
+        :returns: a Lasso on the unique names of the literals, or None
+        '''
+        if names is None:
+            names = {}
+
+        literals = get_literals(formula)
+        names = {literal.unique_name: names.get(literal.unique_name, literal.unique_name)
+                 for literal in literals}
+
+        for (replayed, lasso) in self.candidates(literals, names):
+            try:
+                satisfied = evaluate(formula, lasso)
+            except ZeroDivisionError:
+                continue
+
+            if not satisfied:
+                LOG.debug('found lasso counterexample %s' % lasso)
+                self.witnesses_found += 1
+                if replayed:
+                    self.replayed_witnesses += 1
+                else:
+                    self.remember(lasso.renamed(names))
+                return lasso
+
+        return None
+
+
+def port_names(contracts):
+    '''
+    Returns a dictionary mapping the unique names of the port literals of
+    contracts to the port base names
+    '''
+    names = {}
+    for contract in contracts:
+        for (name, port) in contract.ports_dict.items():
+            names[port.unique_name] = name
+
+    return names
+
+
+class LassoError(Exception):
+    '''
+    Raised if a lasso is not well formed or a formula cannot be evaluated
+    '''
+    pass
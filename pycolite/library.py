@@ -0,0 +1,168 @@
+'''
+This module implements a library of contracts. Contracts are stored by
+fingerprint, so that duplicated components are verified only once, and they
+are indexed by port signature, so that refinement queries only return the
+candidates whose ports can be mapped to the ports of the abstract contract.
+
+Author: Antonio Iannopollo
+'''
+
+from collections import Counter
+from pycolite.fingerprint import fingerprint, INPUT_ROLE, OUTPUT_ROLE
+from pycolite.types import Int, BOOL_TYPE, INT_TYPE
+from pycolite import LOG
+
+
+def port_type_key(l_type):
+    '''
+    Returns a hashable representation of a port type
+    '''
+    if isinstance(l_type, Int):
+        return (INT_TYPE, l_type.lower, l_type.upper)
+    return (BOOL_TYPE,)
+
+
+def port_signature(contract):
+    '''
+    Returns the port signature of contract: a frozenset of pairs
+    ((role, type), count), where role is input or output
+    '''
+    counts = Counter()
+    for (role, ports) in ((INPUT_ROLE, contract.input_ports_dict),
+                          (OUTPUT_ROLE, contract.output_ports_dict)):
+        for base_name in ports:
+            counts[(role, port_type_key(contract.type_dir[base_name]))] += 1
+
+    return frozenset(counts.items())
+
+
+def signature_size(signature):
+    '''
+    Returns the pair (number of inputs, number of outputs) of a port
+    signature
+    '''
+    inputs = sum([count for ((role, _), count) in signature if role == INPUT_ROLE])
+    outputs = sum([count for ((role, _), count) in signature if role == OUTPUT_ROLE])
+    return (inputs, outputs)
+
+
+def signature_admits(candidate, abstract, exact=False):
+    '''
+    Returns True if a contract with signature candidate can refine a
+    contract with signature abstract, that is, if each port of the abstract
+    contract can be mapped to a distinct port of the candidate with the same
+    role and type.
+
+    :param exact: if True, the two signatures have to be equal
+    :type exact: bool
+    '''
+    if exact:
+        return candidate == abstract
+
+    available = dict(candidate)
+    return all([available.get(kind, 0) >= count for (kind, count) in abstract])
+
+
+class ContractLibrary(object):
+    '''
+    Collection of contracts, deduplicated by fingerprint
+    '''
+
+    def __init__(self, contracts=()):
+        '''
+        constructor
+
+        :param contracts: contracts loaded in the library
+        :type contracts: iterable of Contract
+        '''
+        self.contracts = {}
+        self.fingerprints = {}
+        #fingerprints of the contracts, by port signature
+        self.signatures = {}
+        #port signatures, by number of inputs and outputs
+        self.sizes = {}
+        self.duplicates = 0
+
+        self.load(contracts)
+
+    def add(self, contract):
+        '''
+        Adds contract to the library.
+
+        :returns: the contract stored in the library, which is a previously
+            added contract if contract is a duplicate
+        '''
+        key = fingerprint(contract)
+        try:
+            stored = self.contracts[key]
+        except KeyError:
+            self.contracts[key] = contract
+            self.fingerprints[contract] = key
+            signature = port_signature(contract)
+            if signature not in self.signatures:
+                self.sizes.setdefault(signature_size(signature), []).append(signature)
+            self.signatures.setdefault(signature, []).append(key)
+            return contract
+
+        self.duplicates += 1
+        LOG.debug('%s is a duplicate of %s' % (contract.unique_name, stored.unique_name))
+        return stored
+
+    def load(self, contracts):
+        '''
+        Adds all the contracts to the library
+
+        :returns: the list of the stored contracts, one for each contract
+        '''
+        return [self.add(contract) for contract in contracts]
+
+    def fingerprint(self, contract):
+        '''
+        Returns the fingerprint of contract
+        '''
+        try:
+            return self.fingerprints[contract]
+        except KeyError:
+            return fingerprint(contract)
+
+    def refinement_candidates(self, abstract, exact=False):
+        '''
+        Returns the contracts of the library whose port signature admits a
+        RefinementMapping to the ports of abstract. Other contracts cannot
+        refine abstract, since ports can only be mapped to ports of the same
+        type.
+
+        :param exact: if True, only the contracts with the same signature as
+            abstract are returned
+        :type exact: bool
+        '''
+        signature = port_signature(abstract)
+        if exact:
+            return [self.contracts[key] for key in self.signatures.get(signature, [])]
+
+        #candidates need at least as many inputs and outputs as abstract
+        (inputs, outputs) = signature_size(signature)
+        return [self.contracts[key]
+                for ((candidate_inputs, candidate_outputs), candidates) in self.sizes.items()
+                if candidate_inputs >= inputs and candidate_outputs >= outputs
+                for candidate in candidates
+                if signature_admits(candidate, signature)
+                for key in self.signatures[candidate]]
+
+    def __contains__(self, contract):
+        '''
+        True if the library contains a contract identical to contract
+        '''
+        return self.fingerprint(contract) in self.contracts
+
+    def __iter__(self):
+        '''
+        iterates over the distinct contracts
+        '''
+        return iter(self.contracts.values())
+
+    def __len__(self):
+        '''
+        number of distinct contracts
+        '''
+        return len(self.contracts)
@@ -7,11 +7,16 @@ Author: Antonio Iannopollo
 from pycolite.interface_strategy import RefinementStrategy, \
             CompatibilityStrategy, ConsistencyStrategy
 from tempfile import NamedTemporaryFile
-from subprocess import check_output
+from subprocess import CalledProcessError
 from pycolite.formula import Negation, Implication
 from pycolite.symbol_sets import Ltl3baSymbolSet
 from ConfigParser import SafeConfigParser
-from pycolite.util.util import CONFIG_FILE_RELATIVE_PATH, TOOL_SECT, LTL3BA_OPT
+from pycolite.util.util import (CONFIG_FILE_RELATIVE_PATH, TOOL_SECT, LTL3BA_OPT,
+                                 ToolProcess, LRUCache)
+from pycolite.fast_paths import decide_emptiness, decide_tautology
+from pycolite.formula_analysis import canonical_form
+from pycolite.buchi import (parse_never_claim, abstract_formula, AtomDomain,
+                            ProductAutomaton)
 import os
 from pycolite import LOG
 
@@ -19,6 +24,10 @@ TEMP_FILES_PATH = '/tmp/'
 #LTL3BA_PATH = 'resources/ltl3ba/'
 LTL3BA_FALSE = 'T0_init:\n\tfalse;\n}\n'
 
+#maximum number of automata and verdicts stored by an AutomatonCache
+MAX_CACHED_AUTOMATA = 4096
+MAX_CACHED_VERDICTS = 65536
+
 class Ltl3baPathLoader(object):
     '''
     Loads ltl3ba path from config file the first time
@@ -49,7 +58,7 @@ class Ltl3baPathLoader(object):
 
 def verify_tautology(formula, prefix='',
                      tool_location=Ltl3baPathLoader.get_path(),
-                     delete_file=True):
+                     delete_file=True, cache=None):
     '''
     Verifies if a LTLFormula object represents a tautology
     '''
@@ -59,48 +68,227 @@ def verify_tautology(formula, prefix='',
     n_formula = Negation(formula)
 
     return is_empty_formula(n_formula, prefix=prefix, \
-            tool_location=tool_location, delete_file=delete_file)
+            tool_location=tool_location, delete_file=delete_file, cache=cache)
 
-def is_empty_formula(formula, prefix='',
-                     tool_location=Ltl3baPathLoader.get_path(),
-                     delete_file=True):
+def start_empty_formula_check(formula, prefix='',
+                              tool_location=Ltl3baPathLoader.get_path(),
+                              delete_file=True):
+    '''
+    Starts ltl3ba in background to verify if a LTLFormula object represents
+    an empty formula.
+
+    :returns: ToolProcess object. Its wait method returns True if the
+        formula is empty and False otherwise
+    '''
+
+    temp_file = NamedTemporaryFile( \
+            prefix='%s' % prefix,
+            dir=TEMP_FILES_PATH, suffix='.ltl', delete=delete_file)
+
+    formula_str = formula.generate(symbol_set=Ltl3baSymbolSet, \
+            ignore_precedence=True)
+
+    #LOG.debug(formula_str)
+
+    temp_file.write(formula_str)
+    temp_file.flush()
+
+    return ToolProcess([tool_location, '-F', temp_file.name], [temp_file],
+                       _parse_ltl3ba_output)
+
+def _parse_ltl3ba_output(output, returncode):
     '''
-    Verifies if a LTLFormula object represents an empty formula
+    Returns True if ltl3ba produced the empty automaton.
+    Raises CalledProcessError if ltl3ba failed.
     '''
+    if returncode != 0:
+        raise CalledProcessError(returncode, 'ltl3ba', output)
+
+    if output.endswith(LTL3BA_FALSE):
+        return True
+    else:
+        #LOG.debug(output)
+        return False
+
+def start_translation(skeleton, prefix='',
+                      tool_location=Ltl3baPathLoader.get_path(),
+                      delete_file=True):
+    '''
+    Starts ltl3ba in background to translate a formula skeleton, in ltl3ba
+    syntax, to a Buchi automaton.
 
+    :returns: ToolProcess object. Its wait method returns a BuchiAutomaton
+    '''
     temp_file = NamedTemporaryFile( \
             prefix='%s' % prefix,
             dir=TEMP_FILES_PATH, suffix='.ltl', delete=delete_file)
 
-    with temp_file:
-        formula_str = formula.generate(symbol_set=Ltl3baSymbolSet, \
-                ignore_precedence=True)
+    temp_file.write(skeleton)
+    temp_file.flush()
+
+    return ToolProcess([tool_location, '-F', temp_file.name], [temp_file],
+                       _parse_translation_output)
+
+def _parse_translation_output(output, returncode):
+    '''
+    Returns the BuchiAutomaton printed by ltl3ba.
+    Raises CalledProcessError if ltl3ba failed.
+    '''
+    if returncode != 0:
+        raise CalledProcessError(returncode, 'ltl3ba', output)
+
+    return parse_never_claim(output)
+
+
+class AutomatonCache(object):
+    '''
+    Caches the Buchi automata of formulae. Automata are stored by formula
+    skeleton, thus all the formulae with the same temporal structure share
+    the same translation, and emptiness verdicts are stored by canonical
+    form. At most max_automata automata and max_verdicts verdicts are
+    stored (any number if None), and the least recently used ones are
+    evicted first
+    '''
+
+    def __init__(self, tool_location=Ltl3baPathLoader.get_path(), delete_files=True,
+                 max_automata=MAX_CACHED_AUTOMATA, max_verdicts=MAX_CACHED_VERDICTS):
+        '''
+        constructor
+        '''
+        self.tool_location = tool_location
+        self.delete_files = delete_files
+        self.automata = LRUCache(max_automata)
+        self.verdicts = LRUCache(max_verdicts)
+        self.translations = 0
+        self.hits = 0
+
+    def automaton(self, formula, prefix=''):
+        '''
+        Returns the Buchi automaton of formula and the AtomDomain of its
+        atoms. ltl3ba is called only if no formula with the same skeleton
+        was translated before
+        '''
+        (skeleton, atoms) = abstract_formula(formula)
+        try:
+            automaton = self.automata.lookup(skeleton)
+            self.hits += 1
+        except KeyError:
+            process = start_translation(skeleton, prefix=prefix,
+                                        tool_location=self.tool_location,
+                                        delete_file=self.delete_files)
+            automaton = process.wait()
+            self.automata[skeleton] = automaton
+            self.translations += 1
+
+        return (automaton, AtomDomain(atoms))
+
+    def is_empty(self, formula, prefix=''):
+        '''
+        Returns True if formula is empty, False if it is not, or None if the
+        automaton is not empty but its atoms could not be encoded
+        '''
+        key = canonical_form(formula)
+        try:
+            return self.verdicts.lookup(key)
+        except KeyError:
+            pass
+
+        (automaton, domain) = self.automaton(formula, prefix)
+        verdict = automaton.is_empty(domain.feasible)
+        if not verdict and not domain.exact:
+            verdict = None
+
+        self.verdicts[key] = verdict
+        return verdict
+
+    def intersection_is_empty(self, left, right, prefix=''):
+        '''
+        Returns True if the conjunction of the formulae left and right is
+        empty, False if it is not, or None if the product is not empty but
+        the atoms could not be encoded.
+        The product of the two cached automata is explored on the fly
+        '''
+        (left_automaton, left_domain) = self.automaton(left, prefix)
+        (right_automaton, right_domain) = self.automaton(right, prefix)
+        domain = AtomDomain(left_domain.atoms + right_domain.atoms)
+
+        product = ProductAutomaton(left_automaton, right_automaton,
+                                   len(left_domain.atoms))
+        verdict = product.is_empty(domain.feasible)
+        if not verdict and not domain.exact:
+            return None
+
+        return verdict
+
+    def contract_automata(self, contract, prefix=''):
+        '''
+        Translates the formulae A, G, !A and !G of contract.
+
+        :returns: dictionary mapping 'A', 'G', '!A' and '!G' to pairs
+            (automaton, AtomDomain)
+        '''
+        assume = contract.assume_formula
+        guarantee = contract.guarantee_formula
+        return {'A': self.automaton(assume, prefix),
+                'G': self.automaton(guarantee, prefix),
+                '!A': self.automaton(Negation(assume), prefix),
+                '!G': self.automaton(Negation(guarantee), prefix)}
+
+    def clear(self):
+        '''
+        Empties the cache
+        '''
+        self.automata.clear()
+        self.verdicts.clear()
 
-        #LOG.debug(formula_str)
 
-        temp_file.write(formula_str)
-        temp_file.seek(0)
+AUTOMATON_CACHE = AutomatonCache()
 
-        output = check_output([tool_location, '-F', temp_file.name])
 
-        if output.endswith(LTL3BA_FALSE):
-            return True
+def is_empty_formula(formula, prefix='',
+                     tool_location=Ltl3baPathLoader.get_path(),
+                     delete_file=True, cache=None):
+    '''
+    Verifies if a LTLFormula object represents an empty formula.
+    Trivial formulae are decided without calling ltl3ba. Otherwise, the
+    formula is translated to a Buchi automaton, which is cached and checked
+    for emptiness in-process.
+
+    :param cache: AutomatonCache used to store the translation. If None,
+        AUTOMATON_CACHE is used when tool_location is the default one
+    :type cache: AutomatonCache
+    '''
+    verdict = decide_emptiness(formula)
+    if verdict is not None:
+        return verdict
+
+    if cache is None:
+        if tool_location == AUTOMATON_CACHE.tool_location:
+            cache = AUTOMATON_CACHE
         else:
-            #LOG.debug(output)
-            return False
+            cache = AutomatonCache(tool_location, delete_file)
+
+    #like the syntactic check on the ltl3ba output, a non empty automaton
+    #with atoms which cannot be encoded is reported as not empty
+    return bool(cache.is_empty(formula, prefix=prefix))
 
 class Ltl3baContractInterface(object):
     '''
     Base class to interface a contract with ltl3ba
     '''
 
-    def __init__(self, contract, tool_location=Ltl3baPathLoader.get_path()):
+    def __init__(self, contract, tool_location=Ltl3baPathLoader.get_path(),
+                 cache=None):
         '''
         constructor. Loads the basic information on how to locate
         and launch the script
+
+        :param cache: AutomatonCache shared among checks
+        :type cache: AutomatonCache
         '''
         self.contract = contract
         self.tool_location = tool_location
+        self.cache = cache
 
 
 class Ltl3baRefinementStrategy(Ltl3baContractInterface):
@@ -108,13 +296,14 @@ class Ltl3baRefinementStrategy(Ltl3baContractInterface):
     Interface with ltl3ba for refinement check
     '''
 
-    def __init__(self, contract, tool_location=Ltl3baPathLoader.get_path(), delete_files=True):
+    def __init__(self, contract, tool_location=Ltl3baPathLoader.get_path(), delete_files=True,
+                 cache=None):
         '''
         override constructor
         '''
         self.delete_files = delete_files
 
-        super(Ltl3baRefinementStrategy, self).__init__(contract, tool_location)
+        super(Ltl3baRefinementStrategy, self).__init__(contract, tool_location, cache)
 
     def check_refinement(self, abstract_contract):
         '''
@@ -129,7 +318,8 @@ class Ltl3baRefinementStrategy(Ltl3baContractInterface):
         output = verify_tautology(assumption_check_formula, \
                     prefix='%s_assumptions_ltl3ba_' % contract_name, \
                     tool_location=self.tool_location, \
-                    delete_file=self.delete_files)
+                    delete_file=self.delete_files, \
+                cache=self.cache)
 
         #LOG.debug('assumptions are ok')
         #LOG.debug(assumption_check_formula.generate())
@@ -138,7 +328,8 @@ class Ltl3baRefinementStrategy(Ltl3baContractInterface):
             output = verify_tautology(guarantee_check_formula, \
                     prefix='%s_guarantees_ltl3ba_' % contract_name, \
                     tool_location=self.tool_location, \
-                    delete_file=self.delete_files)
+                    delete_file=self.delete_files, \
+                cache=self.cache)
 
             #LOG.debug('guarantees')
             #LOG.debug(guarantee_check_formula.generate())
@@ -173,18 +364,70 @@ class Ltl3baRefinementStrategy(Ltl3baContractInterface):
 RefinementStrategy.register(Ltl3baRefinementStrategy)
 
 
+class Ltl3baProductRefinementStrategy(Ltl3baContractInterface):
+    '''
+    Checks refinement in-process, as the emptiness of the products of the
+    cached automata of A_abs and !A_ref, and of G_ref and !G_abs.
+    ltl3ba is only called to translate the formulae not in the cache
+    '''
+
+    def __init__(self, contract, tool_location=Ltl3baPathLoader.get_path(), delete_files=True,
+                 cache=None):
+        '''
+        override constructor
+        '''
+        self.delete_files = delete_files
+
+        if cache is None:
+            if tool_location == AUTOMATON_CACHE.tool_location:
+                cache = AUTOMATON_CACHE
+            else:
+                cache = AutomatonCache(tool_location, delete_files)
+
+        super(Ltl3baProductRefinementStrategy, self).__init__(contract, tool_location,
+                                                              cache)
+
+    def check_refinement(self, abstract_contract):
+        '''
+        Override of abstract method
+        '''
+        contract_name = self.contract.name_attribute.unique_name
+
+        checks = [(abstract_contract.assume_formula, self.contract.assume_formula,
+                   '%s_assumptions_ltl3ba_' % contract_name),
+                  (self.contract.guarantee_formula, abstract_contract.guarantee_formula,
+                   '%s_guarantees_ltl3ba_' % contract_name)]
+
+        for (antecedent, consequent, prefix) in checks:
+            verdict = decide_tautology(Implication(antecedent, consequent,
+                                                   merge_literals=False))
+            if verdict is None:
+                #a non empty product with atoms which cannot be encoded is
+                #not a proof of refinement
+                verdict = bool(self.cache.intersection_is_empty(
+                    antecedent, Negation(consequent), prefix=prefix))
+            if not verdict:
+                return False
+
+        return True
+
+
+RefinementStrategy.register(Ltl3baProductRefinementStrategy)
+
+
 class Ltl3baCompatibilityStrategy(Ltl3baContractInterface):
     '''
     Defines an object used to check compatibility of a contract
     interfacing with ltl3ba
     '''
-    def __init__(self, contract, tool_location=Ltl3baPathLoader.get_path(), delete_files=True):
+    def __init__(self, contract, tool_location=Ltl3baPathLoader.get_path(), delete_files=True,
+                 cache=None):
         '''
         override constructor
         '''
         self.delete_files = delete_files
 
-        super(Ltl3baCompatibilityStrategy, self).__init__(contract, tool_location)
+        super(Ltl3baCompatibilityStrategy, self).__init__(contract, tool_location, cache)
 
 
     def check_compatibility(self):
@@ -197,7 +440,8 @@ class Ltl3baCompatibilityStrategy(Ltl3baContractInterface):
         return not is_empty_formula(self.contract.assume_formula, \
                 prefix='%s_compatibility_ltl3ba_' % contract_name, \
                 tool_location=self.tool_location, \
-                delete_file=self.delete_files)
+                delete_file=self.delete_files, \
+                cache=self.cache)
 
 
 CompatibilityStrategy.register(Ltl3baCompatibilityStrategy)
@@ -208,13 +452,14 @@ class Ltl3baConsistencyStrategy(Ltl3baContractInterface):
     Defines an object used to check consistency of a contract
     interfacing with ltl3ba
     '''
-    def __init__(self, contract, tool_location=Ltl3baPathLoader.get_path(), delete_files=True):
+    def __init__(self, contract, tool_location=Ltl3baPathLoader.get_path(), delete_files=True,
+                 cache=None):
         '''
         override constructor
         '''
         self.delete_files = delete_files
 
-        super(Ltl3baConsistencyStrategy, self).__init__(contract, tool_location)
+        super(Ltl3baConsistencyStrategy, self).__init__(contract, tool_location, cache)
 
     def check_consistency(self):
         '''
@@ -225,7 +470,8 @@ class Ltl3baConsistencyStrategy(Ltl3baContractInterface):
         return not is_empty_formula(self.contract.guarantee_formula, \
                 prefix='%s_consistency_ltl3ba_' % contract_name, \
                 tool_location=self.tool_location, \
-                delete_file=self.delete_files)
+                delete_file=self.delete_files, \
+                cache=self.cache)
 
 
 ConsistencyStrategy.register(Ltl3baConsistencyStrategy)
@@ -0,0 +1,219 @@
+'''
+This module searches refinement mappings automatically.
+A refinement mapping pairs each port of the abstract contract with a
+distinct port of the refining contract with the same role and type.
+Mappings are enumerated up to symmetry: two ports of a contract are
+symmetric if swapping them leaves its assume and guarantee formulae
+unchanged, up to commutativity and associativity. Symmetry is an
+equivalence relation, and mappings which only differ by a permutation of
+symmetric ports give the same verdict, thus only one mapping for each class
+is generated. Each class is identified by how many ports of each abstract
+symmetry class are mapped to each refining symmetry class.
+Candidates are ranked by the number of ports mapped to ports with the same
+name, and verified in order until one succeeds.
+
+Author: Antonio Iannopollo
+'''
+
+from itertools import product
+from pycolite.contract import RefinementMapping
+from pycolite.fingerprint import port_names_map, INPUT_ROLE, OUTPUT_ROLE
+from pycolite.formula_analysis import commutative_form
+from pycolite.library import port_type_key
+from pycolite import LOG
+
+#maximum number of mappings ranked before verification
+MAX_MAPPINGS = 1000
+
+
+def _port_groups(contract):
+    '''
+    Returns a dictionary mapping pairs (role, type) to the sorted list of
+    the base names of the ports of contract with that role and type
+    '''
+    groups = {}
+    for (role, ports) in ((INPUT_ROLE, contract.input_ports_dict),
+                          (OUTPUT_ROLE, contract.output_ports_dict)):
+        for base_name in sorted(ports):
+            kind = (role, port_type_key(contract.type_dir[base_name]))
+            groups.setdefault(kind, []).append(base_name)
+
+    return groups
+
+
+def _formulae_form(contract, names):
+    '''
+    Returns the form of the formulae of contract with the given renaming,
+    up to commutativity and associativity
+    '''
+    return (commutative_form(contract.assume_formula, names),
+            commutative_form(contract.guarantee_formula, names))
+
+
+def symmetry_classes(contract):
+    '''
+    Returns the symmetry classes of the ports of contract, as a dictionary
+    mapping pairs (role, type) to lists of classes. Each class is a sorted
+    list of base names
+    '''
+    names = port_names_map(contract)
+    reference = _formulae_form(contract, names)
+    ports = contract.ports_dict
+
+    classes = {}
+    for (kind, base_names) in _port_groups(contract).items():
+        kind_classes = []
+        for base_name in base_names:
+            for port_class in kind_classes:
+                #swap the names of the two ports
+                swapped = dict(names)
+                first = ports[port_class[0]].literal.uid
+                second = ports[base_name].literal.uid
+                if first == second:
+                    continue
+                swapped[first] = names[second]
+                swapped[second] = names[first]
+                if _formulae_form(contract, swapped) == reference:
+                    port_class.append(base_name)
+                    break
+            else:
+                kind_classes.append([base_name])
+        classes[kind] = kind_classes
+
+    return classes
+
+
+def _distributions(total, capacities):
+    '''
+    Generates the ways of distributing total items among bins with the given
+    capacities, as tuples of counts
+    '''
+    if not capacities:
+        if total == 0:
+            yield ()
+        return
+
+    for count in range(min(total, capacities[0]), -1, -1):
+        for rest in _distributions(total - count, capacities[1:]):
+            yield (count,) + rest
+
+
+def _count_matrices(row_sums, capacities):
+    '''
+    Generates the matrices of non negative integers with the given row sums
+    and column sums bounded by capacities
+    '''
+    if not row_sums:
+        yield ()
+        return
+
+    for row in _distributions(row_sums[0], capacities):
+        remaining = [capacity - count for (capacity, count) in zip(capacities, row)]
+        for rest in _count_matrices(row_sums[1:], remaining):
+            yield (row,) + rest
+
+
+def _group_mappings(abstract_classes, refined_classes):
+    '''
+    Generates a mapping for each symmetry class of mappings between the
+    ports of one role and type. Among the equivalent mappings, pairs of ports
+    with the same name are preferred
+    '''
+    row_sums = [len(port_class) for port_class in abstract_classes]
+    capacities = [len(port_class) for port_class in refined_classes]
+
+    for matrix in _count_matrices(row_sums, capacities):
+        mapping = {}
+        used = set()
+        for (abstract_class, row) in zip(abstract_classes, matrix):
+            for (refined_class, count) in zip(refined_classes, row):
+                if count == 0:
+                    continue
+                sources = [name for name in abstract_class if name not in mapping]
+                targets = [name for name in refined_class if name not in used]
+
+                pairs = [(name, name) for name in sources if name in targets][:count]
+                paired = set([name for (name, _) in pairs])
+                pairs += zip([name for name in sources if name not in paired],
+                             [name for name in targets if name not in paired]
+                            )[:count - len(pairs)]
+
+                for (source, target) in pairs:
+                    mapping[source] = target
+                    used.add(target)
+        yield mapping
+
+
+def enumerate_mappings(refined, abstract):
+    '''
+    Generates the mappings from the ports of abstract to the ports of
+    refined, one for each class of symmetric mappings.
+    Mappings are dictionaries from abstract base names to refined base names
+    '''
+    abstract_classes = symmetry_classes(abstract)
+    refined_classes = symmetry_classes(refined)
+
+    if any([kind not in refined_classes for kind in abstract_classes]):
+        return
+
+    kinds = sorted(abstract_classes)
+    for mappings in product(*[list(_group_mappings(abstract_classes[kind],
+                                                   refined_classes[kind]))
+                              for kind in kinds]):
+        result = {}
+        for mapping in mappings:
+            result.update(mapping)
+        yield result
+
+
+def rank_mappings(mappings, max_mappings=MAX_MAPPINGS):
+    '''
+    Returns at most max_mappings mappings, sorted by decreasing number of
+    ports mapped to ports with the same name
+    '''
+    ranked = []
+    for mapping in mappings:
+        ranked.append(mapping)
+        if len(ranked) >= max_mappings:
+            LOG.debug('mapping search truncated to %d candidates' % max_mappings)
+            break
+
+    ranked.sort(key=lambda mapping: -sum([abstract_name == refined_name
+                                          for (abstract_name, refined_name)
+                                          in mapping.items()]))
+    return ranked
+
+
+def build_refinement_mapping(refined, abstract, mapping):
+    '''
+    Returns the RefinementMapping object corresponding to a dictionary from
+    abstract base names to refined base names
+    '''
+    refinement_mapping = RefinementMapping([refined, abstract])
+    for (abstract_name, refined_name) in mapping.items():
+        refinement_mapping.add(refined.ports_dict[refined_name],
+                               abstract.ports_dict[abstract_name])
+
+    return refinement_mapping
+
+
+def find_refinement_mapping(refined, abstract, strategy_factory=None,
+                            max_mappings=MAX_MAPPINGS):
+    '''
+    Looks for a mapping of the ports of abstract to the ports of refined such
+    that refined refines abstract.
+
+    :param strategy_factory: function returning a new strategy object for
+        refined. If None, the default strategy is used
+    :type strategy_factory: callable
+    :returns: the first RefinementMapping which verifies, or None
+    '''
+    for mapping in rank_mappings(enumerate_mappings(refined, abstract), max_mappings):
+        refinement_mapping = build_refinement_mapping(refined, abstract, mapping)
+        strategy_obj = None if strategy_factory is None else strategy_factory(refined)
+
+        if refined.is_refinement(abstract, refinement_mapping=refinement_mapping,
+                                 strategy_obj=strategy_obj):
+            return refinement_mapping
+
+    return None
@@ -7,22 +7,27 @@ Author: Antonio Iannopollo
 from pycolite.interface_strategy import (RefinementStrategy,
             CompatibilityStrategy, ConsistencyStrategy, ApproximationStrategy)
 from tempfile import NamedTemporaryFile
-from subprocess import check_output, STDOUT
+from subprocess import CalledProcessError
 from pycolite.formula import Negation, Implication, Conjunction
 from pycolite.symbol_sets import NusmvSymbolSet
 from ConfigParser import SafeConfigParser
-from pycolite.util.util import CONFIG_FILE_RELATIVE_PATH, TOOL_SECT, NUXMV_OPT
+from pycolite.util.util import (CONFIG_FILE_RELATIVE_PATH, TOOL_SECT, NUXMV_OPT,
+                                 ToolProcess)
 import os
 from pycolite import LOG
 from pycolite.types import Bool, Int
+from pycolite.variable_ordering import variable_order
+from pycolite.fast_paths import decide_tautology
+from pycolite.lasso import Lasso, port_names
 
 #OPT_NUXMV = '-coi'
 CMD_OPT = '-dcx'
 
 #trace delimiters
-#TR_INIT = 'Trace Type: Counterexample'
-#TR_COMMENT = '--'
-#TR_STATE = '->'
+TR_INIT = 'Trace Type: Counterexample'
+TR_STATE = '-> State:'
+TR_INPUT = '-> Input:'
+TR_LOOP = '-- Loop starts here'
 
 MODULE_TEMPLATE = '''
 MODULE main()
@@ -38,12 +43,78 @@ LTLSPEC (
 
 TEMP_FILES_PATH = '/tmp/'
 NUXMV_TRUE = 'is true\n'
+NUXMV_FALSE = 'is false'
 
-def trace_parser(trace):
+#bound used by the bmc engine
+BMC_BOUND = 20
+
+#if True, variables are given to nuxmv as v0 ... vn
+SHORT_NAMES = True
+SHORT_NAME_PREFIX = 'v'
+
+def trace_parser(trace, solver_names=None):
     '''
-    Parses the output of nuxmv and give a list of the involved variables/contracts
+    Parses the output of nuxmv and returns the counterexample it contains as
+    a lasso.Lasso object on the unique names of the variables, or None if
+    the output does not contain a counterexample.
+    nuxmv prints all the variables in the first state and only the changed
+    ones in the following states.
+
+    :param solver_names: dictionary mapping the names used in the model to
+        unique names, if they differ
+    :type solver_names: dict
     '''
-    pass
+    lines = iter(trace.splitlines())
+    for line in lines:
+        if line.strip().startswith(TR_INIT):
+            break
+    else:
+        return None
+
+    states = []
+    loop_start = None
+    in_state = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith(TR_STATE):
+            current = dict(states[-1]) if states else {}
+            states.append(current)
+            in_state = True
+        elif line.startswith(TR_INPUT):
+            in_state = False
+        elif line.startswith(TR_LOOP):
+            loop_start = len(states)
+        elif line.startswith('-- specification'):
+            #the trace is over, and the output of a new check begins
+            break
+        elif in_state and '=' in line:
+            (name, value) = [token.strip() for token in line.split('=', 1)]
+            if solver_names is not None:
+                name = solver_names.get(name, name)
+            current[name] = _parse_trace_value(value)
+
+    if not states or loop_start is None or loop_start >= len(states):
+        return None
+
+    #the last state repeats the first state of the loop
+    if len(states) - loop_start > 1 and states[-1] == states[loop_start]:
+        states.pop()
+
+    return Lasso(states, loop_start)
+
+
+def _parse_trace_value(value):
+    '''
+    Converts a value printed by nuxmv
+    '''
+    if value == 'TRUE':
+        return True
+    elif value == 'FALSE':
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        return value
 
 class NuxmvPathLoader(object):
     '''
@@ -72,78 +143,307 @@ class NuxmvPathLoader(object):
 
         return cls.nuxmv_path
 
-def is_empty_formula(formula, prefix='',
-                     tool_location=NuxmvPathLoader.get_path(),
-                     delete_file=True):
+class NuxmvEngine(object):
     '''
-    Verifies if a LTLFormula object represents an empty formula
+    Describes how nuxmv is run to check a LTLSPEC, i.e., which command line
+    options are used and which commands are executed.
+    If commands is None, nuxmv runs in batch mode, which corresponds to
+    the BDD-based check_ltlspec.
     '''
 
-    #to check if formula implication is valid, we negate it
-    #and check that the negation is an empty automaton
-    n_formula = Negation(formula)
+    def __init__(self, name, options=(), commands=None):
+        '''
+        constructor
+
+        :param name: engine name
+        :type name: string
+        :param options: command line options
+        :type options: list of strings
+        :param commands: nuxmv commands to be executed instead of batch mode
+        :type commands: list of strings
+        '''
+        self.name = name
+        self.options = list(options)
+        self.commands = commands
 
-    return verify_tautology(n_formula, prefix=prefix, \
-            tool_location=tool_location, delete_file=delete_file)
+    def start(self, formula, prefix='', tool_location=NuxmvPathLoader.get_path(),
+              delete_file=True, variable_order=None):
+        '''
+        Starts nuxmv in background to verify if formula is a tautology.
+        If variable_order is provided, it is given to nuxmv as initial
+        BDD variable ordering.
+
+        :returns: ToolProcess object. Its wait method returns True if the
+            formula is a tautology, False if it is not, and None if the engine
+            cannot give a definitive answer. Its solver_names attribute maps
+            the names used in the model to unique names
+        '''
+        model_file = NamedTemporaryFile( \
+                prefix='%s' % prefix,
+                dir=TEMP_FILES_PATH, suffix='.smv', delete=delete_file)
+        temp_files = [model_file]
 
-def verify_tautology(formula, prefix='',
-                     tool_location=NuxmvPathLoader.get_path(),
-                     delete_file=True):
+        (var_names, solver_names) = write_model(model_file, formula, variable_order)
+
+        cmd = [tool_location] + self.options
+
+        if variable_order is not None:
+            order_file = NamedTemporaryFile( \
+                prefix='%s' % prefix,
+                dir=TEMP_FILES_PATH, suffix='.ord', delete=delete_file)
+            temp_files.append(order_file)
+
+            order_file.write(''.join(['%s\n' % name for name in var_names]))
+            order_file.flush()
+
+            cmd += ['-i', order_file.name]
+
+        if self.commands is not None:
+            script_file = NamedTemporaryFile( \
+                prefix='%s' % prefix,
+                dir=TEMP_FILES_PATH, suffix='.cmd', delete=delete_file)
+            temp_files.append(script_file)
+
+            script_file.write('\n'.join(self.commands + ['quit']) + '\n')
+            script_file.flush()
+
+            cmd += ['-source', script_file.name]
+
+        cmd.append(model_file.name)
+
+        process = ToolProcess(cmd, temp_files, _parse_nuxmv_output)
+        process.solver_names = solver_names
+        return process
+
+    def __repr__(self):
+        '''
+        pretty print
+        '''
+        return 'NuxmvEngine(%s)' % self.name
+
+
+#available engines. bmc can only find counterexamples
+NUXMV_ENGINES = {
+    'bdd': NuxmvEngine('bdd'),
+    'bdd_dynamic': NuxmvEngine('bdd_dynamic', options=['-dynamic']),
+    'klive': NuxmvEngine('klive', commands=['go', 'build_boolean_model',
+                                            'check_ltlspec_klive']),
+    'ic3': NuxmvEngine('ic3', commands=['go', 'build_boolean_model',
+                                        'check_ltlspec_ic3']),
+    'bmc': NuxmvEngine('bmc', commands=['go_bmc',
+                                        'check_ltlspec_bmc -k %d' % BMC_BOUND]),
+    }
+
+DEFAULT_ENGINE = NUXMV_ENGINES['bdd']
+
+
+def _parse_nuxmv_output(output, returncode):
     '''
-    Verifies if a LTLFormula object represents a tautology
+    Returns True if the output of nuxmv says that the specification is true,
+    False if it is false and None if no verdict is given.
+    Raises CalledProcessError if nuxmv failed.
     '''
+    if returncode != 0:
+        raise CalledProcessError(returncode, 'nuxmv', output)
+
+    if output.endswith(NUXMV_TRUE):
+        return True
+
+    for line in output.splitlines():
+        if line.startswith('-- '):
+            if line.endswith(NUXMV_FALSE):
+                return False
+            elif line.endswith(NUXMV_TRUE.strip()):
+                return True
+
+    return None
+
+
+def write_model(model_file, formula, variable_order=None, short_names=None):
+    '''
+    Writes the smv model used to check formula in model_file.
+    Variables are declared following variable_order, if provided. Variables
+    not in variable_order are declared last, in alphabetical order.
+    Variables are identified by the uids of the literals, thus distinct
+    literals sharing a unique name are declared as distinct variables.
+    If short_names is True, variables are renamed v0 ... vn in declaration
+    order, and their unique names are kept in comments. If None, it
+    defaults to SHORT_NAMES.
+
+    :returns: tuple (list of the declared variable names, in order,
+        dictionary mapping the declared names to unique names)
+    '''
+    if short_names is None:
+        short_names = SHORT_NAMES
+
+    literals = {l.uid: l for (_, l) in formula.get_literal_items()}
+
+    uids = {}
+    for (uid, literal) in literals.items():
+        uids.setdefault(literal.unique_name, []).append(uid)
 
-    temp_file = NamedTemporaryFile( \
-            prefix='%s' % prefix,
-            dir=TEMP_FILES_PATH, suffix='.smv', delete=delete_file)
+    if variable_order is None:
+        variable_order = []
+
+    remaining = dict(uids)
+    ordered_uids = []
+    for name in variable_order:
+        ordered_uids.extend(sorted(remaining.pop(name, [])))
+    for name in sorted(remaining):
+        ordered_uids.extend(sorted(remaining[name]))
+
+    unique_names = [literals[uid].unique_name for uid in ordered_uids]
+
+    if short_names:
+        var_names = ['%s%d' % (SHORT_NAME_PREFIX, index)
+                     for index in range(len(ordered_uids))]
+    else:
+        #literals sharing a unique name are told apart by their uids
+        var_names = [name if len(uids.get(name, ())) < 2 else '%s__%d' % (name, uid)
+                     for (name, uid) in zip(unique_names, ordered_uids)]
 
     formula_str = formula.generate(symbol_set=NusmvSymbolSet, \
-                ignore_precedence=True)
+                ignore_precedence=True, names=dict(zip(ordered_uids, var_names)))
 
-    literals = [l for (_, l) in formula.get_literal_items()]
-    #LOG.debug(literals)
-    var_list = []
-    for l in literals:
-        if isinstance(l.l_type, Bool):
-            var_list.append('\t%s: boolean;\n' %l.unique_name)
-        elif isinstance(l.l_type, Int):
-            var_list.append('\t%s: %d..%d;\n' % (l.unique_name, l.l_type.lower, l.l_type.upper))
+    var_str = ''
+    for (var_name, uid) in zip(var_names, ordered_uids):
+        l_type = literals[uid].l_type
+        unique_name = literals[uid].unique_name
+        comment = ' -- %s' % unique_name if short_names else ''
+        if isinstance(l_type, Bool):
+            var_str += '\t%s: boolean;%s\n' % (var_name, comment)
+        elif isinstance(l_type, Int):
+            var_str += '\t%s: %d..%d;%s\n' % (var_name, l_type.lower,
+                                                l_type.upper, comment)
 
-    var_list = set(var_list)
-    #var_list = set(['\t%s: boolean;\n' %l.unique_name for l in literals])
-    var_str = ''.join(var_list)
+    #LOG.debug(MODULE_TEMPLATE % (var_str, formula_str))
 
-    with temp_file:
+    model_file.write(MODULE_TEMPLATE % (var_str, formula_str))
+    model_file.flush()
 
+    return (var_names, dict(zip(var_names, unique_names)))
 
-        #LOG.debug(MODULE_TEMPLATE % (var_str, formula_str))
 
-        temp_file.write(MODULE_TEMPLATE % (var_str, formula_str))
-        temp_file.seek(0)
+def is_empty_formula(formula, prefix='',
+                     tool_location=NuxmvPathLoader.get_path(),
+                     delete_file=True, engine=DEFAULT_ENGINE, variable_order=None):
+    '''
+    Verifies if a LTLFormula object represents an empty formula
+    '''
 
-        #output = check_output([tool_location, CMD_OPT, temp_file.name])
-        output = check_output([tool_location, temp_file.name],
-                              stderr=STDOUT,)
-        #LOG.debug(output)
-        #LOG.debug(output.endswith(NUXMV_FALSE))
-        if output.endswith(NUXMV_TRUE):
-            return True
-        else:
-            #LOG.debug(output)
-            return False
+    #to check if formula implication is valid, we negate it
+    #and check that the negation is an empty automaton
+    n_formula = Negation(formula)
+
+    return verify_tautology(n_formula, prefix=prefix, \
+            tool_location=tool_location, delete_file=delete_file,
+            engine=engine, variable_order=variable_order)
+
+def verify_tautology(formula, prefix='',
+                     tool_location=NuxmvPathLoader.get_path(),
+                     delete_file=True, engine=DEFAULT_ENGINE, variable_order=None,
+                     on_counterexample=None):
+    '''
+    Verifies if a LTLFormula object represents a tautology.
+    Trivial formulae are decided without calling nuxmv.
+    If engine cannot give a definitive answer (e.g., bmc), the formula is
+    checked again with DEFAULT_ENGINE, and InconclusiveVerdictError is
+    raised if it cannot either.
+    If formula is not a tautology and on_counterexample is provided, it is
+    called with the counterexample given by nuxmv, as a lasso.Lasso object
+    '''
+    verdict = decide_tautology(formula)
+    if verdict is not None:
+        return verdict
+
+    engines = [engine]
+    if engine is not DEFAULT_ENGINE:
+        engines.append(DEFAULT_ENGINE)
+
+    for current_engine in engines:
+        process = current_engine.start(formula, prefix=prefix,
+                                       tool_location=tool_location,
+                                       delete_file=delete_file,
+                                       variable_order=variable_order)
+
+        verdict = process.wait()
+        if verdict is not None:
+            break
+        LOG.debug('no verdict from %s' % current_engine)
+    else:
+        raise InconclusiveVerdictError(engines)
+
+    if verdict is False and on_counterexample is not None:
+        lasso = trace_parser(process.output, process.solver_names)
+        if lasso is not None:
+            on_counterexample(lasso)
+
+    #LOG.debug(output)
+    return verdict
 
 class NuxmvContractInterface(object):
     '''
     Base class to interface a contract with nuxmv
     '''
 
-    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path()):
+    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(),
+                 engine=DEFAULT_ENGINE, static_ordering=True, falsifier=None,
+                 counterexample_bank=None):
         '''
         constructor. Loads the basic information on how to locate
-        and launch the script
+        and launch the script.
+        engine can be a NuxmvEngine or any object with the same start method,
+        e.g., an EngineSelector.
+        If static_ordering is True, the BDD variable ordering is derived from
+        the structure of the checked contracts.
+        If a falsifier (e.g., a lasso.LassoFalsifier) is provided, it is used
+        to look for counterexamples before calling nuxmv.
+        If a counterexample_bank (counterexamples.CounterexampleBank) is
+        provided, the counterexamples found by nuxmv are stored in it and
+        replayed on the following checks against the same contract
         '''
         self.contract = contract
         self.tool_location = tool_location
+        self.engine = engine
+        self.static_ordering = static_ordering
+        self.falsifier = falsifier
+        self.counterexample_bank = counterexample_bank
+
+    def _variable_order(self, contracts):
+        '''
+        Returns the variable ordering for the given contracts, or None if
+        static ordering is disabled
+        '''
+        if self.static_ordering:
+            return variable_order(contracts)
+        else:
+            return None
+
+    def _falsified(self, formula, contracts, spec_contract):
+        '''
+        Returns True if a counterexample stored for spec_contract or the
+        falsifier finds a trace violating formula
+        '''
+        if self.counterexample_bank is not None:
+            if self.counterexample_bank.replay(spec_contract, formula,
+                                               port_names(contracts)) is not None:
+                return True
+
+        if self.falsifier is None:
+            return False
+
+        return self.falsifier.find_witness(formula, port_names(contracts)) is not None
+
+    def _counterexample_handler(self, contracts, spec_contract):
+        '''
+        Returns a function storing the counterexamples found by nuxmv for
+        spec_contract, or None if there is no counterexample bank
+        '''
+        if self.counterexample_bank is None:
+            return None
+
+        names = port_names(contracts)
+        return lambda lasso: self.counterexample_bank.store(spec_contract, lasso, names)
 
 
 class NuxmvRefinementStrategy(NuxmvContractInterface):
@@ -151,13 +451,16 @@ class NuxmvRefinementStrategy(NuxmvContractInterface):
     Interface with nuxmv for refinement check
     '''
 
-    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True):
+    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True,
+                 engine=DEFAULT_ENGINE, static_ordering=True, falsifier=None,
+                 counterexample_bank=None):
         '''
         override constructor
         '''
         self.delete_files = delete_files
 
-        super(NuxmvRefinementStrategy, self).__init__(contract, tool_location)
+        super(NuxmvRefinementStrategy, self).__init__(contract, tool_location, engine, static_ordering,
+                                                      falsifier, counterexample_bank)
 
     def check_refinement(self, abstract_contract):
         '''
@@ -171,11 +474,21 @@ class NuxmvRefinementStrategy(NuxmvContractInterface):
 
         both_formulas = Conjunction(assumption_check_formula, guarantee_check_formula)
 
+        if self._falsified(both_formulas, [self.contract, abstract_contract],
+                           abstract_contract):
+            return False
+
         #check both formulas
         output = verify_tautology(both_formulas, \
                     prefix='%s_assumptions_nuxmv_' % contract_name, \
                     tool_location=self.tool_location, \
-                    delete_file=self.delete_files)
+                    delete_file=self.delete_files,
+                    engine=self.engine,
+                    variable_order=self._variable_order([self.contract,
+                                                         abstract_contract]),
+                    on_counterexample=self._counterexample_handler([self.contract,
+                                                                    abstract_contract],
+                                                                   abstract_contract))
 
 
         return output
@@ -213,13 +526,14 @@ class NuxmvCompatibilityStrategy(NuxmvContractInterface):
     Defines an object used to check compatibility of a contract
     interfacing with nuxmv
     '''
-    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True):
+    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True,
+                 engine=DEFAULT_ENGINE, static_ordering=True):
         '''
         override constructor
         '''
         self.delete_files = delete_files
 
-        super(NuxmvCompatibilityStrategy, self).__init__(contract, tool_location)
+        super(NuxmvCompatibilityStrategy, self).__init__(contract, tool_location, engine, static_ordering)
 
 
     def check_compatibility(self):
@@ -232,7 +546,9 @@ class NuxmvCompatibilityStrategy(NuxmvContractInterface):
         return not is_empty_formula(self.contract.assume_formula, \
                 prefix='%s_compatibility_nuxmv_' % contract_name, \
                 tool_location=self.tool_location, \
-                delete_file=self.delete_files)
+                delete_file=self.delete_files,
+                engine=self.engine,
+                variable_order=self._variable_order([self.contract]))
 
 
 CompatibilityStrategy.register(NuxmvCompatibilityStrategy)
@@ -243,13 +559,14 @@ class NuxmvConsistencyStrategy(NuxmvContractInterface):
     Defines an object used to check consistency of a contract
     interfacing with nuxmv
     '''
-    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True):
+    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True,
+                 engine=DEFAULT_ENGINE, static_ordering=True):
         '''
         override constructor
         '''
         self.delete_files = delete_files
 
-        super(NuxmvConsistencyStrategy, self).__init__(contract, tool_location)
+        super(NuxmvConsistencyStrategy, self).__init__(contract, tool_location, engine, static_ordering)
 
     def check_consistency(self):
         '''
@@ -260,7 +577,9 @@ class NuxmvConsistencyStrategy(NuxmvContractInterface):
         return not is_empty_formula(self.contract.guarantee_formula, \
                 prefix='%s_consistency_nuxmv_' % contract_name, \
                 tool_location=self.tool_location, \
-                delete_file=self.delete_files)
+                delete_file=self.delete_files,
+                engine=self.engine,
+                variable_order=self._variable_order([self.contract]))
 
 
 ConsistencyStrategy.register(NuxmvConsistencyStrategy)
@@ -271,13 +590,16 @@ class NuxmvApproximationStrategy(NuxmvContractInterface):
     Interface with nuxmv for approximation check
     '''
 
-    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True):
+    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True,
+                 engine=DEFAULT_ENGINE, static_ordering=True, falsifier=None,
+                 counterexample_bank=None):
         '''
         override constructor
         '''
         self.delete_files = delete_files
 
-        super(NuxmvApproximationStrategy, self).__init__(contract, tool_location)
+        super(NuxmvApproximationStrategy, self).__init__(contract, tool_location, engine, static_ordering,
+                                                           falsifier, counterexample_bank)
 
     def check_approximation(self, more_defined_contract):
         '''
@@ -291,11 +613,21 @@ class NuxmvApproximationStrategy(NuxmvContractInterface):
 
         both_formulas = Conjunction(assumption_check_formula, guarantee_check_formula)
 
+        if self._falsified(both_formulas, [self.contract, more_defined_contract],
+                           self.contract):
+            return False
+
         #check both formulas
         output = verify_tautology(both_formulas, \
                     prefix='%s_assumptions_nuxmv_' % contract_name, \
                     tool_location=self.tool_location, \
-                    delete_file=self.delete_files)
+                    delete_file=self.delete_files,
+                    engine=self.engine,
+                    variable_order=self._variable_order([self.contract,
+                                                         more_defined_contract]),
+                    on_counterexample=self._counterexample_handler([self.contract,
+                                                                    more_defined_contract],
+                                                                   self.contract))
 
 
         return output
@@ -326,3 +658,10 @@ class NuxmvApproximationStrategy(NuxmvContractInterface):
 
 
 ApproximationStrategy.register(NuxmvApproximationStrategy)
+
+
+class InconclusiveVerdictError(Exception):
+    '''
+    Raised if no engine gives a definitive verdict on a formula
+    '''
+    pass
@@ -0,0 +1,325 @@
+'''
+This module implements the splitting of refinement and approximation checks
+into smaller obligations.
+A check A -> (c1 & c2 & ... & cn) holds if and only if each A -> ci holds,
+thus each conjunct of the consequent can be given to the solver as a
+separate, smaller obligation. Obligations are checked in parallel, the check
+stops as soon as one of them fails, and the verdict of each obligation is
+cached, so that obligations shared by several checks are solved only once.
+
+Author: Antonio Iannopollo
+'''
+
+from Queue import Queue
+from pycolite.interface_strategy import RefinementStrategy, ApproximationStrategy
+from pycolite.nuxmv import (NuxmvRefinementStrategy, NuxmvApproximationStrategy,
+                            NuxmvPathLoader, DEFAULT_ENGINE, trace_parser)
+from pycolite.formula import (Implication, Conjunction, Disjunction, Globally,
+                              Negation)
+from pycolite.formula_analysis import canonical_form
+from pycolite.util.util import wait_in_background, LRUCache
+from pycolite.fast_paths import decide_tautology
+from pycolite import LOG
+
+#maximum number of obligations a check is split into
+MAX_OBLIGATIONS = 32
+
+#maximum number of solver processes running at the same time
+MAX_PARALLEL = 4
+
+#maximum number of verdicts stored by an ObligationCache
+MAX_CACHED_VERDICTS = 65536
+
+
+def split_consequent(formula, max_pieces=MAX_OBLIGATIONS):
+    '''
+    Returns a list of formulae whose conjunction is equivalent to formula.
+    Conjunctions are split, G distributes over conjunctions, and
+    a -> (c1 & c2) is split in (a -> c1) and (a -> c2).
+    The list contains at most max_pieces formulae.
+    '''
+    pieces = [formula]
+    index = 0
+    while index < len(pieces) and len(pieces) < max_pieces:
+        current = pieces[index]
+        parts = _split_once(current)
+        if parts is None:
+            index += 1
+        else:
+            pieces[index:index + 1] = parts
+
+    return pieces
+
+
+def _split_once(formula):
+    '''
+    Returns a pair of formulae whose conjunction is equivalent to formula,
+    or None if formula cannot be split
+    '''
+    if isinstance(formula, Conjunction):
+        return [formula.left_formula, formula.right_formula]
+
+    elif isinstance(formula, Globally):
+        parts = _split_once(formula.right_formula)
+        if parts is not None:
+            return [Globally(part) for part in parts]
+
+    elif isinstance(formula, Implication):
+        parts = _split_once(formula.right_formula)
+        if parts is not None:
+            return [Implication(formula.left_formula, part, merge_literals=False)
+                    for part in parts]
+
+    elif isinstance(formula, Negation) and \
+            isinstance(formula.right_formula, Disjunction):
+        return [Negation(formula.right_formula.left_formula),
+                Negation(formula.right_formula.right_formula)]
+
+    return None
+
+
+def implication_obligations(antecedent, consequent, max_pieces=MAX_OBLIGATIONS):
+    '''
+    Returns a list of implications whose conjunction is equivalent to
+    antecedent -> consequent
+    '''
+    return [Implication(antecedent, piece, merge_literals=False)
+            for piece in split_consequent(consequent, max_pieces)]
+
+
+class ObligationCache(object):
+    '''
+    Stores the verdicts of obligations, indexed by their canonical form.
+    At most max_entries verdicts are stored (any number if None), and the
+    least recently used ones are evicted first
+    '''
+
+    def __init__(self, max_entries=MAX_CACHED_VERDICTS):
+        '''
+        constructor
+        '''
+        self.verdicts = LRUCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, formula):
+        '''
+        Returns the key associated to formula
+        '''
+        return canonical_form(formula)
+
+    def get(self, key):
+        '''
+        Returns the verdict stored for key, or None
+        '''
+        try:
+            verdict = self.verdicts.lookup(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        else:
+            self.hits += 1
+            return verdict
+
+    def put(self, key, verdict):
+        '''
+        Stores the verdict for key
+        '''
+        self.verdicts[key] = verdict
+
+    def clear(self):
+        '''
+        Removes all the stored verdicts
+        '''
+        self.verdicts.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        '''
+        number of stored verdicts
+        '''
+        return len(self.verdicts)
+
+
+#cache shared by all the strategies, unless a different one is provided
+OBLIGATION_CACHE = ObligationCache()
+
+
+def verify_obligations(obligations, prefix='',
+                       tool_location=NuxmvPathLoader.get_path(),
+                       delete_file=True, engine=DEFAULT_ENGINE, variable_order=None,
+                       cache=OBLIGATION_CACHE, max_parallel=MAX_PARALLEL,
+                       on_counterexample=None):
+    '''
+    Verifies if all the formulae in obligations are tautologies.
+    At most max_parallel solver processes are run at the same time. As soon
+    as one obligation is not verified, the running processes are killed.
+    If an obligation is not verified and on_counterexample is provided, it
+    is called with the counterexample given by nuxmv, as a lasso.Lasso object
+
+    :returns: boolean
+    '''
+    pending = []
+    for formula in obligations:
+        verdict = decide_tautology(formula)
+        if verdict is False:
+            return False
+        elif verdict is True:
+            continue
+
+        key = None
+        if cache is not None:
+            key = cache.key(formula)
+            verdict = cache.get(key)
+            if verdict is False:
+                LOG.debug('cached obligation fails')
+                return False
+            elif verdict is True:
+                continue
+        pending.append((key, formula))
+
+    #identical obligations are checked once
+    unique = {}
+    for (key, formula) in pending:
+        unique.setdefault(key if key is not None else id(formula), (key, formula))
+    pending = unique.values()
+
+    LOG.debug('%d obligations, %d to check' % (len(obligations), len(pending)))
+
+    results = Queue()
+    running = {}
+    verdict = True
+
+    try:
+        while pending or running:
+            while pending and len(running) < max_parallel:
+                (key, formula) = pending.pop()
+                process = engine.start(formula, prefix=prefix,
+                                       tool_location=tool_location,
+                                       delete_file=delete_file,
+                                       variable_order=variable_order)
+                running[id(process)] = process
+                wait_in_background((id(process), key), process, results)
+
+            ((process_id, key), result, error) = results.get()
+            process = running.pop(process_id)
+
+            if error is not None:
+                raise error
+
+            if cache is not None and key is not None and result is not None:
+                cache.put(key, result)
+
+            if result is not True:
+                if result is False and on_counterexample is not None:
+                    lasso = trace_parser(process.output, process.solver_names)
+                    if lasso is not None:
+                        on_counterexample(lasso)
+                verdict = False
+                break
+    finally:
+        for process in running.values():
+            process.kill()
+
+    return verdict
+
+
+class SplitRefinementStrategy(NuxmvRefinementStrategy):
+    '''
+    Checks refinement splitting the check in smaller obligations
+    '''
+
+    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True,
+                 engine=DEFAULT_ENGINE, static_ordering=True, cache=OBLIGATION_CACHE,
+                 max_parallel=MAX_PARALLEL, falsifier=None, counterexample_bank=None):
+        '''
+        override constructor
+        '''
+        self.cache = cache
+        self.max_parallel = max_parallel
+
+        super(SplitRefinementStrategy, self).__init__(contract, tool_location, delete_files,
+                                                      engine, static_ordering, falsifier,
+                                                      counterexample_bank)
+
+    def check_refinement(self, abstract_contract):
+        '''
+        Override of abstract method
+        '''
+        contract_name = self.contract.name_attribute.unique_name
+
+        obligations = implication_obligations(abstract_contract.assume_formula,
+                                              self.contract.assume_formula)
+        obligations += implication_obligations(self.contract.guarantee_formula,
+                                               abstract_contract.guarantee_formula)
+
+        for formula in obligations:
+            if self._falsified(formula, [self.contract, abstract_contract],
+                               abstract_contract):
+                return False
+
+        return verify_obligations(obligations,
+                                  prefix='%s_refinement_split_' % contract_name,
+                                  tool_location=self.tool_location,
+                                  delete_file=self.delete_files,
+                                  engine=self.engine,
+                                  variable_order=self._variable_order([self.contract,
+                                                                       abstract_contract]),
+                                  cache=self.cache,
+                                  max_parallel=self.max_parallel,
+                                  on_counterexample=self._counterexample_handler(
+                                      [self.contract, abstract_contract], abstract_contract))
+
+
+RefinementStrategy.register(SplitRefinementStrategy)
+
+
+class SplitApproximationStrategy(NuxmvApproximationStrategy):
+    '''
+    Checks approximation splitting the check in smaller obligations
+    '''
+
+    def __init__(self, contract, tool_location=NuxmvPathLoader.get_path(), delete_files=True,
+                 engine=DEFAULT_ENGINE, static_ordering=True, cache=OBLIGATION_CACHE,
+                 max_parallel=MAX_PARALLEL, falsifier=None, counterexample_bank=None):
+        '''
+        override constructor
+        '''
+        self.cache = cache
+        self.max_parallel = max_parallel
+
+        super(SplitApproximationStrategy, self).__init__(contract, tool_location, delete_files,
+                                                         engine, static_ordering, falsifier,
+                                                         counterexample_bank)
+
+    def check_approximation(self, more_defined_contract):
+        '''
+        Override of abstract method
+        '''
+        contract_name = self.contract.name_attribute.unique_name
+
+        obligations = implication_obligations(more_defined_contract.assume_formula,
+                                              self.contract.assume_formula)
+        obligations += implication_obligations(more_defined_contract.guarantee_formula,
+                                               self.contract.guarantee_formula)
+
+        for formula in obligations:
+            if self._falsified(formula, [self.contract, more_defined_contract],
+                               self.contract):
+                return False
+
+        return verify_obligations(obligations,
+                                  prefix='%s_approximation_split_' % contract_name,
+                                  tool_location=self.tool_location,
+                                  delete_file=self.delete_files,
+                                  engine=self.engine,
+                                  variable_order=self._variable_order([self.contract,
+                                                                       more_defined_contract]),
+                                  cache=self.cache,
+                                  max_parallel=self.max_parallel,
+                                  on_counterexample=self._counterexample_handler(
+                                      [self.contract, more_defined_contract], self.contract))
+
+
+ApproximationStrategy.register(SplitApproximationStrategy)
@@ -1,11 +1,21 @@
 '''
-This module define a generic version of the observer design pattern
+This module define a generic version of the observer design pattern.
+Subjects keep weak references to their observers, so that an observer
+(e.g., a formula built for a single check) does not stay alive only because
+it is attached to a long-lived subject.
+The sets of observers are protected by a lock, so that subjects can be
+shared among threads.
 
 Author: Antonio Iannopollo
 '''
 from abc import ABCMeta, abstractmethod
+from threading import Lock
+from weakref import WeakSet
 from pycolite import LOG
 
+#protects the observer sets of all the subjects
+_OBSERVERS_LOCK = Lock()
+
 class Subject:
     '''
     Define a subject
@@ -15,27 +25,34 @@ class Subject:
 
     def __init__(self):
         '''initialize internal data structures '''
-        self.observers = set()
+        self.observers = WeakSet()
 
     def attach(self, observer):
         '''attach a new observer to the subject'''
-        self.observers.add(observer)
+        with _OBSERVERS_LOCK:
+            self.observers.add(observer)
 
     def detach(self, observer):
         '''detach a previusly attached observer from the subject'''
-        try:
+        with _OBSERVERS_LOCK:
             self.observers.remove(observer)
-        except:
-            raise
+
+    def discard(self, observer):
+        '''detach observer from the subject, if attached'''
+        with _OBSERVERS_LOCK:
+            self.observers.discard(observer)
 
     def notify(self):
         '''Notify observers that something changed'''
 
-        #this version of the observer is not thread safe, however it may
-        #happen that the observer list changes size while iterating
-        #then, we need a copy
+        #the observer list may change size while iterating (observers
+        #detach themselves while updating), then, we need a copy.
+        #Updates run without the lock, since they attach and detach
+        #observers
         #LOG.debug(self.observers)
-        for observer in self.observers.copy():
+        with _OBSERVERS_LOCK:
+            observers = list(self.observers)
+        for observer in observers:
             observer.update(self)
 
     @abstractmethod
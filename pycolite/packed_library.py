@@ -0,0 +1,234 @@
+'''
+This module implements a packed, file backed encoding of a contract
+library, to share a library among worker processes.
+The file contains an index, with the fingerprint, the name and the port
+signature of each contract, followed by a record for each contract in the
+format of the serialization module (literal table, postfix formula arrays
+and port table). Workers map the file in memory, so that the operating
+system shares its pages among them, load the index and only decode the
+records of the contracts they use.
+
+File layout: header (magic, version, number of contracts, size of the
+index), index, then the table of the offsets and lengths of the records,
+and the records. Index and records are encoded with marshal. The index also
+holds the naming state of the writer, which a reader restores, so that the
+contracts it creates do not take the names of the packed ones, even before
+they are decoded.
+
+Author: Antonio Iannopollo
+'''
+
+import marshal
+import mmap
+from importlib import import_module
+from struct import Struct
+from pycolite.attribute import AttributeNamePool
+from pycolite.fingerprint import fingerprint
+from pycolite.library import port_signature, signature_admits
+from pycolite.serialization import contract_state, contract_from_state
+
+MAGIC = 'PCLB'
+FORMAT_VERSION = 2
+
+_HEADER = Struct('<4sIIQ')
+_ENTRY = Struct('<QQ')
+
+#position of the symbol set class in the state of a contract
+_SYMBOL_SET_FIELD = 3
+
+
+def _portable_state(contract):
+    '''
+    Returns the state of contract in which the symbol set class is replaced
+    by its import path, so that it can be encoded with marshal
+    '''
+    state = list(contract_state(contract))
+    cls = state[_SYMBOL_SET_FIELD]
+    state[_SYMBOL_SET_FIELD] = '%s.%s' % (cls.__module__, cls.__name__)
+    return tuple(state)
+
+
+def _contract_from_portable(state):
+    '''
+    Builds a contract from the state returned by _portable_state
+    '''
+    state = list(state)
+    (module_name, _, cls_name) = state[_SYMBOL_SET_FIELD].rpartition('.')
+    state[_SYMBOL_SET_FIELD] = getattr(import_module(module_name), cls_name)
+    return contract_from_state(tuple(state))
+
+
+def pack_library(contracts):
+    '''
+    Returns the packed encoding of contracts, as a string. Duplicated
+    contracts, with the same fingerprint, are encoded once. Offsets are
+    relative to the beginning of the string, thus it can be embedded in
+    other files.
+
+    :param contracts: contracts, e.g. a ContractLibrary
+    :type contracts: iterable of Contract
+    '''
+    index = []
+    records = []
+    keys = set()
+    for contract in contracts:
+        key = fingerprint(contract)
+        if key in keys:
+            continue
+        keys.add(key)
+        index.append((key, contract.base_name, port_signature(contract)))
+        records.append(marshal.dumps(_portable_state(contract)))
+
+    index_data = marshal.dumps((AttributeNamePool.naming_state(), index))
+
+    offset = _HEADER.size + len(index_data) + _ENTRY.size * len(records)
+    entries = []
+    for record in records:
+        entries.append(_ENTRY.pack(offset, len(record)))
+        offset += len(record)
+
+    return ''.join([_HEADER.pack(MAGIC, FORMAT_VERSION, len(records), len(index_data)),
+                    index_data] + entries + records)
+
+
+def packed_count(data):
+    '''
+    Returns the number of contracts in the packed encoding data
+    '''
+    return _HEADER.unpack_from(data, 0)[2]
+
+
+def write_packed_library(contracts, path):
+    '''
+    Writes the packed encoding of contracts in the file path.
+
+    :returns: number of contracts written
+    '''
+    data = pack_library(contracts)
+    with open(path, 'wb') as packed_file:
+        packed_file.write(data)
+
+    return packed_count(data)
+
+
+class PackedLibrary(object):
+    '''
+    Read only view of a packed library file. Contracts are decoded when
+    they are first requested, and each contract is decoded once
+    '''
+
+    def __init__(self, path, offset=0, restore_naming=True):
+        '''
+        constructor. Maps the file in memory and loads the index
+
+        :param offset: position of the packed library in the file
+        :type offset: int
+        :param restore_naming: if True, the naming state of the writer is
+            restored, so that new attributes do not take the names of the
+            packed ones
+        :type restore_naming: bool
+        '''
+        self.path = path
+        self.offset = offset
+        with open(path, 'rb') as packed_file:
+            self.buffer = mmap.mmap(packed_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (magic, version, count, index_size) = \
+                    _HEADER.unpack_from(self.buffer, offset)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise PackedLibraryError('%s is not a packed library of version %d'
+                                         % (path, FORMAT_VERSION))
+
+            start = offset + _HEADER.size
+            (naming, index) = marshal.loads(self.buffer[start:start + index_size])
+            if len(index) != count:
+                raise PackedLibraryError('corrupted index in %s' % path)
+        except:
+            self.buffer.close()
+            raise
+
+        if restore_naming:
+            AttributeNamePool.restore_naming_state(naming)
+
+        self.entries_start = start + index_size
+        self.fingerprints = [key for (key, _, _) in index]
+        self.names = [name for (_, name, _) in index]
+        self.signatures = [signature for (_, _, signature) in index]
+        self.positions = {key: position for (position, key)
+                          in enumerate(self.fingerprints)}
+        self.materialized = {}
+
+    def contract(self, position):
+        '''
+        Returns the contract at position, decoding it if needed
+        '''
+        try:
+            return self.materialized[position]
+        except KeyError:
+            pass
+
+        if not 0 <= position < len(self.fingerprints):
+            raise IndexError('no contract at position %d' % position)
+
+        (offset, length) = _ENTRY.unpack_from(self.buffer,
+                                              self.entries_start + _ENTRY.size * position)
+        offset += self.offset
+        contract = _contract_from_portable(marshal.loads(self.buffer[offset:offset + length]))
+        self.materialized[position] = contract
+        return contract
+
+    def get(self, key):
+        '''
+        Returns the contract with fingerprint key, or None
+        '''
+        try:
+            position = self.positions[key]
+        except KeyError:
+            return None
+        return self.contract(position)
+
+    def refinement_candidates(self, abstract, exact=False):
+        '''
+        Returns the contracts whose port signature admits a RefinementMapping
+        to the ports of abstract. Only the candidates are decoded
+
+        :param exact: if True, only the contracts with the same signature as
+            abstract are returned
+        :type exact: bool
+        '''
+        signature = port_signature(abstract)
+        return [self.contract(position)
+                for (position, candidate) in enumerate(self.signatures)
+                if signature_admits(candidate, signature, exact)]
+
+    def close(self):
+        '''
+        Unmaps the file. Decoded contracts are still valid
+        '''
+        self.buffer.close()
+
+    def __contains__(self, contract):
+        '''
+        True if the library contains a contract identical to contract
+        '''
+        return fingerprint(contract) in self.positions
+
+    def __iter__(self):
+        '''
+        iterates over the contracts, decoding all of them
+        '''
+        return (self.contract(position) for position in range(len(self)))
+
+    def __len__(self):
+        '''
+        number of contracts
+        '''
+        return len(self.fingerprints)
+
+
+class PackedLibraryError(Exception):
+    '''
+    Raised if a file is not a valid packed library
+    '''
+    pass
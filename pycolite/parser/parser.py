@@ -1,5 +1,6 @@
 from pycolite import formula
 from pycolite.parser import lexer
+from threading import local, Lock
 import ply.yacc as yacc
 
 from pycolite import LOG
@@ -143,8 +144,44 @@ class Parser(object):
         return self.parser.parse(string, lexer = self.lexer.lexer, **kwargs)
 
 
+class ThreadLocalParser(object):
+    '''
+    Parser facade which can be shared among threads. Parser objects keep the
+    lexer and the context of the string being parsed, thus each thread
+    uses its own Parser object, built when the thread first parses a string
+    '''
+
+    #yacc may write the parsing tables while building a parser
+    __build_lock = Lock()
+
+    def __init__(self):
+        '''
+        constructor
+        '''
+        self.__local = local()
+
+    @property
+    def parser(self):
+        '''
+        Parser object of the calling thread
+        '''
+        try:
+            return self.__local.parser
+        except AttributeError:
+            with self.__build_lock:
+                self.__local.parser = Parser()
+            return self.__local.parser
+
+    def parse(self, string, context = None, symbol_set_cls = lexer.BaseSymbolSet, **kwargs):
+        '''
+        Parses string with the parser of the calling thread
+        '''
+        return self.parser.parse(string, context=context,
+                                 symbol_set_cls=symbol_set_cls, **kwargs)
+
+
 #define a module-level parser object
-LTL_PARSER = Parser()
+LTL_PARSER = ThreadLocalParser()
 
 
 class GeneralError(Exception):
@@ -0,0 +1,237 @@
+'''
+This module implements a portfolio approach to the verification of contracts.
+The same check is given at the same time to several engines, the first
+definitive verdict is returned and all the other engines are killed.
+
+Author: Antonio Iannopollo
+'''
+
+from Queue import Queue
+from ConfigParser import NoSectionError, NoOptionError
+from pycolite.interface_strategy import (RefinementStrategy,
+            CompatibilityStrategy, ConsistencyStrategy)
+from pycolite.nuxmv import (NuxmvRefinementStrategy, NuxmvCompatibilityStrategy,
+                            NuxmvConsistencyStrategy, NuxmvPathLoader,
+                            NUXMV_ENGINES)
+from pycolite.formula import Negation, Conjunction
+from pycolite.types import Int
+from pycolite.util.util import wait_in_background
+from pycolite.fast_paths import decide_tautology
+from pycolite import LOG
+
+LTL3BA_ENGINE = 'ltl3ba'
+
+DEFAULT_PORTFOLIO = ('bdd', 'ic3', LTL3BA_ENGINE)
+
+
+def _start_ltl3ba(formula, prefix, ltl3ba_location, delete_file):
+    '''
+    Starts ltl3ba to check if formula is a tautology.
+    ltl3ba gives a definitive answer only if the negation of the formula
+    is translated to the empty automaton, and it does not support integers.
+
+    :returns: ToolProcess or None, if ltl3ba cannot be used
+    '''
+    if any([isinstance(l.l_type, Int) for (_, l) in formula.get_literal_items()]):
+        return None
+
+    try:
+        from pycolite import ltl3ba
+    except (IOError, NoSectionError, NoOptionError):
+        LOG.warning('ltl3ba is not configured, skipping it')
+        return None
+
+    if ltl3ba_location is None:
+        ltl3ba_location = ltl3ba.Ltl3baPathLoader.get_path()
+
+    process = ltl3ba.start_empty_formula_check(Negation(formula), prefix=prefix,
+                                               tool_location=ltl3ba_location,
+                                               delete_file=delete_file)
+
+    #a non empty automaton does not mean that the formula is not valid
+    parse_output = process.parse_output
+    process.parse_output = lambda output, returncode: \
+            parse_output(output, returncode) or None
+
+    return process
+
+
+def race_tautology(formula, engines=DEFAULT_PORTFOLIO, prefix='',
+                   tool_location=NuxmvPathLoader.get_path(),
+                   ltl3ba_location=None, delete_file=True, variable_order=None):
+    '''
+    Verifies if a LTLFormula object represents a tautology, running all the
+    given engines at the same time.
+    Returns the first definitive verdict and kills the other engines.
+
+    :param engines: names of the engines to use. Valid names are the keys
+        of nuxmv.NUXMV_ENGINES and 'ltl3ba'
+    :type engines: iterable of strings
+    :returns: boolean
+    '''
+    verdict = decide_tautology(formula)
+    if verdict is not None:
+        return verdict
+
+    processes = {}
+
+    for name in engines:
+        engine_prefix = '%s%s_' % (prefix, name)
+        try:
+            if name == LTL3BA_ENGINE:
+                process = _start_ltl3ba(formula, engine_prefix,
+                                        ltl3ba_location, delete_file)
+            else:
+                process = NUXMV_ENGINES[name].start(formula, prefix=engine_prefix,
+                                                    tool_location=tool_location,
+                                                    delete_file=delete_file,
+                                                    variable_order=variable_order)
+        except OSError as error:
+            LOG.warning('cannot start engine %s: %s' % (name, error))
+        else:
+            if process is not None:
+                processes[name] = process
+
+    if not processes:
+        raise PortfolioError('no engine could be started')
+
+    results = Queue()
+    threads = [wait_in_background(name, process, results)
+               for (name, process) in processes.items()]
+
+    verdict = None
+    for _ in range(len(threads)):
+        (name, result, error) = results.get()
+
+        if error is not None:
+            LOG.warning('engine %s failed: %s' % (name, error))
+        elif result is not None:
+            LOG.debug('engine %s answered first' % name)
+            verdict = result
+            break
+
+    for process in processes.values():
+        process.kill()
+
+    for thread in threads:
+        thread.join()
+
+    if verdict is None:
+        raise PortfolioError('no engine returned a definitive verdict')
+
+    return verdict
+
+
+class PortfolioRefinementStrategy(NuxmvRefinementStrategy):
+    '''
+    Checks refinement racing several engines
+    '''
+
+    def __init__(self, contract, engines=DEFAULT_PORTFOLIO,
+                 tool_location=NuxmvPathLoader.get_path(),
+                 ltl3ba_location=None, delete_files=True):
+        '''
+        override constructor
+        '''
+        self.engines = engines
+        self.ltl3ba_location = ltl3ba_location
+
+        super(PortfolioRefinementStrategy, self).__init__(contract, tool_location,
+                                                          delete_files)
+
+    def check_refinement(self, abstract_contract):
+        '''
+        Override of abstract method
+        '''
+        contract_name = self.contract.name_attribute.unique_name
+
+        both_formulas = Conjunction(self._get_assumptions_check_formula(abstract_contract),
+                                    self._get_guarantee_check_formula(abstract_contract))
+
+        return race_tautology(both_formulas, self.engines,
+                              prefix='%s_refinement_portfolio_' % contract_name,
+                              tool_location=self.tool_location,
+                              ltl3ba_location=self.ltl3ba_location,
+                              delete_file=self.delete_files,
+                              variable_order=self._variable_order([self.contract,
+                                                                   abstract_contract]))
+
+
+RefinementStrategy.register(PortfolioRefinementStrategy)
+
+
+class PortfolioCompatibilityStrategy(NuxmvCompatibilityStrategy):
+    '''
+    Checks compatibility racing several engines
+    '''
+
+    def __init__(self, contract, engines=DEFAULT_PORTFOLIO,
+                 tool_location=NuxmvPathLoader.get_path(),
+                 ltl3ba_location=None, delete_files=True):
+        '''
+        override constructor
+        '''
+        self.engines = engines
+        self.ltl3ba_location = ltl3ba_location
+
+        super(PortfolioCompatibilityStrategy, self).__init__(contract, tool_location,
+                                                             delete_files)
+
+    def check_compatibility(self):
+        '''
+        Override from CompatibilityStrategy
+        '''
+        contract_name = self.contract.name_attribute.unique_name
+
+        return not race_tautology(Negation(self.contract.assume_formula),
+                                  self.engines,
+                                  prefix='%s_compatibility_portfolio_' % contract_name,
+                                  tool_location=self.tool_location,
+                                  ltl3ba_location=self.ltl3ba_location,
+                                  delete_file=self.delete_files,
+                                  variable_order=self._variable_order([self.contract]))
+
+
+CompatibilityStrategy.register(PortfolioCompatibilityStrategy)
+
+
+class PortfolioConsistencyStrategy(NuxmvConsistencyStrategy):
+    '''
+    Checks consistency racing several engines
+    '''
+
+    def __init__(self, contract, engines=DEFAULT_PORTFOLIO,
+                 tool_location=NuxmvPathLoader.get_path(),
+                 ltl3ba_location=None, delete_files=True):
+        '''
+        override constructor
+        '''
+        self.engines = engines
+        self.ltl3ba_location = ltl3ba_location
+
+        super(PortfolioConsistencyStrategy, self).__init__(contract, tool_location,
+                                                           delete_files)
+
+    def check_consistency(self):
+        '''
+        Override from ConsistencyStrategy
+        '''
+        contract_name = self.contract.name_attribute.unique_name
+
+        return not race_tautology(Negation(self.contract.guarantee_formula),
+                                  self.engines,
+                                  prefix='%s_consistency_portfolio_' % contract_name,
+                                  tool_location=self.tool_location,
+                                  ltl3ba_location=self.ltl3ba_location,
+                                  delete_file=self.delete_files,
+                                  variable_order=self._variable_order([self.contract]))
+
+
+ConsistencyStrategy.register(PortfolioConsistencyStrategy)
+
+
+class PortfolioError(Exception):
+    '''
+    Raised if no engine in the portfolio gives a definitive verdict
+    '''
+    pass
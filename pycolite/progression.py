@@ -0,0 +1,350 @@
+'''
+This module decides in-process the validity of formulae in the obligation
+fragment (Boolean combinations of safety and co-safety formulae, e.g.
+G(a -> Xb) -> G(a -> X(b | c))), using an explicit-state search based on
+formula progression.
+The negation of the formula is put in negation normal form, where its
+maximal propositional subformulae are atoms. Progressing a formula through a
+state gives the formula that the rest of the trace has to satisfy. Since And
+and Or nodes are kept as sets, only finitely many residual formulae can be
+reached.
+
+If no F is nested in a G and no G is nested in a F, the negation is
+satisfiable if and only if, for some reachable residual formula r, the safety
+formula obtained from r replacing each F with FALSE has an infinite path
+avoiding FALSE. In fact, the F obligations which hold on a trace are
+discharged after a finite number of steps, and the others can be dropped.
+
+States are all the assignments of the finite Bool/Int domains of the
+literals, thus the search is bounded by MAX_ASSIGNMENTS and MAX_RESIDUALS.
+
+Author: Antonio Iannopollo
+'''
+
+from itertools import product
+from pycolite.formula import (Negation, Conjunction, Disjunction, Implication,
+                              Equivalence, Globally, Eventually, Next)
+from pycolite.formula_analysis import (post_order, children, get_literals,
+                                       TEMPORAL_CLASSES)
+from pycolite.lasso import Lasso, LassoError, evaluate
+from pycolite.types import Int
+
+#maximum number of assignments to the literals of a formula
+MAX_ASSIGNMENTS = 4096
+
+#maximum number of formulae reached by progression
+MAX_RESIDUALS = 5000
+
+TRUE = ('T',)
+FALSE = ('F',)
+
+
+def _and(operands):
+    '''
+    Returns the simplified conjunction of operands
+    '''
+    flat = set()
+    for operand in operands:
+        if operand == FALSE:
+            return FALSE
+        elif operand == TRUE:
+            continue
+        elif operand[0] == '&':
+            flat.update(operand[1])
+        else:
+            flat.add(operand)
+
+    if not flat:
+        return TRUE
+    elif len(flat) == 1:
+        return flat.pop()
+    return ('&', frozenset(flat))
+
+
+def _or(operands):
+    '''
+    Returns the simplified disjunction of operands
+    '''
+    flat = set()
+    for operand in operands:
+        if operand == TRUE:
+            return TRUE
+        elif operand == FALSE:
+            continue
+        elif operand[0] == '|':
+            flat.update(operand[1])
+        else:
+            flat.add(operand)
+
+    if not flat:
+        return FALSE
+    elif len(flat) == 1:
+        return flat.pop()
+    return ('|', frozenset(flat))
+
+
+def negation_normal_form(formula):
+    '''
+    Returns the negation normal form of formula, as nested tuples, and the
+    list of its propositional atoms. Atoms are represented as
+    ('A', index, positive)
+    '''
+    temporal = {}
+    for node in post_order(formula):
+        temporal[id(node)] = isinstance(node, TEMPORAL_CLASSES) or \
+                any([temporal[id(child)] for child in children(node)])
+
+    #maximal propositional subformulae become atoms
+    atoms = []
+    nodes = []
+    stack = [formula]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        if temporal[id(node)]:
+            stack.extend(children(node))
+
+    positive = {}
+    negative = {}
+    for node in reversed(nodes):
+        key = id(node)
+        if not temporal[key]:
+            positive[key] = ('A', len(atoms), True)
+            negative[key] = ('A', len(atoms), False)
+            atoms.append(node)
+            continue
+
+        if isinstance(node, Negation):
+            positive[key] = negative[id(node.right_formula)]
+            negative[key] = positive[id(node.right_formula)]
+            continue
+        elif isinstance(node, Next):
+            positive[key] = ('X', positive[id(node.right_formula)])
+            negative[key] = ('X', negative[id(node.right_formula)])
+            continue
+        elif isinstance(node, Globally):
+            positive[key] = ('G', positive[id(node.right_formula)])
+            negative[key] = ('E', negative[id(node.right_formula)])
+            continue
+        elif isinstance(node, Eventually):
+            positive[key] = ('E', positive[id(node.right_formula)])
+            negative[key] = ('G', negative[id(node.right_formula)])
+            continue
+
+        left_pos = positive[id(node.left_formula)]
+        left_neg = negative[id(node.left_formula)]
+        right_pos = positive[id(node.right_formula)]
+        right_neg = negative[id(node.right_formula)]
+
+        if isinstance(node, Conjunction):
+            positive[key] = _and([left_pos, right_pos])
+            negative[key] = _or([left_neg, right_neg])
+        elif isinstance(node, Disjunction):
+            positive[key] = _or([left_pos, right_pos])
+            negative[key] = _and([left_neg, right_neg])
+        elif isinstance(node, Implication):
+            positive[key] = _or([left_neg, right_pos])
+            negative[key] = _and([left_pos, right_neg])
+        elif isinstance(node, Equivalence):
+            positive[key] = _or([_and([left_pos, right_pos]),
+                                 _and([left_neg, right_neg])])
+            negative[key] = _or([_and([left_pos, right_neg]),
+                                 _and([left_neg, right_pos])])
+        else:
+            raise ProgressionError('unsupported operator %s' % node.Symbol)
+
+    return (positive[id(formula)], negative[id(formula)], atoms)
+
+
+class Progression(object):
+    '''
+    Progression of formulae in negation normal form through the states of
+    a finite domain
+    '''
+
+    def __init__(self, atoms, literals):
+        '''
+        constructor. Computes the distinct valuations of the atoms over all
+        the assignments to literals
+        '''
+        domains = []
+        size = 1
+        for literal in literals:
+            if isinstance(literal.l_type, Int):
+                domain = range(literal.l_type.lower, literal.l_type.upper + 1)
+            else:
+                domain = (False, True)
+            size *= len(domain)
+            if size > MAX_ASSIGNMENTS:
+                raise ProgressionError('too many assignments')
+            domains.append(domain)
+
+        names = [literal.unique_name for literal in literals]
+        valuations = set()
+        for values in product(*domains):
+            state = Lasso([dict(zip(names, values))])
+            try:
+                valuations.add(tuple([evaluate(atom, state) for atom in atoms]))
+            except ZeroDivisionError:
+                raise ProgressionError('possible division by zero')
+            except LassoError as error:
+                raise ProgressionError(str(error))
+
+        self.valuations = list(valuations)
+        self.cache = {}
+
+    def progress(self, node, valuation):
+        '''
+        Returns the formula that the rest of a trace has to satisfy, if node
+        has to be satisfied and the first state gives valuation to the atoms
+        '''
+        key = (node, valuation)
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+
+        kind = node[0]
+        if kind in ('T', 'F'):
+            result = node
+        elif kind == 'A':
+            result = TRUE if valuation[node[1]] == node[2] else FALSE
+        elif kind == 'X':
+            result = node[1]
+        elif kind == 'G':
+            result = _and([self.progress(node[1], valuation), node])
+        elif kind == 'E':
+            result = _or([self.progress(node[1], valuation), node])
+        elif kind == '&':
+            result = _and([self.progress(operand, valuation) for operand in node[1]])
+        else:
+            result = _or([self.progress(operand, valuation) for operand in node[1]])
+
+        self.cache[key] = result
+        return result
+
+    def successors(self, node):
+        '''
+        Returns the set of formulae obtained progressing node through all
+        the states
+        '''
+        return set([self.progress(node, valuation) for valuation in self.valuations])
+
+    def reachable(self, initial, stop=None):
+        '''
+        Returns the graph of the formulae reachable from initial, as a
+        dictionary mapping each formula to its successors.
+        The search ends early, returning None, if stop is reached
+        '''
+        graph = {}
+        frontier = [initial]
+        while frontier:
+            node = frontier.pop()
+            if node in graph:
+                continue
+            if node == stop:
+                return None
+            if len(graph) >= MAX_RESIDUALS:
+                raise ProgressionError('too many residual formulae')
+
+            graph[node] = self.successors(node)
+            frontier.extend(graph[node])
+
+        return graph
+
+
+def is_obligation(node):
+    '''
+    Returns True if no F is nested in a G, and no G is nested in a F, in a
+    formula in negation normal form
+    '''
+    stack = [(node, None)]
+    while stack:
+        (current, scope) = stack.pop()
+        kind = current[0]
+        if kind in ('G', 'E'):
+            if scope is not None and scope != kind:
+                return False
+            stack.append((current[1], kind))
+        elif kind == 'X':
+            stack.append((current[1], scope))
+        elif kind in ('&', '|'):
+            stack.extend([(operand, scope) for operand in current[1]])
+
+    return True
+
+
+def drop_eventually(node):
+    '''
+    Returns node with each F subformula replaced by FALSE
+    '''
+    kind = node[0]
+    if kind == 'E':
+        return FALSE
+    elif kind == 'X':
+        return ('X', drop_eventually(node[1]))
+    elif kind == '&':
+        return _and([drop_eventually(operand) for operand in node[1]])
+    elif kind == '|':
+        return _or([drop_eventually(operand) for operand in node[1]])
+    return node
+
+
+def _infinite_paths(graph):
+    '''
+    Returns the set of formulae in graph with an infinite path not visiting
+    FALSE
+    '''
+    alive = set([node for node in graph if node != FALSE])
+    changed = True
+    while changed:
+        changed = False
+        for node in list(alive):
+            if not graph[node] & alive:
+                alive.remove(node)
+                changed = True
+
+    return alive
+
+
+def decide_progression(formula):
+    '''
+    Decides if formula is a tautology, if it belongs to the obligation
+    fragment.
+
+    :returns: True or False, or None if formula is not in the fragment or
+        the search is too large
+    '''
+    try:
+        (_, negated, atoms) = negation_normal_form(formula)
+        if not is_obligation(negated):
+            return None
+
+        progression = Progression(atoms, get_literals(formula))
+        residuals = progression.reachable(negated, stop=TRUE)
+        if residuals is None:
+            #the negation is satisfied by a finite prefix
+            return False
+
+        safety_graph = {}
+        candidates = set()
+        for residual in residuals:
+            candidate = drop_eventually(residual)
+            if candidate == FALSE or candidate in candidates:
+                continue
+            candidates.add(candidate)
+            if candidate not in safety_graph:
+                safety_graph.update(progression.reachable(candidate))
+            if len(safety_graph) > MAX_RESIDUALS:
+                raise ProgressionError('too many residual formulae')
+
+        return not candidates & _infinite_paths(safety_graph)
+    except ProgressionError:
+        return None
+
+
+class ProgressionError(Exception):
+    '''
+    Raised if a formula cannot be handled by progression
+    '''
+    pass
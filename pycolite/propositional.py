@@ -0,0 +1,343 @@
+'''
+This module decides in-process the validity of formulae without nested
+temporal operators, using the BDD package in pycolite.bdd.
+The supported fragment includes the propositional formulae and the Boolean
+combinations of propositional formulae and of atoms G(p) and F(p), where p
+is propositional (e.g., G(a -> b) -> G(a -> b | c)).
+Int literals are bit-blasted from their lower..upper ranges, and integer
+terms are represented as maps from their possible values to the BDD of the
+condition under which they take each value.
+
+The negation of a formula in the fragment is satisfiable if and only if
+there is an assignment to its G atoms such that, called P the conjunction of
+the bodies of the true atoms, the propositional part of the negation is
+satisfiable together with P, and P & !q is satisfiable for the body q of
+each false atom. The assignments to the atoms are enumerated, thus the
+number of atoms is bounded.
+
+Author: Antonio Iannopollo
+'''
+
+from itertools import product
+from pycolite.bdd import BDD, BDDLimitError
+from pycolite.formula import (TrueFormula, FalseFormula, Constant, Negation,
+                              Conjunction, Disjunction, Implication, Equivalence,
+                              Globally, Eventually, Addition, Subtraction,
+                              Multiplication, Division, Ge, Geq, Le, Leq)
+from pycolite.formula_analysis import children, TEMPORAL_CLASSES
+from pycolite.types import Int
+
+#maximum number of distinct G/F atoms
+MAX_ATOMS = 8
+
+#maximum number of BDD variables (state bits and atoms)
+MAX_VARIABLES = 256
+
+#maximum number of values of an integer term
+MAX_TERM_VALUES = 4096
+
+_BOOLEAN_CLASSES = (Negation, Conjunction, Disjunction, Implication, Equivalence)
+
+_ARITHMETIC_OPERATIONS = {
+    Addition: lambda l, r: l + r,
+    Subtraction: lambda l, r: l - r,
+    Multiplication: lambda l, r: l * r,
+    }
+
+_COMPARISONS = {
+    Ge: lambda l, r: l > r,
+    Geq: lambda l, r: l >= r,
+    Le: lambda l, r: l < r,
+    Leq: lambda l, r: l <= r,
+    Equivalence: lambda l, r: l == r,
+    }
+
+
+def _divide(left, right):
+    '''
+    Integer division rounding toward zero
+    '''
+    quotient = abs(left) // abs(right)
+    if (left < 0) != (right < 0):
+        return -quotient
+    return quotient
+
+
+class PropositionalEncoder(object):
+    '''
+    Encodes propositional formulae as BDDs
+    '''
+
+    def __init__(self, bdd=None):
+        '''
+        constructor
+        '''
+        if bdd is None:
+            bdd = BDD()
+
+        self.bdd = bdd
+        self.literals = {}
+        #conjunction of the range constraints of the Int literals
+        self.domain = BDD.TRUE
+
+    def _literal(self, literal):
+        '''
+        Returns the encoding of a literal: a BDD for Bool literals, and a
+        value map for Int literals
+        '''
+        try:
+            return self.literals[literal.uid]
+        except KeyError:
+            pass
+
+        bdd = self.bdd
+        if isinstance(literal.l_type, Int):
+            size = literal.l_type.upper - literal.l_type.lower + 1
+            if size > MAX_TERM_VALUES:
+                raise EncodingError('range of %s too large' % literal.unique_name)
+            bit_count = max(1, (size - 1).bit_length())
+            if bdd.var_count + bit_count > MAX_VARIABLES:
+                raise EncodingError('too many variables')
+            bits = [bdd.new_var() for _ in range(bit_count)]
+
+            values = {}
+            for offset in range(size):
+                values[literal.l_type.lower + offset] = bdd.conjunction_all(
+                    [bit if (offset >> index) & 1 else bdd.negation(bit)
+                     for (index, bit) in enumerate(bits)])
+
+            self.domain = bdd.conjunction(self.domain,
+                                          bdd.disjunction_all(values.values()))
+            encoding = values
+        else:
+            if bdd.var_count >= MAX_VARIABLES:
+                raise EncodingError('too many variables')
+            encoding = bdd.new_var()
+
+        self.literals[literal.uid] = encoding
+        return encoding
+
+    def _combine(self, left, right, operation):
+        '''
+        Combines two value maps with an arithmetic operation
+        '''
+        if len(left) * len(right) > MAX_TERM_VALUES:
+            raise EncodingError('integer term too large')
+
+        bdd = self.bdd
+        result = {}
+        for (left_value, left_cond) in left.items():
+            for (right_value, right_cond) in right.items():
+                cond = bdd.conjunction(left_cond, right_cond)
+                if cond == BDD.FALSE:
+                    continue
+                if operation is _divide and right_value == 0:
+                    raise EncodingError('possible division by zero')
+                value = operation(left_value, right_value)
+                result[value] = bdd.disjunction(result.get(value, BDD.FALSE), cond)
+
+        return result
+
+    def _compare(self, left, right, comparison):
+        '''
+        Returns the BDD of the comparison of two value maps
+        '''
+        if len(left) * len(right) > MAX_TERM_VALUES:
+            raise EncodingError('integer comparison too large')
+
+        bdd = self.bdd
+        return bdd.disjunction_all([bdd.conjunction(left_cond, right_cond)
+                                    for (left_value, left_cond) in left.items()
+                                    for (right_value, right_cond) in right.items()
+                                    if comparison(left_value, right_value)])
+
+    def encode(self, formula, leaves=None):
+        '''
+        Returns the BDD of a propositional formula.
+
+        :param leaves: dictionary mapping ids of subformulae to BDDs. These
+            subformulae are not visited
+        :type leaves: dict
+        '''
+        if leaves is None:
+            leaves = {}
+
+        bdd = self.bdd
+        values = {}
+        stack = [(formula, False)]
+        while stack:
+            (node, expanded) = stack.pop()
+            if id(node) in values:
+                continue
+            if id(node) in leaves:
+                values[id(node)] = leaves[id(node)]
+                continue
+            if not expanded:
+                stack.append((node, True))
+                stack.extend([(child, False) for child in children(node)])
+                continue
+
+            if node.is_literal:
+                result = self._literal(node)
+            elif isinstance(node, TrueFormula):
+                result = BDD.TRUE
+            elif isinstance(node, FalseFormula):
+                result = BDD.FALSE
+            elif isinstance(node, Constant):
+                result = {int(node.value): BDD.TRUE}
+            elif isinstance(node, Negation):
+                result = bdd.negation(self._boolean(values[id(node.right_formula)]))
+            else:
+                left = values[id(node.left_formula)]
+                right = values[id(node.right_formula)]
+                node_type = type(node)
+
+                if node_type is Equivalence and not isinstance(left, dict) \
+                        and not isinstance(right, dict):
+                    result = bdd.equivalence(left, right)
+                elif node_type in _COMPARISONS:
+                    result = self._compare(self._term(left), self._term(right),
+                                           _COMPARISONS[node_type])
+                elif node_type in _ARITHMETIC_OPERATIONS:
+                    result = self._combine(self._term(left), self._term(right),
+                                           _ARITHMETIC_OPERATIONS[node_type])
+                elif node_type is Division:
+                    result = self._combine(self._term(left), self._term(right),
+                                           _divide)
+                elif node_type is Conjunction:
+                    result = bdd.conjunction(self._boolean(left), self._boolean(right))
+                elif node_type is Disjunction:
+                    result = bdd.disjunction(self._boolean(left), self._boolean(right))
+                elif node_type is Implication:
+                    result = bdd.implication(self._boolean(left), self._boolean(right))
+                else:
+                    raise EncodingError('%s is not propositional' % node.Symbol)
+
+            values[id(node)] = result
+
+        return self._boolean(values[id(formula)])
+
+    def _boolean(self, value):
+        '''
+        checks value is a BDD
+        '''
+        if isinstance(value, dict):
+            raise EncodingError('integer term used as a boolean')
+        return value
+
+    def _term(self, value):
+        '''
+        checks value is a value map
+        '''
+        if not isinstance(value, dict):
+            raise EncodingError('boolean used as an integer term')
+        return value
+
+
+def temporal_atoms(formula):
+    '''
+    Returns the list of the G and F subformulae of formula, if formula is a
+    Boolean combination of propositional formulae, G(p) and F(p) with p
+    propositional. Returns None otherwise
+    '''
+    atoms = []
+    stack = [formula]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (Globally, Eventually)):
+            if not is_propositional(node.right_formula):
+                return None
+            atoms.append(node)
+        elif isinstance(node, _BOOLEAN_CLASSES):
+            stack.extend(children(node))
+        elif not is_propositional(node):
+            return None
+
+    return atoms
+
+
+def is_propositional(formula):
+    '''
+    Returns True if formula does not contain temporal operators
+    '''
+    stack = [formula]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, TEMPORAL_CLASSES):
+            return False
+        stack.extend(children(node))
+
+    return True
+
+
+def decide_propositional(formula):
+    '''
+    Decides if formula is a tautology, if it belongs to the supported
+    fragment.
+
+    :returns: True or False, or None if formula is not in the fragment or
+        it is too large
+    '''
+    atoms = temporal_atoms(formula)
+    if atoms is None or len(atoms) > MAX_ATOMS:
+        return None
+
+    try:
+        return _decide(formula, atoms)
+    except (EncodingError, BDDLimitError):
+        return None
+
+
+def _decide(formula, atoms):
+    '''
+    Decides if formula is a tautology, given its temporal atoms
+    '''
+    encoder = PropositionalEncoder()
+    bdd = encoder.bdd
+
+    #each atom is a fresh variable in the skeleton of the formula. F(p) is
+    #seen as !G(!p)
+    atom_vars = []
+    bodies = []
+    leaves = {}
+    for atom in atoms:
+        body = encoder.encode(atom.right_formula)
+        variable = bdd.new_var()
+        atom_vars.append(bdd.variable_index(variable))
+        if isinstance(atom, Globally):
+            bodies.append(body)
+            leaves[id(atom)] = variable
+        else:
+            bodies.append(bdd.negation(body))
+            leaves[id(atom)] = bdd.negation(variable)
+
+    negated = bdd.negation(encoder.encode(formula, leaves))
+    negated = bdd.conjunction(encoder.domain, negated)
+
+    if not atoms:
+        return negated == BDD.FALSE
+
+    for assignment in product((True, False), repeat=len(atoms)):
+        invariant = bdd.conjunction_all([encoder.domain] +
+                                        [body for (body, value)
+                                         in zip(bodies, assignment) if value])
+        if invariant == BDD.FALSE:
+            continue
+
+        initial = bdd.restrict(negated, dict(zip(atom_vars, assignment)))
+        if bdd.conjunction(initial, invariant) == BDD.FALSE:
+            continue
+
+        if all([bdd.conjunction(invariant, bdd.negation(body)) != BDD.FALSE
+                for (body, value) in zip(bodies, assignment) if not value]):
+            #there is a trace violating formula
+            return False
+
+    return True
+
+
+class EncodingError(Exception):
+    '''
+    Raised if a formula cannot be encoded as a BDD
+    '''
+    pass
@@ -0,0 +1,203 @@
+'''
+This module implements a graph of refinement verdicts among the contracts of
+a library. Refinement is a preorder, thus new verdicts can be inferred from
+the recorded ones before calling a solver:
+
+- A <= A;
+- if A <= B and B <= C, then A <= C;
+- if A <= B and not A <= C, then not B <= C (and, dually, if B <= C and
+  not A <= C, then not A <= B). In general, not X <= Y if there is a
+  recorded verdict not P <= Q with P <= X and Y <= Q.
+
+Contracts are identified by a key function, by default their fingerprint,
+so that identical contracts share their verdicts. Verdicts are meaningful only if
+all the checks use the same correspondence among ports, thus the checks of
+the lattice connect the ports of the two contracts which have the same name
+and type, on copies of the contracts, before calling the solver. The
+verdicts are about this correspondence, which only depends on the port
+names and types, and they can differ from the ones of
+Contract.is_refinement on the same contracts, which only uses the existing
+connections.
+Checks with an explicit refinement mapping, and checks of contracts whose
+ports are already connected to ports with another name, always call the
+solver and their verdicts are not recorded.
+
+Author: Antonio Iannopollo
+'''
+
+from collections import deque
+from pycolite.contract import verify_refinement, RefinementMapping, NotARefinementError
+from pycolite.fingerprint import fingerprint
+from pycolite import LOG
+
+
+def name_mapping(refined, abstract):
+    '''
+    Returns the RefinementMapping connecting the ports of refined and
+    abstract with the same name and type, or None if a port of refined is
+    already connected to a port of abstract with another name
+    '''
+    abstract_names = {}
+    for (name, port) in abstract.ports_dict.items():
+        abstract_names.setdefault(port.literal.uid, set()).add(name)
+
+    mapping = RefinementMapping([refined, abstract])
+    for (name, port) in refined.ports_dict.items():
+        if abstract_names.get(port.literal.uid, set([name])) != set([name]):
+            return None
+        try:
+            abstract_port = abstract.ports_dict[name]
+        except KeyError:
+            continue
+        if port.l_type == abstract_port.l_type:
+            mapping.add(port, abstract_port)
+
+    return mapping
+
+
+class RefinementLattice(object):
+    '''
+    Records proven and disproven refinement edges, and infers new verdicts
+    from transitivity and contrapositives
+    '''
+
+    def __init__(self, key=fingerprint):
+        '''
+        constructor
+
+        :param key: function mapping a contract to a hashable key
+        :type key: callable
+        '''
+        self.key = key
+        #proven edges: refines[a] is the set of b such that a <= b
+        self.refines = {}
+        #reverse proven edges: refined_by[b] is the set of a such that a <= b
+        self.refined_by = {}
+        #disproven edges, as pairs (a, b) such that not a <= b
+        self.disproven = set()
+        self.inferred = 0
+        self.checked = 0
+
+    def record(self, refined, abstract, verdict):
+        '''
+        Records that refined refines abstract, if verdict is True, or that it
+        does not, if verdict is False
+        '''
+        self.record_keys(self.key(refined), self.key(abstract), verdict)
+
+    def record_keys(self, refined_key, abstract_key, verdict):
+        '''
+        Records a verdict between two contract keys
+        '''
+        if verdict:
+            self.refines.setdefault(refined_key, set()).add(abstract_key)
+            self.refined_by.setdefault(abstract_key, set()).add(refined_key)
+        else:
+            self.disproven.add((refined_key, abstract_key))
+
+    @staticmethod
+    def _closure(start, edges):
+        '''
+        Returns the set of keys reachable from start (included) following
+        edges
+        '''
+        reached = set([start])
+        frontier = deque([start])
+        while frontier:
+            node = frontier.popleft()
+            for successor in edges.get(node, ()):
+                if successor not in reached:
+                    reached.add(successor)
+                    frontier.append(successor)
+
+        return reached
+
+    def lookup_keys(self, refined_key, abstract_key):
+        '''
+        Returns True if refinement between two contract keys is implied by
+        the recorded verdicts, False if its negation is implied, None
+        otherwise
+        '''
+        above = self._closure(refined_key, self.refines)
+        if abstract_key in above:
+            return True
+
+        if self.disproven:
+            below = self._closure(refined_key, self.refined_by)
+            above_abstract = self._closure(abstract_key, self.refines)
+            for (lower, upper) in self.disproven:
+                if lower in below and upper in above_abstract:
+                    return False
+
+        return None
+
+    def lookup(self, refined, abstract):
+        '''
+        Returns True if refined refines abstract according to the recorded
+        verdicts, False if it does not, None if the verdict is unknown
+        '''
+        return self.lookup_keys(self.key(refined), self.key(abstract))
+
+    def check(self, refined, abstract, refinement_mapping=None, strategy_obj=None):
+        '''
+        Returns True if refined refines abstract, with the ports with the
+        same name and type connected. A solver is called only if the verdict
+        cannot be inferred, and its verdict is recorded.
+        If refinement_mapping is not None, or if the ports of the contracts
+        are connected otherwise, the verdict depends on the connections,
+        thus it is neither inferred nor recorded
+        '''
+        shared = refinement_mapping is None
+        if shared:
+            refinement_mapping = name_mapping(refined, abstract)
+            shared = refinement_mapping is not None
+
+        if shared:
+            verdict = self.lookup(refined, abstract)
+            if verdict is not None:
+                self.inferred += 1
+                LOG.debug('refinement verdict %s inferred' % verdict)
+                return verdict
+
+        try:
+            verify_refinement(refined, abstract, refinement_mapping=refinement_mapping,
+                              strategy_obj=strategy_obj)
+        except NotARefinementError:
+            verdict = False
+        else:
+            verdict = True
+
+        self.checked += 1
+        if shared:
+            self.record(refined, abstract, verdict)
+        return verdict
+
+    def classify(self, contracts, strategy_factory=None):
+        '''
+        Computes the refinement relation among all the pairs of contracts.
+
+        :param strategy_factory: function returning a new strategy object
+            for the refined contract of each check. If None, the default
+            strategy is used
+        :type strategy_factory: callable
+        :returns: dictionary mapping pairs (refined, abstract) to verdicts
+        '''
+        verdicts = {}
+        for refined in contracts:
+            for abstract in contracts:
+                strategy_obj = None if strategy_factory is None \
+                        else strategy_factory(refined)
+                verdicts[(refined, abstract)] = self.check(refined, abstract,
+                                                           strategy_obj=strategy_obj)
+
+        return verdicts
+
+    def clear(self):
+        '''
+        Forgets all the recorded verdicts and resets the counters
+        '''
+        self.refines.clear()
+        self.refined_by.clear()
+        self.disproven.clear()
+        self.inferred = 0
+        self.checked = 0
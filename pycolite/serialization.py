@@ -0,0 +1,218 @@
+'''
+This module contains a compact serialization format for formulae and
+contracts, used by pickle to ship them to other processes.
+Formulae are stored as arrays of nodes in postfix order, in which literals
+are indices in a table of literals, and contracts as a literal table, the
+postfix arrays of their formulae and a port table. The format does not
+contain references among objects, thus pickle neither follows the observer
+cycles between literals, ports and formulae nor recurses through deep
+formulae. Both serialization and deserialization are linear and iterative.
+
+Literals keep their unique names, so that verdicts and counterexamples
+computed by another process refer to the original literals. The names are
+reserved in the AttributeNamePool of the loading process, so that the
+attributes it creates afterwards do not take them. Naming contexts and the
+composition history of contracts are not serialized.
+
+Author: Antonio Iannopollo
+'''
+
+from pycolite.attribute import AttributeNamePool
+from pycolite.formula import (Literal, TrueFormula, FalseFormula, Constant,
+                              BinaryFormula, UnaryFormula, Conjunction,
+                              Disjunction, Implication, Equivalence, Globally,
+                              Eventually, Next, Negation, Addition, Subtraction,
+                              Multiplication, Division, Ge, Geq, Le, Leq)
+from pycolite.formula_analysis import post_order
+from pycolite.types import Bool, Int
+
+FORMAT_VERSION = 1
+
+#node classes, by symbol
+NODE_CLASSES = {cls.Symbol: cls for cls in
+                (TrueFormula, FalseFormula, Conjunction, Disjunction, Implication,
+                 Equivalence, Globally, Eventually, Next, Negation, Addition,
+                 Subtraction, Multiplication, Division, Ge, Geq, Le, Leq)}
+
+
+class LiteralTable(object):
+    '''
+    Assigns consecutive indices to literals, and stores them as tuples
+    (base name, unique name, type), where the type is None for booleans and a
+    pair (lower, upper) for integers
+    '''
+
+    def __init__(self):
+        '''
+        constructor
+        '''
+        self.indices = {}
+        self.entries = []
+
+    def index(self, literal):
+        '''
+        Returns the index of literal, adding it to the table if needed
+        '''
+        #leaves of merged literals reference the literal they were merged into
+        literal = literal.literals.values()[0]
+        try:
+            return self.indices[literal.uid]
+        except KeyError:
+            pass
+
+        if isinstance(literal.l_type, Int):
+            type_key = (literal.l_type.lower, literal.l_type.upper)
+        elif isinstance(literal.l_type, Bool):
+            type_key = None
+        else:
+            raise SerializationError('unsupported type %s' % literal.l_type)
+
+        index = len(self.entries)
+        self.indices[literal.uid] = index
+        self.entries.append((literal.base_name, literal.unique_name, type_key))
+        return index
+
+
+def build_literals(entries):
+    '''
+    Returns the list of new literals described by the entries of a
+    LiteralTable. Their unique names are reserved
+    '''
+    literals = []
+    for (base_name, unique_name, type_key) in entries:
+        l_type = Bool() if type_key is None else Int(*type_key)
+        literal = Literal(base_name, l_type=l_type)
+        literal.unique_name = unique_name
+        AttributeNamePool.reserve_name(base_name, unique_name)
+        literals.append(literal)
+
+    return literals
+
+
+def encode_formula(formula, table):
+    '''
+    Returns the postfix array of formula. Nodes are literal indices
+    (integers), symbols of operators and constants (strings), or one element
+    tuples holding the value of a Constant
+    '''
+    nodes = []
+    for node in post_order(formula):
+        if node.is_literal:
+            nodes.append(table.index(node))
+        elif isinstance(node, Constant):
+            nodes.append((node.value,))
+        elif node.Symbol in NODE_CLASSES:
+            nodes.append(node.Symbol)
+        else:
+            raise SerializationError('unsupported node %s' % type(node).__name__)
+
+    return nodes
+
+
+def decode_formula(nodes, literals):
+    '''
+    Builds the formula described by a postfix array, on a list of literals
+    '''
+    stack = []
+    for node in nodes:
+        if isinstance(node, int):
+            stack.append(literals[node])
+        elif isinstance(node, tuple):
+            stack.append(Constant(node[0]))
+        else:
+            cls = NODE_CLASSES[node]
+            if issubclass(cls, BinaryFormula):
+                right = stack.pop()
+                #literals are already shared, no merge is needed
+                stack.append(cls(stack.pop(), right, merge_literals=False))
+            elif issubclass(cls, UnaryFormula):
+                stack.append(cls(stack.pop()))
+            else:
+                stack.append(cls())
+
+    if len(stack) != 1:
+        raise SerializationError('malformed formula')
+
+    return stack[0]
+
+
+def formula_state(formula):
+    '''
+    Returns the serialized form of formula
+    '''
+    table = LiteralTable()
+    nodes = encode_formula(formula, table)
+    return (FORMAT_VERSION, table.entries, nodes)
+
+
+def formula_from_state(state):
+    '''
+    Builds a formula from its serialized form
+    '''
+    (version, entries, nodes) = state
+    _check_version(version)
+    return decode_formula(nodes, build_literals(entries))
+
+
+def contract_state(contract):
+    '''
+    Returns the serialized form of contract
+    '''
+    table = LiteralTable()
+    assume_nodes = encode_formula(contract.assume_formula, table)
+    guarantee_nodes = encode_formula(contract.guarantee_formula, table)
+
+    ports = []
+    for (is_output, port_dict) in ((False, contract.input_ports_dict),
+                                   (True, contract.output_ports_dict)):
+        for base_name in sorted(port_dict):
+            ports.append((base_name, table.index(port_dict[base_name].literal),
+                          is_output))
+
+    return (FORMAT_VERSION, contract.base_name, contract.unique_name,
+            contract.symbol_set_cls, contract.infer_ports, table.entries,
+            assume_nodes, guarantee_nodes, ports)
+
+
+def contract_from_state(state):
+    '''
+    Builds a contract from its serialized form
+    '''
+    #imported here, since contract imports this module
+    from pycolite.contract import Contract, Port
+
+    (version, base_name, unique_name, symbol_set_cls, infer_ports, entries,
+     assume_nodes, guarantee_nodes, ports) = state
+    _check_version(version)
+
+    literals = build_literals(entries)
+    input_ports = {}
+    output_ports = {}
+    for (port_name, index, is_output) in ports:
+        literal = literals[index]
+        port_dict = output_ports if is_output else input_ports
+        port_dict[port_name] = Port(port_name, l_type=literal.l_type, literal=literal)
+
+    contract = Contract(base_name, input_ports, output_ports,
+                        decode_formula(assume_nodes, literals),
+                        decode_formula(guarantee_nodes, literals),
+                        symbol_set_cls=symbol_set_cls, infer_ports=infer_ports)
+    contract.name_attribute.unique_name = unique_name
+    AttributeNamePool.reserve_name(base_name, unique_name)
+
+    return contract
+
+
+def _check_version(version):
+    '''
+    Raises SerializationError if version is not supported
+    '''
+    if version != FORMAT_VERSION:
+        raise SerializationError('unsupported format version %s' % version)
+
+
+class SerializationError(Exception):
+    '''
+    Raised if an object cannot be serialized or deserialized
+    '''
+    pass
@@ -0,0 +1,169 @@
+'''
+This module saves and restores the state of a running service: a contract
+library, the naming state of AttributeNamePool and the cached verdicts
+(refinement lattice, obligation verdicts and ltl3ba automata and verdicts).
+A snapshot is a single versioned file: a header, the metadata encoded with
+marshal and the library in the format of the packed_library module. On
+restore, the metadata is read and the library is memory-mapped, so that
+contracts are only decoded when they are used.
+
+Author: Antonio Iannopollo
+'''
+
+import marshal
+import os
+from struct import Struct
+from pycolite.attribute import AttributeNamePool
+from pycolite.buchi import BuchiAutomaton
+from pycolite.ltl3ba import AUTOMATON_CACHE
+from pycolite.obligations import OBLIGATION_CACHE
+from pycolite.packed_library import pack_library, packed_count, PackedLibrary
+from pycolite.refinement_graph import RefinementLattice
+from pycolite import LOG
+
+MAGIC = 'PCSN'
+FORMAT_VERSION = 2
+
+#magic, version, size of the metadata, offset of the library
+_HEADER = Struct('<4sIQQ')
+_ALIGNMENT = 8
+
+
+class Snapshot(object):
+    '''
+    Restored snapshot
+    '''
+
+    def __init__(self, path, library, lattice):
+        '''
+        constructor
+
+        :param library: the restored library
+        :type library: PackedLibrary
+        :param lattice: lattice holding the restored refinement verdicts
+        :type lattice: RefinementLattice
+        '''
+        self.path = path
+        self.library = library
+        self.lattice = lattice
+
+    def close(self):
+        '''
+        Unmaps the library
+        '''
+        self.library.close()
+
+
+def _lattice_state(lattice):
+    '''
+    Returns the verdicts of lattice as a pair (proven edges, disproven edges)
+    '''
+    if lattice is None:
+        return ([], [])
+
+    return ([(refined, abstract) for (refined, abstracts) in lattice.refines.items()
+             for abstract in abstracts], list(lattice.disproven))
+
+
+def _automata_state(automaton_cache):
+    '''
+    Returns the automata of automaton_cache as a dictionary mapping
+    skeletons to tuples (initial, accepting states, transitions)
+    '''
+    return {skeleton: (automaton.initial, list(automaton.accepting),
+                       automaton.transitions)
+            for (skeleton, automaton) in automaton_cache.automata.items()}
+
+
+def write_snapshot(path, contracts=(), lattice=None,
+                   obligation_cache=OBLIGATION_CACHE, automaton_cache=AUTOMATON_CACHE):
+    '''
+    Writes a snapshot in the file path. The file is replaced atomically.
+    Lattice keys have to be strings, as the default fingerprints.
+
+    :param contracts: library contracts, e.g. a ContractLibrary
+    :type contracts: iterable of Contract
+    :param lattice: refinement verdicts to save, if not None
+    :type lattice: RefinementLattice
+    :returns: number of contracts written
+    '''
+    (proven, disproven) = _lattice_state(lattice)
+    metadata = marshal.dumps({
+        'naming': AttributeNamePool.naming_state(),
+        'proven': proven,
+        'disproven': disproven,
+        'obligations': dict(obligation_cache.verdicts),
+        'verdicts': dict(automaton_cache.verdicts),
+        'automata': _automata_state(automaton_cache),
+        })
+    library_data = pack_library(contracts)
+
+    offset = _HEADER.size + len(metadata)
+    padding = -offset % _ALIGNMENT
+    offset += padding
+
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp_path, 'wb') as snapshot_file:
+        snapshot_file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(metadata), offset))
+        snapshot_file.write(metadata)
+        snapshot_file.write('\0' * padding)
+        snapshot_file.write(library_data)
+    os.rename(temp_path, path)
+
+    return packed_count(library_data)
+
+
+def load_snapshot(path, lattice=None, obligation_cache=OBLIGATION_CACHE,
+                  automaton_cache=AUTOMATON_CACHE, restore_naming=True):
+    '''
+    Restores a snapshot. Cached verdicts are added to the given caches and
+    lattice (a new RefinementLattice if None). If restore_naming is True,
+    the naming counters are advanced, so that new attributes do not take
+    the names of the restored ones.
+
+    :returns: Snapshot object
+    '''
+    with open(path, 'rb') as snapshot_file:
+        header = snapshot_file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise SnapshotError('%s is not a snapshot' % path)
+
+        (magic, version, metadata_size, offset) = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise SnapshotError('%s is not a snapshot' % path)
+        if version != FORMAT_VERSION:
+            raise SnapshotError('unsupported snapshot version %d' % version)
+
+        try:
+            metadata = marshal.loads(snapshot_file.read(metadata_size))
+        except (EOFError, ValueError, TypeError) as error:
+            raise SnapshotError('corrupted snapshot %s: %s' % (path, error))
+
+    if restore_naming:
+        AttributeNamePool.restore_naming_state(metadata['naming'])
+
+    if lattice is None:
+        lattice = RefinementLattice()
+    for (refined_key, abstract_key) in metadata['proven']:
+        lattice.record_keys(refined_key, abstract_key, True)
+    for (refined_key, abstract_key) in metadata['disproven']:
+        lattice.record_keys(refined_key, abstract_key, False)
+
+    obligation_cache.verdicts.update(metadata['obligations'])
+    automaton_cache.verdicts.update(metadata['verdicts'])
+    for (skeleton, (initial, accepting, transitions)) in metadata['automata'].items():
+        automaton_cache.automata.setdefault(
+            skeleton, BuchiAutomaton(initial, accepting, transitions))
+
+    library = PackedLibrary(path, offset, restore_naming)
+    LOG.debug('restored snapshot %s: %d contracts, %d verdicts' %
+              (path, len(library), len(metadata['obligations']) + len(metadata['verdicts'])))
+
+    return Snapshot(path, library, lattice)
+
+
+class SnapshotError(Exception):
+    '''
+    Raised if a file is not a valid snapshot
+    '''
+    pass
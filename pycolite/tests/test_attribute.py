@@ -0,0 +1,168 @@
+'''
+This module tests the generation of unique attribute names
+
+author: Antonio Iannopollo
+'''
+
+from threading import Event, Thread
+from pycolite.attribute import Attribute, AttributeNamePool
+from pycolite.contract import Contract
+
+
+class _Context(object):
+    '''
+    context object, which can be weakly referenced
+    '''
+    pass
+
+
+def test_scope_releases_counters():
+    '''
+    names created in a scope are unique, and the scope counters are
+    released when it ends
+    '''
+    outer = Attribute('scoped').unique_name
+
+    with AttributeNamePool.scope() as scope:
+        first = Attribute('scoped').unique_name
+        second = Attribute('scoped').unique_name
+        assert len(scope.extractors) == 1
+
+    assert len(set([outer, first, second])) == 3
+    assert AttributeNamePool.scope_depth() == 0
+
+    with AttributeNamePool.scope():
+        assert Attribute('scoped').unique_name == first
+
+
+def test_compact_mode():
+    '''
+    compact mode uses a single counter
+    '''
+    with AttributeNamePool.scope(compact=True) as scope:
+        names = [Attribute(name).unique_name for name in ('x', 'y', 'x')]
+        assert scope.counter - int(names[0].split('_')[-1]) == 3
+        assert not scope.extractors
+
+    assert not AttributeNamePool.compact
+
+
+def test_compact_names_built_on_use():
+    '''
+    in compact mode, names are built from the uids when they are used
+    '''
+    with AttributeNamePool.scope(compact=True):
+        attribute = Attribute('x')
+
+    assert attribute._unique_name is None
+    assert attribute.unique_name == 'x_%d' % attribute.uid
+
+
+def test_context_counters_released():
+    '''
+    counters of garbage collected contexts are released
+    '''
+    with AttributeNamePool.scope() as scope:
+        context = _Context()
+        Attribute('contextual', context)
+        extractor = scope.extractors['contextual']
+        assert len(extractor) == 1
+
+        del context
+        assert len(extractor) == 0
+
+
+def test_concurrent_contracts():
+    '''
+    contracts built from several threads have distinct names and the
+    expected formulae
+    '''
+    contracts = []
+
+    def build(index):
+        '''
+        thread body
+        '''
+        for _ in range(20):
+            contracts.append(Contract('C%d' % index, ['a'], ['b'], 'G(a)',
+                                      'G(a -> X(b)) & F(b)'))
+
+    threads = [Thread(target=build, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(contracts) == 80
+    names = set([port.unique_name for contract in contracts
+                 for port in contract.ports_dict.values()])
+    assert len(names) == 160
+    assert all([len(contract.formulae_dict) == 2 for contract in contracts])
+
+
+def test_concurrent_scopes():
+    '''
+    a scope opened by a thread neither captures the attributes nor changes
+    the mode of the other threads
+    '''
+    entered = Event()
+    done = Event()
+    scoped = []
+
+    def work():
+        '''
+        thread body
+        '''
+        with AttributeNamePool.scope(compact=True):
+            scoped.append(AttributeNamePool.is_compact())
+            entered.set()
+            done.wait(10)
+
+    thread = Thread(target=work)
+    thread.start()
+    assert entered.wait(10)
+
+    names = [Attribute('threaded').unique_name for _ in range(3)]
+    assert AttributeNamePool.scope_depth() == 0
+    assert not AttributeNamePool.is_compact()
+
+    done.set()
+    thread.join()
+
+    names.extend([Attribute('threaded').unique_name for _ in range(3)])
+    assert scoped == [True]
+    assert len(set(names)) == 6
+
+
+def test_scopes_share_counters():
+    '''
+    names generated in the scopes of several threads and out of the scopes
+    are unique, and scopes interleaved with other names are not released
+    '''
+    entered = [Event(), Event()]
+    named = Event()
+    names = []
+
+    def work(index):
+        '''
+        thread body
+        '''
+        with AttributeNamePool.scope():
+            names.extend([Attribute('shared').unique_name for _ in range(3)])
+            entered[index].set()
+            named.wait(10)
+            names.extend([Attribute('shared').unique_name for _ in range(3)])
+
+    threads = [Thread(target=work, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    assert all([event.wait(10) for event in entered])
+
+    names.extend([Attribute('shared').unique_name for _ in range(3)])
+    named.set()
+    for thread in threads:
+        thread.join()
+
+    names.extend([Attribute('shared').unique_name for _ in range(3)])
+    assert len(names) == 18
+    assert len(set(names)) == 18
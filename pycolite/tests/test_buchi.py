@@ -0,0 +1,145 @@
+'''
+This module tests the Buchi automata built from ltl3ba never claims
+
+author: Antonio Iannopollo
+'''
+
+import pytest
+from pycolite.contract import Contract
+from pycolite.buchi import (parse_never_claim, abstract_formula, AtomDomain,
+                            ProductAutomaton, BuchiParseError)
+from pycolite.ltl3ba import AutomatonCache
+from pycolite.parser.parser import LTL_PARSER
+
+#never claim of !G(p0 -> X(p1))
+NEVER_CLAIM = '''never { /* !(G((p0 -> X(p1)))) */
+T0_init :    /* init */
+	if
+	:: (1) -> goto T0_init
+	:: (p0) -> goto T1_S2
+	fi;
+T1_S2 :    /* 1 */
+	if
+	:: (!p1) -> goto accept_all
+	fi;
+accept_all :    /* 2 */
+	skip
+}
+'''
+
+#never claim of G(p0) && G(p1)
+NEVER_CLAIM_CUBES = '''never { /* (G(p0) && G(p1)) */
+accept_init :    /* init */
+	if
+	:: (p0 && p1) -> goto accept_init
+	fi;
+}
+'''
+
+#never claim of G(p0)
+NEVER_CLAIM_GLOBALLY = '''never { /* G(p0) */
+accept_init :    /* init */
+	if
+	:: (p0) -> goto accept_init
+	fi;
+}
+'''
+
+#never claim of GF(p0)
+NEVER_CLAIM_INFINITELY = '''never { /* G(F(p0)) */
+T0_init :    /* init */
+	if
+	:: (1) -> goto T0_init
+	:: (p0) -> goto accept_S1
+	fi;
+accept_S1 :    /* 1 */
+	if
+	:: (1) -> goto T0_init
+	:: (p0) -> goto accept_S1
+	fi;
+}
+'''
+
+EMPTY_CLAIM = '''never { /* false */
+T0_init:
+	false;
+}
+'''
+
+
+def test_parse_never_claim():
+    '''
+    states, accepting states and edges of a never claim
+    '''
+    automaton = parse_never_claim(NEVER_CLAIM)
+
+    assert automaton.initial == 'T0_init'
+    assert automaton.accepting == frozenset(['accept_all'])
+    assert len(automaton) == 3
+    assert automaton.edges('T1_S2') == [(((1, False),), 'accept_all')]
+    assert automaton.edges('accept_all') == [((), 'accept_all')]
+    assert not automaton.is_empty()
+
+
+def test_empty_claim():
+    '''
+    the false automaton is empty
+    '''
+    automaton = parse_never_claim(EMPTY_CLAIM)
+
+    assert automaton.is_empty()
+    with pytest.raises(BuchiParseError):
+        parse_never_claim('ltl3ba: syntax error')
+
+
+def test_abstract_formula():
+    '''
+    maximal propositional subformulae become atoms, shared when equal
+    '''
+    (skeleton, atoms) = abstract_formula(LTL_PARSER.parse('G(a & b -> Xc) & F(a & b)'))
+
+    assert skeleton == '(G((p0 -> X(p1))) && F(p0))'
+    assert len(atoms) == 2
+
+
+def test_infeasible_cubes():
+    '''
+    cubes are checked on the actual atoms
+    '''
+    contract = Contract('I', [('x', 0, 10)], ['b'], 'true', 'G(x > 5) & G(x < 3)',
+                        saturated=False)
+    (_, atoms) = abstract_formula(contract.guarantee_formula)
+    automaton = parse_never_claim(NEVER_CLAIM_CUBES)
+
+    assert not automaton.is_empty()
+    assert automaton.is_empty(AtomDomain(atoms).feasible)
+
+
+def test_product():
+    '''
+    G(a) & GF(!a) is empty, G(a) & GF(b) is not
+    '''
+    globally = parse_never_claim(NEVER_CLAIM_GLOBALLY)
+    infinitely = parse_never_claim(NEVER_CLAIM_INFINITELY)
+    product = ProductAutomaton(globally, infinitely, 1)
+
+    (_, atoms) = abstract_formula(LTL_PARSER.parse('G(a) & GF(!a)'))
+    assert product.is_empty(AtomDomain(atoms).feasible)
+
+    (_, atoms) = abstract_formula(LTL_PARSER.parse('G(a) & GF(b)'))
+    assert not product.is_empty(AtomDomain(atoms).feasible)
+
+
+def test_bounded_automaton_cache():
+    '''
+    the least recently used automata and verdicts are evicted first
+    '''
+    cache = AutomatonCache('/nonexistent', max_automata=1, max_verdicts=1)
+    formulae = [LTL_PARSER.parse('!G(a -> X(b))'), LTL_PARSER.parse('G(a) & G(b)')]
+    for (formula, claim) in zip(formulae, [NEVER_CLAIM, NEVER_CLAIM_CUBES]):
+        cache.automata[abstract_formula(formula)[0]] = parse_never_claim(claim)
+        assert cache.is_empty(formula) is False
+
+    assert len(cache.automata) == 1
+    assert len(cache.verdicts) == 1
+    assert abstract_formula(formulae[1])[0] in cache.automata
@@ -4,9 +4,13 @@ This module takes care of Contract class related tests
 author: Antonio Iannopollo
 '''
 
+import gc
+from weakref import ref
 import pytest
+from pycolite.nuxmv import NuxmvRefinementStrategy
 from pycolite.contract import Contract, PortDeclarationError, PortMappingError, \
                         PortConnectionError, CompositionMapping
+from pycolite.variable_ordering import variable_order, leaf_components
 from pycolite import LOG
 
 @pytest.fixture()
@@ -520,3 +524,186 @@ def test_hotzi_totzi(composition_hotzi_totzi):
 def test_port_literal_hiding(contract_less_ports):
 
     assert True
+
+
+def test_variable_order_composition(c1_compose_c2):
+    '''
+    variables are grouped by component, connected ports at the boundary
+    '''
+    assert len(leaf_components(c1_compose_c2)) == 2
+
+    order = variable_order([c1_compose_c2])
+    literals = set([l.unique_name for (_, l) in
+                    c1_compose_c2.guarantee_formula.get_literal_items()])
+
+    assert literals <= set(order)
+    assert len(order) == len(set(order))
+
+    #a and b are shared by the two components
+    shared = set([c1_compose_c2.a.unique_name, c1_compose_c2.b.unique_name])
+    positions = sorted([order.index(name) for name in shared])
+    assert positions[1] - positions[0] == 1
+
+
+def test_variable_order_interleaving(contract_1, contract_2):
+    '''
+    ports with the same name in different contracts are placed next to each other
+    '''
+    order = variable_order([contract_1, contract_2])
+
+    for name in ('b', 'c', 'e'):
+        position_1 = order.index(contract_1.ports_dict[name].unique_name)
+        position_2 = order.index(contract_2.ports_dict[name].unique_name)
+        assert abs(position_1 - position_2) == 1
+
+
+class _RecordingStrategy(NuxmvRefinementStrategy):
+    '''
+    keeps weak references to the guarantee formulae built by the checks and
+    to the contracts it checks, shared with its copies
+    '''
+
+    def __init__(self, contract):
+        '''
+        constructor
+        '''
+        super(_RecordingStrategy, self).__init__(contract)
+        self.formulae = []
+        self.contracts = []
+
+    def check_refinement(self, abstract_contract):
+        '''
+        records the checked contracts
+        '''
+        self.contracts.append(ref(self.contract))
+        self.contracts.append(ref(abstract_contract))
+        return super(_RecordingStrategy, self).check_refinement(abstract_contract)
+
+    def _get_guarantee_check_formula(self, abstract_contract):
+        '''
+        records the built formula
+        '''
+        formula = super(_RecordingStrategy, self)._get_guarantee_check_formula(
+            abstract_contract)
+        self.formulae.append(ref(formula))
+        return formula
+
+
+def test_observers_released():
+    '''
+    formulae built by 10000 refinement checks do not stay attached to the
+    literals of a long-lived contract
+    '''
+    contract = Contract('C', ['a'], ['b'], 'a', 'b')
+    literal = contract.ports_dict['a'].literal
+    strategy = _RecordingStrategy(contract)
+
+    for _ in range(10000):
+        assert strategy.check_refinement(contract)
+
+    gc.collect()
+    assert len(literal.observers) <= 2
+    assert len(strategy.formulae) == 10000
+    assert all([formula() is None for formula in strategy.formulae])
+
+
+def test_refinement_copies_released():
+    '''
+    the copies made by refinement checks are released, and they do not stay
+    attached to the literals shared by the checked contracts
+    '''
+    contract = Contract('C', ['a'], ['b'], 'a', 'b')
+    abstract = Contract('D', ['a'], ['b'], 'a', 'b')
+    abstract.connect_to_port(abstract.a, contract.a)
+    abstract.connect_to_port(abstract.b, contract.b)
+    literals = [port.literal for port in contract.ports_dict.values()]
+    observers = [len(literal.observers) for literal in literals]
+    strategy = _RecordingStrategy(contract)
+
+    for _ in range(200):
+        assert contract.is_refinement(abstract, strategy_obj=strategy)
+
+    gc.collect()
+    assert len(strategy.contracts) == 400
+    assert all([copy() is None for copy in strategy.contracts])
+    assert [len(literal.observers) for literal in literals] == observers
+
+
+def test_dispose(contract_1):
+    '''
+    a disposed contract is detached from its literals
+    '''
+    copy = contract_1.copy()
+    literals = [port.literal for port in copy.ports_dict.values()]
+    copy.dispose()
+
+    for literal in literals:
+        assert set(literal.observers) <= set([literal])
+
+
+def test_cached_indexes(contract_1, contract_2):
+    '''
+    port indexes are cached, and rebuilt when ports are connected
+    '''
+    copy_1 = contract_1.copy()
+    copy_2 = contract_2.copy()
+    assert copy_1.ports_dict is copy_1.ports_dict
+    reverse = copy_1.reverse_ports_dict
+
+    name = sorted(copy_1.ports_dict.viewkeys() & copy_2.ports_dict.viewkeys())[0]
+    copy_1.connect_to_port(copy_1.ports_dict[name], copy_2.ports_dict[name])
+
+    assert copy_1.reverse_ports_dict is not reverse
+    assert copy_2.ports_dict[name].literal.uid in copy_1.reverse_ports_dict
+    assert copy_1.ports_dict[name].is_connected_to(copy_2.ports_dict[name])
+
+
+def test_batch_connect(contract_1, contract_2):
+    '''
+    batched connections take effect when the batch ends, and are discarded
+    if the batch fails
+    '''
+    copy_1 = contract_1.copy()
+    copy_2 = contract_2.copy()
+    copy_3 = contract_2.copy()
+    names = sorted(copy_1.ports_dict.viewkeys() & copy_2.ports_dict.viewkeys())
+
+    with pytest.raises(PortDeclarationError):
+        with Contract.batch_connect():
+            copy_1.connect_to_port(copy_1.ports_dict[names[0]], copy_2.ports_dict[names[0]])
+            copy_2.connect_to_port(copy_1.ports_dict[names[0]], copy_2.ports_dict[names[0]])
+    assert not copy_1.ports_dict[names[0]].is_connected_to(copy_2.ports_dict[names[0]])
+
+    with Contract.batch_connect():
+        copy_1.connect_many([(copy_1.ports_dict[name], copy_2.ports_dict[name])
+                             for name in names])
+        copy_2.connect_to_port(copy_2.ports_dict[names[0]], copy_3.ports_dict[names[0]])
+        assert not copy_1.ports_dict[names[0]].is_connected_to(copy_2.ports_dict[names[0]])
+
+    for name in names:
+        assert copy_1.ports_dict[name].is_connected_to(copy_2.ports_dict[name])
+    assert copy_1.ports_dict[names[0]].unique_name == copy_3.ports_dict[names[0]].unique_name
+    assert copy_1.ports_dict[names[0]].literal.uid in copy_1.formulae_reverse_dict
+
+
+def test_nested_batch_rollback(contract_1, contract_2):
+    '''
+    connections of a failed nested batch are discarded, and the ones of the
+    outer batch are performed
+    '''
+    copy_1 = contract_1.copy()
+    copy_2 = contract_2.copy()
+    names = sorted(copy_1.ports_dict.viewkeys() & copy_2.ports_dict.viewkeys())
+    assert len(names) > 1
+
+    with Contract.batch_connect():
+        copy_1.connect_to_port(copy_1.ports_dict[names[0]], copy_2.ports_dict[names[0]])
+        with pytest.raises(PortDeclarationError):
+            with Contract.batch_connect():
+                copy_1.connect_to_port(copy_1.ports_dict[names[1]],
+                                       copy_2.ports_dict[names[1]])
+                copy_2.connect_to_port(copy_1.ports_dict[names[0]],
+                                       copy_2.ports_dict[names[0]])
+
+    assert copy_1.ports_dict[names[0]].is_connected_to(copy_2.ports_dict[names[0]])
+    assert not copy_1.ports_dict[names[1]].is_connected_to(copy_2.ports_dict[names[1]])
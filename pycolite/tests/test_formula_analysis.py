@@ -0,0 +1,250 @@
+'''
+This module tests the syntactic analysis of formulae and the engine selection
+
+author: Antonio Iannopollo
+'''
+
+import pytest
+from StringIO import StringIO
+from pycolite.contract import Contract
+from pycolite.formula_analysis import (FormulaFeatures, temporal_depth,
+                                       is_syntactic_safety, canonical_form,
+                                       temporal_class)
+from pycolite.obligations import (split_consequent, verify_obligations,
+                                  ObligationCache)
+from pycolite.engine_selection import EngineSelector
+from pycolite.fast_paths import fold_constants, FAST_PATH_STATS
+from pycolite.propositional import decide_propositional
+from pycolite.progression import decide_progression
+from pycolite.nuxmv import verify_tautology
+from pycolite.parser.parser import LTL_PARSER
+
+
+@pytest.fixture()
+def int_contract():
+    '''
+    contract with an integer input
+    '''
+    return Contract('I', [('x', 0, 1000), 'a'], ['b'], 'G(x > 3)', 'G(a -> Xb)',
+                    saturated=False)
+
+
+@pytest.mark.parametrize('formula_str, depth', [
+    ('a & b', 0),
+    ('G(a -> Xb)', 2),
+    ('GF(X(c | d))', 3),
+    ('G(a) | F(b)', 1)])
+def test_temporal_depth(formula_str, depth):
+    '''
+    depth counts nested temporal operators
+    '''
+    assert temporal_depth(LTL_PARSER.parse(formula_str)) == depth
+
+
+@pytest.mark.parametrize('formula_str, safety', [
+    ('G(a -> Xb)', True),
+    ('!F(a)', True),
+    ('F(a) -> G(b)', True),
+    ('G(a) -> G(b)', False),
+    ('GF(a)', False),
+    ('G(a) = G(b)', False),
+    ('X(a = b)', True)])
+def test_safety(formula_str, safety):
+    '''
+    only G and X are allowed in negation normal form
+    '''
+    assert is_syntactic_safety(LTL_PARSER.parse(formula_str)) == safety
+
+
+def test_features(int_contract):
+    '''
+    features of the guarantee of a contract with an integer port
+    '''
+    features = FormulaFeatures(int_contract.guarantee_formula)
+
+    assert features.var_count == 3
+    assert features.int_count == 1
+    assert features.max_int_range == 1001
+    assert features.state_bits == 2 + 10
+    assert not features.is_safety
+
+
+def test_selection(int_contract):
+    '''
+    the first matching rule decides the engine, and rules can be overridden
+    '''
+    selector = EngineSelector()
+
+    assert selector.select(LTL_PARSER.parse('a -> b')).engine_name == 'bdd'
+    assert selector.select(int_contract.guarantee_formula).rule == 'wide_integers'
+
+    selector.override('wide_integers', engine_name='klive')
+    assert selector.select(int_contract.guarantee_formula).engine_name == 'klive'
+
+    selector.override('always_bmc', lambda f: True, 'bmc')
+    assert selector.select(LTL_PARSER.parse('a -> b')).engine_name == 'bmc'
+
+    out = StringIO()
+    selector.write_history(out)
+    assert out.getvalue().startswith('rule,engine')
+
+
+def test_bounded_history():
+    '''
+    only the most recent selection records are kept
+    '''
+    selector = EngineSelector(max_history=2)
+    records = [selector.select(LTL_PARSER.parse('a -> b')) for _ in range(3)]
+    for record in records:
+        selector._record(record)
+
+    assert list(selector.history) == records[1:]
+
+
+def test_canonical_form():
+    '''
+    formulae equal up to renaming have the same canonical form
+    '''
+    first = LTL_PARSER.parse('G(a -> Xb) & F(a)')
+    second = LTL_PARSER.parse('G(c -> Xd) & F(c)')
+    third = LTL_PARSER.parse('G(c -> Xd) & F(d)')
+
+    assert canonical_form(first) == canonical_form(second)
+    assert canonical_form(first) != canonical_form(third)
+
+
+@pytest.mark.parametrize('formula_str, pieces', [
+    ('a & b & c', 3),
+    ('G(a & b)', 2),
+    ('a -> (b & Xc)', 2),
+    ('!(a | b)', 2),
+    ('a | (b & c)', 1)])
+def test_split_consequent(formula_str, pieces):
+    '''
+    conjunctions are split, also below G and implications
+    '''
+    assert len(split_consequent(LTL_PARSER.parse(formula_str))) == pieces
+
+
+def test_cached_obligations():
+    '''
+    cached obligations do not need a solver
+    '''
+    cache = ObligationCache()
+    obligations = split_consequent(LTL_PARSER.parse('GF(a -> Xb) & GF(c)'))
+    for formula in obligations:
+        cache.put(cache.key(formula), True)
+
+    assert verify_obligations(obligations, tool_location='/nonexistent', cache=cache)
+    assert cache.hits == 2
+
+    cache.put(cache.key(obligations[1]), False)
+    assert not verify_obligations(obligations, tool_location='/nonexistent',
+                                  cache=cache)
+
+
+def test_bounded_obligation_cache():
+    '''
+    the least recently used verdicts are evicted first
+    '''
+    cache = ObligationCache(max_entries=2)
+    cache.put('a', True)
+    cache.put('b', True)
+    assert cache.get('a')
+
+    cache.put('c', False)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c') is False
+
+
+@pytest.mark.parametrize('formula_str, verdict', [
+    ('true -> true', True),
+    ('G(a) -> G(a)', True),
+    ('(G(a) & F(b)) -> F(b)', True),
+    ('a | !a', True),
+    ('G(false) | a', None),
+    ('X(a & !a)', False),
+    ('false -> G(a)', True),
+    ('a -> b', None),
+    ('(a = a) & (true -> F(false))', False)])
+def test_fold_constants(formula_str, verdict):
+    '''
+    trivial formulae are decided syntactically
+    '''
+    assert fold_constants(LTL_PARSER.parse(formula_str)) == verdict
+
+
+def test_fast_path_skips_solver():
+    '''
+    a trivial check does not start nuxmv
+    '''
+    decided = FAST_PATH_STATS['constant_folding']
+
+    assert verify_tautology(LTL_PARSER.parse('true -> true'),
+                            tool_location='/nonexistent')
+    assert FAST_PATH_STATS['constant_folding'] == decided + 1
+
+
+@pytest.mark.parametrize('formula_str, verdict', [
+    ('a -> (a | b)', True),
+    ('a -> b', False),
+    ('(G(a -> b) & G(b -> c)) -> G(a -> c)', True),
+    ('G(a) -> F(a)', True),
+    ('F(a) -> G(a)', False),
+    ('!(a & G(!a))', True),
+    ('G(a) | G(!a)', False),
+    ('G(a -> Xb)', None),
+    ('GF(a)', None)])
+def test_propositional(formula_str, verdict):
+    '''
+    propositional formulae and Boolean combinations of G/F atoms are
+    decided with BDDs
+    '''
+    assert decide_propositional(LTL_PARSER.parse(formula_str)) == verdict
+
+
+@pytest.mark.parametrize('guarantee, verdict', [
+    ('G(x + y <= 20)', True),
+    ('G(x + y < 20)', False),
+    ('G(x > 5 -> x / 2 >= 3)', True),
+    ('G(x * 2 = y -> y >= x)', True)])
+def test_propositional_integers(guarantee, verdict):
+    '''
+    integer literals are bit-blasted
+    '''
+    contract = Contract('I', [('x', 0, 10), ('y', 0, 10)], ['b'], 'true', guarantee,
+                        saturated=False)
+
+    assert decide_propositional(contract.guarantee_formula) == verdict
+
+
+@pytest.mark.parametrize('formula_str, fragment', [
+    ('a -> b', 'propositional'),
+    ('G(a -> Xb)', 'safety'),
+    ('F(a) | X(b)', 'cosafety'),
+    ('G(a) -> F(b)', 'cosafety'),
+    ('GF(a)', 'general')])
+def test_temporal_class(formula_str, fragment):
+    '''
+    first syntactic fragment of a formula
+    '''
+    assert temporal_class(LTL_PARSER.parse(formula_str)) == fragment
+
+
+@pytest.mark.parametrize('formula_str, verdict', [
+    ('G(a -> Xb) -> G(a -> X(b | c))', True),
+    ('G(a -> Xb)', False),
+    ('(G(a -> Xb) & G(b -> Xc)) -> G(a -> XXc)', True),
+    ('F(a) | F(!a)', True),
+    ('X(a) -> F(a)', True),
+    ('F(a & Xb)', False),
+    ('G(a) -> F(a)', True),
+    ('(G(a) | F(b)) -> (F(b) | a)', True),
+    ('F(b) -> G(b)', False),
+    ('GF(a) -> GF(a)', None)])
+def test_progression(formula_str, verdict):
+    '''
+    obligation formulae are decided by explicit-state progression
+    '''
+    assert decide_progression(LTL_PARSER.parse(formula_str)) == verdict
@@ -0,0 +1,207 @@
+'''
+This module tests the evaluation of formulae on lasso traces
+
+author: Antonio Iannopollo
+'''
+
+import pytest
+from StringIO import StringIO
+from pycolite.contract import Contract
+from pycolite.lasso import Lasso, evaluate, evaluate_positions, LassoFalsifier
+from pycolite.nuxmv import NuxmvRefinementStrategy, trace_parser, write_model
+from pycolite.counterexamples import CounterexampleBank
+from pycolite.parser.parser import LTL_PARSER
+
+
+def _lasso(formula, rows, loop_start):
+    '''
+    builds a lasso on the literals of formula from a dictionary of
+    base names and values
+    '''
+    literals = dict([(l.base_name, l.unique_name)
+                     for (_, l) in formula.get_literal_items()])
+    length = len(rows.values()[0])
+
+    return Lasso([{literals[name]: values[index] for (name, values) in rows.items()}
+                  for index in range(length)], loop_start)
+
+
+@pytest.mark.parametrize('formula_str, rows, loop_start, expected', [
+    ('G(a)', {'a': [True, True]}, 1, True),
+    ('G(a)', {'a': [True, False]}, 0, False),
+    ('F(a)', {'a': [False, True]}, 1, True),
+    ('GF(a)', {'a': [True, False, False]}, 1, False),
+    ('GF(a)', {'a': [False, True, False]}, 1, True),
+    ('X(a) & !a', {'a': [False, True]}, 0, True),
+    ('G(a -> Xb)', {'a': [True, False], 'b': [False, True]}, 0, True),
+    ('G(x + 1 >= y)', {'x': [1, 2], 'y': [2, 3]}, 0, True),
+    ('F(x / 2 <= 0)', {'x': [3, -1]}, 1, True)])
+def test_evaluate(formula_str, rows, loop_start, expected):
+    '''
+    evaluation on small lassos
+    '''
+    formula = LTL_PARSER.parse(formula_str)
+
+    assert evaluate(formula, _lasso(formula, rows, loop_start)) == expected
+
+
+def test_positions():
+    '''
+    X wraps around the loop
+    '''
+    formula = LTL_PARSER.parse('X(a)')
+    lasso = _lasso(formula, {'a': [False, False, True]}, 1)
+
+    assert evaluate_positions(formula, lasso) == [False, True, False]
+
+
+def test_falsifier():
+    '''
+    a wrong refinement is refuted without calling nuxmv, and the witness
+    is replayed on new copies of the contracts
+    '''
+    abstract = Contract('A', ['a'], ['b'], 'true', 'G(b)')
+    refined = Contract('R', ['a'], ['b'], 'true', 'G(a -> b)')
+    falsifier = LassoFalsifier(seed=1)
+
+    strategy = NuxmvRefinementStrategy(refined, tool_location='/nonexistent',
+                                       falsifier=falsifier)
+    assert not strategy.check_refinement(abstract)
+    assert len(falsifier.seen) == 1
+
+    strategy = NuxmvRefinementStrategy(refined.copy(), tool_location='/nonexistent',
+                                       falsifier=falsifier)
+    assert not strategy.check_refinement(abstract.copy())
+    assert falsifier.replayed_witnesses == 1
+
+
+NUXMV_TRACE = '''*** This is nuXmv 1.1.1
+-- specification (G a_1 -> G b_1)  is false
+-- as demonstrated by the following execution sequence
+Trace Description: LTL Counterexample
+Trace Type: Counterexample
+  -> State: 1.1 <-
+    a_1 = TRUE
+    b_1 = TRUE
+    x_2 = 3
+  -- Loop starts here
+  -> State: 1.2 <-
+    b_1 = FALSE
+  -> State: 1.3 <-
+    x_2 = -1
+  -> State: 1.4 <-
+    x_2 = 3
+'''
+
+
+def test_trace_parser():
+    '''
+    only changed variables are printed, and the last state repeats the
+    first state of the loop
+    '''
+    lasso = trace_parser(NUXMV_TRACE)
+
+    assert lasso.loop_start == 1
+    assert lasso.values('b_1') == [True, False, False]
+    assert lasso.values('x_2') == [3, 3, -1]
+    assert trace_parser('-- specification G a_1  is true\n') is None
+
+
+def test_short_names():
+    '''
+    the model uses short names, which are mapped back to unique names in
+    counterexamples
+    '''
+    contract = Contract('S', [('x', 0, 3)], ['b'], 'true', 'G(b -> x > 1)')
+    formula = contract.guarantee_formula
+    model = StringIO()
+
+    (var_names, solver_names) = write_model(model, formula,
+                                            [contract.x.unique_name])
+
+    assert var_names == ['v0', 'v1']
+    assert solver_names == {'v0': contract.x.unique_name,
+                            'v1': contract.b.unique_name}
+    assert contract.x.unique_name not in model.getvalue().split('LTLSPEC')[1]
+
+    trace = NUXMV_TRACE.replace('b_1', 'v1').replace('x_2', 'v0')
+    lasso = trace_parser(trace, solver_names)
+    assert lasso.values(contract.x.unique_name) == [3, 3, -1]
+
+
+def test_literals_sharing_names():
+    '''
+    distinct literals with the same unique name are distinct variables of
+    the model
+    '''
+    contract = Contract('S', ['a'], ['b'], 'true', 'G(a -> b)')
+    contract.b.literal.unique_name = contract.a.unique_name
+    model = StringIO()
+
+    (var_names, solver_names) = write_model(model, contract.guarantee_formula)
+
+    assert len(var_names) == 2
+    assert solver_names.values() == [contract.a.unique_name] * 2
+    assert 'v0' in model.getvalue().split('LTLSPEC')[1]
+    assert 'v1' in model.getvalue().split('LTLSPEC')[1]
+
+
+def test_counterexample_bank():
+    '''
+    a counterexample found for a candidate refutes another candidate
+    checked against a copy of the same abstract contract
+    '''
+    abstract = Contract('A', ['a'], ['b'], 'true', 'G(b)')
+    refined = Contract('R', ['a'], ['b'], 'true', 'G(a -> b)')
+    bank = CounterexampleBank()
+
+    trace = NUXMV_TRACE.replace('a_1', refined.a.unique_name) \
+            .replace('b_1', refined.b.unique_name)
+    bank.store(abstract, trace_parser(trace), {refined.a.unique_name: 'a',
+                                               refined.b.unique_name: 'b'})
+
+    other = Contract('R2', ['a'], ['b'], 'true', 'G(a -> X(!b))')
+    strategy = NuxmvRefinementStrategy(other, tool_location='/nonexistent',
+                                       counterexample_bank=bank)
+    assert not strategy.check_refinement(abstract.copy())
+    assert bank.replayed == 1
+
+
+@pytest.mark.parametrize('inputs, formula_str', [
+    (['a', 'b'], 'G(a -> Xb)'),
+    (['a', 'b'], 'GF(a) -> F(b & X(!a))'),
+    ([('x', -2, 5), ('y', 0, 3)], 'G(x + y >= 3) | F(x / y < 2)'),
+    (['a', 'b'], 'X(X(a)) = F(!b)')])
+def test_batch_evaluation(inputs, formula_str):
+    '''
+    the vectorized evaluator agrees with the scalar one
+    '''
+    np = pytest.importorskip('numpy')
+    from pycolite.batch_evaluation import random_batch, evaluate_batch
+
+    formula = Contract('C', inputs, ['o'], 'true', formula_str,
+                       saturated=False).guarantee_formula
+    literals = [literal for (_, literal) in formula.get_literal_items()]
+    batch = random_batch(literals, 200, 5, np.random.RandomState(0))
+
+    (values, valid) = evaluate_batch(formula, batch)
+    for index in range(len(batch)):
+        if valid[index]:
+            assert values[index] == evaluate(formula, batch.lasso(index))
+
+
+def test_batch_falsifier():
+    '''
+    the batch falsifier refutes a wrong refinement
+    '''
+    pytest.importorskip('numpy')
+    from pycolite.batch_evaluation import BatchLassoFalsifier
+
+    abstract = Contract('A', [('x', 0, 10)], ['b'], 'true', 'G(b | x > 8)')
+    refined = Contract('R', [('x', 0, 10)], ['b'], 'true', 'G(b | x > 2)')
+    falsifier = BatchLassoFalsifier(seed=1)
+
+    strategy = NuxmvRefinementStrategy(refined, tool_location='/nonexistent',
+                                       falsifier=falsifier)
+    assert not strategy.check_refinement(abstract)
+    assert falsifier.witnesses_found == 1
@@ -0,0 +1,126 @@
+'''
+This module tests contract fingerprints and libraries
+
+author: Antonio Iannopollo
+'''
+
+import os
+import subprocess
+import sys
+import pycolite
+from pycolite.contract import Contract
+from pycolite.fingerprint import fingerprint
+from pycolite.library import ContractLibrary
+from pycolite.packed_library import write_packed_library, PackedLibrary
+
+
+def _contract(name='C', guarantee='G(a -> Xb)', upper=10):
+    '''
+    builds a contract with an integer input
+    '''
+    return Contract(name, [('x', 0, upper), 'a'], ['b'], 'G(x > 3)', guarantee)
+
+
+def test_fingerprint():
+    '''
+    fingerprints do not depend on creation order and unique names
+    '''
+    contract = _contract()
+
+    assert fingerprint(contract) == fingerprint(_contract('D'))
+    assert fingerprint(contract) == fingerprint(contract.copy())
+    assert fingerprint(contract) != fingerprint(_contract(guarantee='G(a -> b)'))
+    assert fingerprint(contract) != fingerprint(_contract(upper=11))
+
+    #connections are not part of the fingerprint
+    connected = _contract()
+    connected.connect_to_port(connected.b, _contract().b)
+    assert fingerprint(contract) == fingerprint(connected)
+
+
+def test_library_deduplication():
+    '''
+    duplicated contracts are stored once
+    '''
+    library = ContractLibrary([_contract(), _contract('D')])
+    other = _contract(guarantee='F(b)')
+    stored = library.add(other)
+
+    assert stored is other
+    assert len(library) == 2
+    assert library.duplicates == 1
+    assert _contract('E') in library
+
+
+def test_refinement_candidates():
+    '''
+    candidates need enough ports of each role and type
+    '''
+    abstract = Contract('A', ['a'], ['b'], 'true', 'G(b)')
+    library = ContractLibrary([_contract(),
+                               Contract('B', ['a'], ['b', 'c'], 'true', 'G(b & c)'),
+                               Contract('I', [('a', 0, 3)], ['b'], 'true', 'G(b)'),
+                               Contract('O', ['a', 'c'], [], 'true', 'G(a)')])
+
+    assert set([c.base_name for c in library.refinement_candidates(abstract)]) == \
+            set(['C', 'B'])
+    assert library.refinement_candidates(abstract, exact=True) == []
+
+    exact = Contract('E', ['d'], ['e', 'f'], 'true', 'G(e)')
+    assert [c.base_name for c in library.refinement_candidates(exact, exact=True)] == ['B']
+    assert sorted(library.sizes) == [(1, 1), (1, 2), (2, 0), (2, 1)]
+
+
+def test_packed_library(tmpdir):
+    '''
+    a packed library only decodes the requested contracts
+    '''
+    library = ContractLibrary([_contract(), _contract('D'), _contract(upper=11),
+                               Contract('B', ['a'], ['b'], 'true', 'G(b)')])
+    path = str(tmpdir.join('library.pclb'))
+
+    assert write_packed_library(library, path) == 3
+
+    packed = PackedLibrary(path)
+    assert len(packed) == 3
+    assert not packed.materialized
+
+    candidates = packed.refinement_candidates(_contract(), exact=True)
+    assert len(candidates) == 1
+    assert len(packed.materialized) == 1
+    assert all([candidate in library for candidate in candidates])
+    assert packed.get(fingerprint(_contract(upper=11))).x.l_type.upper == 11
+    assert _contract() in packed
+    packed.close()
+
+
+#decodes a packed library in a new process, after parsing new contracts
+_FRESH_POOL_SCRIPT = """
+import sys
+from pycolite.contract import Contract
+from pycolite.packed_library import PackedLibrary
+library = PackedLibrary(sys.argv[1])
+names = set()
+for _ in range(5):
+    contract = Contract('packed', ['packed_in'], ['packed_out'], 'true', 'G(packed_out)')
+    names.update([contract.unique_name] + [port.unique_name for port
+                                           in contract.ports_dict.values()])
+decoded = library.contract(0)
+decoded_names = set([decoded.unique_name] + [port.unique_name for port
+                                             in decoded.ports_dict.values()])
+print len(names), len(names & decoded_names)
+"""
+
+
+def test_packed_names_reserved(tmpdir):
+    '''
+    contracts created by a reader do not take the names of the packed ones
+    '''
+    contract = Contract('packed', ['packed_in'], ['packed_out'], 'true', 'G(packed_out)')
+    path = str(tmpdir.join('library.pclb'))
+    write_packed_library([contract], path)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(pycolite.__file__)))
+    output = subprocess.check_output([sys.executable, '-c', _FRESH_POOL_SCRIPT, path],
+                                     cwd=root)
+    assert output.split() == ['15', '0']
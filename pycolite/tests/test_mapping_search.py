@@ -0,0 +1,45 @@
+'''
+This module tests the automatic search of refinement mappings
+
+author: Antonio Iannopollo
+'''
+
+from pycolite.contract import Contract
+from pycolite.mapping_search import (symmetry_classes, enumerate_mappings,
+                                     find_refinement_mapping)
+
+
+def test_symmetry_classes():
+    '''
+    ports interchangeable in the formulae are in the same class
+    '''
+    contract = Contract('C', ['a', 'b', 'c'], ['d'], 'true', 'G(a & b -> (c | d))')
+    classes = symmetry_classes(contract).values()
+
+    assert sorted(classes) == [[['a', 'b'], ['c']], [['d']]]
+
+
+def test_enumerate_mappings():
+    '''
+    one mapping for each class of symmetric mappings
+    '''
+    abstract = Contract('A', ['a', 'b'], ['c'], 'true', 'G(a & b -> c)')
+    refined = Contract('R', ['x', 'y', 'z'], ['c'], 'true', 'G(x & y & z -> c)')
+    asymmetric = Contract('S', ['x', 'y', 'z'], ['c'], 'true', 'G(x -> Xy) & G(z -> c)')
+
+    assert len(list(enumerate_mappings(refined, abstract))) == 1
+    assert len(list(enumerate_mappings(asymmetric, abstract))) == 3
+    assert list(enumerate_mappings(abstract, refined)) == []
+
+
+def test_find_refinement_mapping():
+    '''
+    the first mapping which verifies is returned
+    '''
+    abstract = Contract('A', ['a'], ['b'], 'true', 'G(a -> b)')
+    refined = Contract('R', ['p', 'q'], ['r'], 'true', 'G(p -> r)')
+
+    mapping = find_refinement_mapping(refined, abstract)
+
+    assert set([(port_a.base_name, port_b.base_name)
+                for (port_a, port_b) in mapping.mapping]) == set([('p', 'a'), ('r', 'b')])
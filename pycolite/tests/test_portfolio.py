@@ -0,0 +1,163 @@
+'''
+This module tests the portfolio of engines, on fake tool processes
+
+author: Antonio Iannopollo
+'''
+
+from threading import Event
+import pytest
+from pycolite.contract import Contract
+from pycolite import nuxmv
+from pycolite.nuxmv import NUXMV_ENGINES, verify_tautology, InconclusiveVerdictError
+from pycolite.parser.parser import LTL_PARSER
+from pycolite.portfolio import (race_tautology, PortfolioRefinementStrategy,
+                                PortfolioConsistencyStrategy, PortfolioError)
+
+
+class _FakeProcess(object):
+    '''
+    ToolProcess returning result. A blocking process only returns when it
+    is killed, with no verdict
+    '''
+
+    def __init__(self, result, blocking=False):
+        '''
+        constructor
+        '''
+        self.result = result
+        self.blocking = blocking
+        self.killed = False
+        self.released = Event()
+
+    def wait(self):
+        '''
+        returns the result, or waits to be killed
+        '''
+        if self.blocking:
+            self.released.wait(10)
+            return None
+        return self.result
+
+    def kill(self):
+        '''
+        kills the process
+        '''
+        self.killed = True
+        self.released.set()
+
+
+class _FakeEngine(object):
+    '''
+    engine starting a _FakeProcess, or raising OSError if process is None
+    '''
+
+    def __init__(self, process):
+        '''
+        constructor
+        '''
+        self.process = process
+        self.started = 0
+
+    def start(self, formula, prefix='', tool_location=None, delete_file=True,
+              variable_order=None):
+        '''
+        starts the fake process
+        '''
+        self.started += 1
+        if self.process is None:
+            raise OSError('engine not installed')
+        return self.process
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    '''
+    installs fake engines, by name
+    '''
+    def install(**processes):
+        '''
+        registers a _FakeEngine for each process
+        '''
+        fakes = {}
+        for (name, process) in processes.items():
+            fakes[name] = _FakeEngine(process)
+            monkeypatch.setitem(NUXMV_ENGINES, name, fakes[name])
+        return fakes
+
+    return install
+
+
+#formula not decided by the fast paths
+FORMULA = 'G(a -> X(b)) -> G(F(b))'
+
+
+def test_first_verdict_wins(engines):
+    '''
+    the first definitive verdict is returned and the other engines are
+    killed
+    '''
+    fast = _FakeProcess(False)
+    slow = _FakeProcess(True, blocking=True)
+    engines(fast=fast, slow=slow)
+
+    assert race_tautology(LTL_PARSER.parse(FORMULA), ('fast', 'slow')) is False
+    assert slow.killed
+
+
+def test_no_definitive_verdict(engines):
+    '''
+    a race in which no engine gives a verdict fails
+    '''
+    engines(first=_FakeProcess(None), second=_FakeProcess(None))
+
+    with pytest.raises(PortfolioError):
+        race_tautology(LTL_PARSER.parse(FORMULA), ('first', 'second'))
+
+
+def test_engine_not_started(engines):
+    '''
+    engines which cannot be started are skipped
+    '''
+    fakes = engines(missing=None, working=_FakeProcess(True))
+
+    assert race_tautology(LTL_PARSER.parse(FORMULA), ('missing', 'working'))
+    assert fakes['missing'].started == 1
+
+    with pytest.raises(PortfolioError):
+        race_tautology(LTL_PARSER.parse(FORMULA), ('missing',))
+
+
+def test_portfolio_strategies(engines):
+    '''
+    strategies race the engines on their checks, and the strategy given to
+    a refinement check is not rebound
+    '''
+    fakes = engines(fast=_FakeProcess(False))
+    contract = Contract('P', ['a'], ['b'], 'true', 'G(a -> X(b)) & G(F(a))')
+    abstract = Contract('Q', ['a'], ['b'], 'true', 'G(F(b))')
+
+    assert PortfolioConsistencyStrategy(contract, engines=('fast',)).check_consistency()
+
+    fakes['fast'].process.result = True
+    abstract.connect_to_port(abstract.a, contract.a)
+    abstract.connect_to_port(abstract.b, contract.b)
+    strategy = PortfolioRefinementStrategy(contract, engines=('fast',))
+    assert contract.is_refinement(abstract, strategy_obj=strategy)
+    assert strategy.contract is contract
+    assert fakes['fast'].started == 2
+
+
+def test_inconclusive_engine(engines, monkeypatch):
+    '''
+    formulae on which an engine gives no verdict are checked again with the
+    default engine, and the check fails if it gives no verdict either
+    '''
+    fakes = engines(bmc=_FakeProcess(None), complete=_FakeProcess(False))
+    monkeypatch.setattr(nuxmv, 'DEFAULT_ENGINE', fakes['complete'])
+
+    assert verify_tautology(LTL_PARSER.parse(FORMULA), engine=fakes['bmc']) is False
+    assert fakes['complete'].started == 1
+
+    fakes['complete'].process.result = None
+    with pytest.raises(InconclusiveVerdictError):
+        verify_tautology(LTL_PARSER.parse(FORMULA), engine=fakes['bmc'])
@@ -0,0 +1,147 @@
+'''
+This module tests the inference of refinement verdicts
+
+author: Antonio Iannopollo
+'''
+
+from pycolite.contract import Contract, RefinementMapping
+from pycolite.refinement_graph import RefinementLattice
+
+
+def test_transitivity():
+    '''
+    A <= B and B <= C imply A <= C
+    '''
+    lattice = RefinementLattice()
+    lattice.record_keys('A', 'B', True)
+    lattice.record_keys('B', 'C', True)
+
+    assert lattice.lookup_keys('A', 'C')
+    assert lattice.lookup_keys('C', 'A') is None
+    assert lattice.lookup_keys('B', 'B')
+
+
+def test_contrapositive():
+    '''
+    A <= B and not A <= C imply not B <= C
+    '''
+    lattice = RefinementLattice()
+    lattice.record_keys('A', 'B', True)
+    lattice.record_keys('A', 'C', False)
+
+    assert lattice.lookup_keys('B', 'C') is False
+    assert lattice.lookup_keys('C', 'B') is None
+
+    lattice.record_keys('D', 'C', True)
+    assert lattice.lookup_keys('B', 'D') is False
+
+
+class _RejectingStrategy(object):
+    '''
+    strategy disproving every refinement, without a solver
+    '''
+
+    def __init__(self):
+        '''
+        constructor
+        '''
+        self.contract = None
+
+    def check_refinement(self, abstract_contract):
+        '''
+        refinement check
+        '''
+        return False
+
+
+class _NameMatchingStrategy(_RejectingStrategy):
+    '''
+    strategy proving a refinement if and only if the ports with the same
+    name are connected
+    '''
+
+    def check_refinement(self, abstract_contract):
+        '''
+        refinement check
+        '''
+        return all([self.contract.ports_dict[name].literal is
+                    abstract_contract.ports_dict[name].literal
+                    for name in self.contract.port_names])
+
+
+def test_ports_matched_by_name():
+    '''
+    checks connect the ports by name, thus inferred verdicts agree with the
+    checked ones, regardless of the existing connections
+    '''
+    contracts = [Contract(name, ['a'], ['b'], 'true', 'G(b)') for name in 'ABC']
+    contracts[0].connect_to_port(contracts[0].b, contracts[1].b)
+
+    lattice = RefinementLattice()
+    assert lattice.check(contracts[0], contracts[1], strategy_obj=_NameMatchingStrategy())
+    assert lattice.check(contracts[0], contracts[2], strategy_obj=_NameMatchingStrategy())
+    assert lattice.inferred == 2
+
+    #contracts identified by object, so that verdicts are not inferred
+    lattice = RefinementLattice(key=id)
+    assert lattice.check(contracts[0], contracts[1], strategy_obj=_NameMatchingStrategy())
+    assert lattice.check(contracts[1], contracts[2], strategy_obj=_NameMatchingStrategy())
+    assert lattice.lookup(contracts[0], contracts[2])
+    assert lattice.check(contracts[0], contracts[2], strategy_obj=_NameMatchingStrategy())
+    assert (lattice.checked, lattice.inferred) == (2, 1)
+
+    lattice.clear()
+    assert lattice.check(contracts[0], contracts[2], strategy_obj=_NameMatchingStrategy())
+    assert lattice.checked == 1
+
+
+def test_connected_check():
+    '''
+    checks of contracts connected through ports with different names
+    neither use nor change the verdicts
+    '''
+    contracts = [Contract(name, ['a'], ['b'], 'true', 'G(b)') for name in 'AB']
+    contracts[0].connect_to_port(contracts[0].a, contracts[1].b)
+    lattice = RefinementLattice()
+    lattice.record(contracts[0], contracts[1], True)
+
+    assert not lattice.check(contracts[0], contracts[1],
+                             strategy_obj=_NameMatchingStrategy())
+    assert (lattice.checked, lattice.inferred) == (1, 0)
+    assert lattice.lookup(contracts[0], contracts[1])
+
+
+def test_inferred_check():
+    '''
+    inferred verdicts do not need a solver
+    '''
+    contracts = [Contract(name, ['a'], ['b'], 'true', guarantee)
+                 for (name, guarantee) in zip('ABC', ['G(b)', 'F(b)', 'true'])]
+    lattice = RefinementLattice()
+    lattice.record(contracts[0], contracts[1], True)
+    lattice.record(contracts[1], contracts[2], True)
+
+    assert lattice.check(contracts[0], contracts[2])
+    assert lattice.check(contracts[1], contracts[1])
+    assert lattice.inferred == 2
+    assert lattice.checked == 0
+
+
+def test_mapped_check():
+    '''
+    checks with an explicit mapping neither use nor change the verdicts
+    '''
+    contracts = [Contract(name, ['a'], ['b'], 'true', guarantee)
+                 for (name, guarantee) in zip('AB', ['G(b)', 'F(b)'])]
+    lattice = RefinementLattice()
+    lattice.record(contracts[0], contracts[1], True)
+
+    mapping = RefinementMapping(contracts)
+    assert not lattice.check(contracts[0], contracts[1], mapping, _RejectingStrategy())
+    assert lattice.checked == 1
+    assert lattice.inferred == 0
+    assert lattice.lookup(contracts[0], contracts[1])
+
+    lattice.clear()
+    assert lattice.checked == 0
+    assert lattice.lookup(contracts[0], contracts[1]) is None
@@ -0,0 +1,94 @@
+'''
+This module tests the compact serialization of formulae and contracts
+
+author: Antonio Iannopollo
+'''
+
+import cPickle
+from StringIO import StringIO
+from pycolite.attribute import AttributeNamePool
+from pycolite.contract import Contract
+from pycolite.formula import Literal, Next, Conjunction
+from pycolite.formula_analysis import post_order, get_literals
+from pycolite.nuxmv import write_model
+from pycolite.serialization import formula_state, formula_from_state, FORMAT_VERSION
+from pycolite.types import Int
+
+
+def test_contract_round_trip():
+    '''
+    unpickled contracts have the same ports, names and formulae
+    '''
+    contract = Contract('A', ['a', ('x', 0, 5)], ['b'], 'G(a -> X(b)) & F(x > 2)',
+                        'G(b)')
+    copy = cPickle.loads(cPickle.dumps(contract, cPickle.HIGHEST_PROTOCOL))
+
+    assert copy.unique_name == contract.unique_name
+    assert copy.x.l_type == Int(0, 5)
+    assert copy.b.is_output
+    assert copy.assume_formula.generate() == contract.assume_formula.generate()
+    assert copy.guarantee_formula.generate() == contract.guarantee_formula.generate()
+
+    #formulae and ports share the same literals
+    assert copy.a.literal is copy.formulae_dict['a']
+    assert copy.b.literal is copy.formulae_dict['b']
+
+
+def test_round_trip_in_process():
+    '''
+    literals unpickled in the process which pickled them keep their names,
+    but are distinct variables of the models
+    '''
+    contract = Contract('A', ['a'], ['b'], 'true', 'G(a -> b)')
+    copy = cPickle.loads(cPickle.dumps(contract, cPickle.HIGHEST_PROTOCOL))
+    formula = Conjunction(contract.guarantee_formula, copy.guarantee_formula,
+                          merge_literals=False)
+
+    (var_names, solver_names) = write_model(StringIO(), formula)
+
+    assert copy.b.unique_name == contract.b.unique_name
+    assert copy.b.literal.uid != contract.b.literal.uid
+    assert len(var_names) == 4
+    assert sorted(solver_names.values()).count(contract.b.unique_name) == 2
+
+
+def test_merged_literals():
+    '''
+    literals merged by a connection are serialized once
+    '''
+    contract_a = Contract('A', ['a'], ['b'], 'true', 'G(a -> b)')
+    contract_b = Contract('B', ['b'], ['c'], 'true', 'G(b -> c)')
+    contract_b.connect_to_port(contract_b.b, contract_a.b)
+
+    copy = cPickle.loads(cPickle.dumps(contract_b, cPickle.HIGHEST_PROTOCOL))
+
+    assert copy.b.unique_name == contract_a.b.unique_name
+    assert copy.b.literal is copy.formulae_dict['b']
+
+
+def test_deep_formula():
+    '''
+    deep formulae are serialized without recursion
+    '''
+    formula = Literal('a')
+    for _ in range(5000):
+        formula = Next(formula)
+
+    copy = formula_from_state(formula_state(formula))
+
+    assert len(post_order(copy)) == 5001
+    assert [l.unique_name for l in get_literals(copy)] == \
+            [l.unique_name for l in get_literals(formula)]
+
+
+def test_reserved_names():
+    '''
+    names of decoded literals, e.g. written by another process, are not
+    generated again
+    '''
+    state = (FORMAT_VERSION, [('decoded', 'decoded_1000', None)], [0])
+    assert formula_from_state(state).unique_name == 'decoded_1000'
+
+    assert Literal('decoded').unique_name == 'decoded_1001'
+    with AttributeNamePool.scope(compact=True):
+        assert int(Literal('decoded').unique_name.split('_')[-1]) > 1000
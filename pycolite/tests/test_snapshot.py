@@ -0,0 +1,55 @@
+'''
+This module tests snapshots of libraries and cached verdicts
+
+author: Antonio Iannopollo
+'''
+
+from pycolite.attribute import Attribute, AttributeNamePool
+from pycolite.contract import Contract
+from pycolite.fingerprint import fingerprint
+from pycolite.ltl3ba import AutomatonCache
+from pycolite.obligations import ObligationCache
+from pycolite.refinement_graph import RefinementLattice
+from pycolite.snapshot import write_snapshot, load_snapshot
+
+
+def test_snapshot_round_trip(tmpdir):
+    '''
+    library and verdicts are restored, and contracts are decoded on demand
+    '''
+    abstract = Contract('A', ['a'], ['b'], 'true', 'G(a -> F(b))')
+    refined = Contract('R', ['a'], ['b'], 'true', 'G(a -> b)')
+    lattice = RefinementLattice()
+    lattice.record(refined, abstract, True)
+    lattice.record(abstract, refined, False)
+    obligations = ObligationCache()
+    obligations.put('G v0:BOOL', True)
+    path = str(tmpdir.join('service.snapshot'))
+
+    assert write_snapshot(path, [abstract, refined], lattice, obligations,
+                          AutomatonCache()) == 2
+
+    restored_obligations = ObligationCache()
+    snapshot = load_snapshot(path, obligation_cache=restored_obligations,
+                             automaton_cache=AutomatonCache())
+
+    assert len(snapshot.library) == 2
+    assert not snapshot.library.materialized
+    assert restored_obligations.get('G v0:BOOL') is True
+    assert snapshot.lattice.lookup(refined, abstract) is True
+    assert snapshot.lattice.lookup(abstract, refined) is False
+
+    restored = snapshot.library.get(fingerprint(refined))
+    assert restored.guarantee_formula.generate() == refined.guarantee_formula.generate()
+    snapshot.close()
+
+
+def test_restore_naming_state():
+    '''
+    names generated after a restore follow the restored counters
+    '''
+    AttributeNamePool.restore_naming_state({'names': {'restored': 100},
+                                            'uid': 0})
+
+    assert Attribute('restored').unique_name == 'restored_101'
+    assert AttributeNamePool.naming_state()['names']['restored'] == 101
@@ -8,7 +8,10 @@ Author: Antonio Iannopollo
 '''
 
 import os
+from collections import OrderedDict
 from ConfigParser import SafeConfigParser
+from subprocess import Popen, PIPE, STDOUT
+from threading import Thread
 import logging
 
 LOG = logging.getLogger()
@@ -70,3 +73,133 @@ def which(program):
     return None
 
 
+
+
+class ToolProcess(object):
+    '''
+    Wraps an external tool started in background on a set of temporary files.
+    The output of the tool is interpreted by parse_output, which receives the
+    tool output and its return code.
+    The temporary files are closed (and deleted, if so requested when they
+    were created) as soon as the tool terminates or it is killed.
+    After wait returns, the raw output of the tool is available in output.
+    '''
+
+    def __init__(self, cmd, temp_files, parse_output):
+        '''
+        starts the tool
+
+        :param cmd: command line to execute
+        :type cmd: list of strings
+        :param temp_files: temporary files used by the tool
+        :type temp_files: list of file objects
+        :param parse_output: function mapping (output, returncode) to a result
+        :type parse_output: callable
+        '''
+        self.cmd = cmd
+        self.temp_files = temp_files
+        self.parse_output = parse_output
+        self.killed = False
+        self.output = None
+
+        try:
+            self.process = Popen(cmd, stdout=PIPE, stderr=STDOUT)
+        except:
+            self._close_files()
+            raise
+
+    def wait(self):
+        '''
+        Waits for the tool to terminate and returns the parsed output
+        '''
+        try:
+            output, _ = self.process.communicate()
+        finally:
+            self._close_files()
+
+        self.output = output
+
+        return self.parse_output(output, self.process.returncode)
+
+    def kill(self):
+        '''
+        Terminates the tool, if still running
+        '''
+        self.killed = True
+        try:
+            self.process.kill()
+        except OSError:
+            #already terminated
+            pass
+
+    def _close_files(self):
+        '''
+        close (and possibly delete) temporary files
+        '''
+        for temp_file in self.temp_files:
+            try:
+                temp_file.close()
+            except OSError:
+                pass
+
+
+def wait_in_background(key, process, results):
+    '''
+    Waits for process in a new daemon thread. When the process terminates,
+    the tuple (key, result, error) is put in the results queue, where error
+    is the exception raised while waiting, if any.
+
+    :returns: the started thread
+    '''
+    def wait():
+        '''
+        thread body
+        '''
+        try:
+            results.put((key, process.wait(), None))
+        except Exception as error:
+            results.put((key, None, error))
+
+    thread = Thread(target=wait)
+    thread.daemon = True
+    thread.start()
+
+    return thread
+
+
+class LRUCache(OrderedDict):
+    '''
+    Dictionary holding at most max_entries items, or any number of items if
+    max_entries is None. When it is full, storing an item evicts the least
+    recently used one. Items are used when they are stored or read with
+    lookup
+    '''
+
+    def __init__(self, max_entries=None):
+        '''
+        constructor
+        '''
+        OrderedDict.__init__(self)
+        self.max_entries = max_entries
+
+    def lookup(self, key):
+        '''
+        Returns the value of key and marks it as the most recently used.
+        Raises KeyError if key is not stored
+        '''
+        value = OrderedDict.pop(self, key)
+        OrderedDict.__setitem__(self, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        '''
+        stores value as the most recently used item, evicting the least
+        recently used one if the cache is full
+        '''
+        if key in self:
+            OrderedDict.__delitem__(self, key)
+        OrderedDict.__setitem__(self, key, value)
+
+        if self.max_entries is not None:
+            while len(self) > self.max_entries:
+                self.popitem(last=False)
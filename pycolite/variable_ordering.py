@@ -0,0 +1,181 @@
+'''
+This module computes static BDD variable orderings from the structure of
+contracts.
+Variables are grouped by component, and components are chained so that
+connected components are next to each other, with the variables connecting
+them placed at the boundary.
+When more contracts are checked together (e.g., in a refinement check),
+their variables are interleaved by port name.
+
+Author: Antonio Iannopollo
+'''
+
+from pycolite.formula_analysis import conjuncts, get_literals
+
+
+def leaf_components(contract):
+    '''
+    Returns the list of non composite contracts used to obtain contract.
+    If contract is not a composition, the list contains only contract
+    '''
+    leaves = []
+    seen = set()
+    stack = [contract]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+
+        if current.origin_contracts:
+            stack.extend(sorted(current.origin_contracts.values(),
+                                key=lambda c: c.unique_name, reverse=True))
+        else:
+            leaves.append(current)
+
+    return leaves
+
+
+def component_groups(contract):
+    '''
+    Returns a list of groups of variables, one for each component of contract.
+    Each group is a list of pairs (port base name, literal unique name)
+    '''
+    leaves = leaf_components(contract)
+
+    if len(leaves) > 1:
+        return [_port_group(leaf) for leaf in leaves]
+
+    #copies of a composition do not keep their origin contracts, components
+    #are recovered from the conjuncts of the guarantees
+    port_names = {port.unique_name: name for (name, port)
+                  in contract.ports_dict.items()}
+
+    groups = []
+    for conjunct in conjuncts(contract.guarantee_formula):
+        group = [(port_names.get(literal.unique_name, literal.base_name),
+                  literal.unique_name) for literal in get_literals(conjunct)]
+        groups.append(sorted(group))
+
+    groups.append(sorted([(port_names.get(literal.unique_name, literal.base_name),
+                           literal.unique_name)
+                          for literal in get_literals(contract.assume_formula)]))
+
+    return groups
+
+
+def _port_group(contract):
+    '''
+    Returns the group of variables of a non composite contract: inputs first,
+    then outputs, then literals not associated to any port
+    '''
+    group = [(name, port.unique_name) for (name, port)
+             in sorted(contract.input_ports_dict.items())]
+    group += [(name, port.unique_name) for (name, port)
+              in sorted(contract.output_ports_dict.items())]
+
+    port_unique_names = set([unique_name for (_, unique_name) in group])
+    for formula in (contract.assume_formula, contract.guarantee_formula):
+        for literal in get_literals(formula):
+            if literal.unique_name not in port_unique_names:
+                port_unique_names.add(literal.unique_name)
+                group.append((literal.base_name, literal.unique_name))
+
+    return group
+
+
+def chain_groups(groups):
+    '''
+    Orders groups greedily, so that each group is followed by the remaining
+    group sharing the largest number of variables with it
+    '''
+    variables = [set([unique_name for (_, unique_name) in group]) for group in groups]
+    remaining = range(len(groups))
+
+    def shared(index, others):
+        '''
+        number of variables shared by group index and groups in others
+        '''
+        return sum([len(variables[index] & variables[other])
+                    for other in others if other != index])
+
+    #start from the most connected group
+    current = max(remaining, key=lambda index: (shared(index, remaining), -index))
+    chain = []
+    while True:
+        chain.append(current)
+        remaining.remove(current)
+        if not remaining:
+            break
+        current = max(remaining,
+                      key=lambda index: (len(variables[index] & variables[current]),
+                                         shared(index, remaining), -index))
+
+    return [groups[index] for index in chain]
+
+
+def contract_order(contract):
+    '''
+    Returns the ordered list of pairs (port base name, unique name) of the
+    variables of contract
+    '''
+    chain = [group for group in chain_groups(component_groups(contract)) if group]
+
+    order = []
+    emitted = set()
+    for (index, group) in enumerate(chain):
+        if index + 1 < len(chain):
+            next_variables = set([unique_name for (_, unique_name) in chain[index + 1]])
+        else:
+            next_variables = set()
+
+        #variables connected to the next component go last
+        for (name, unique_name) in sorted(group,
+                                          key=lambda item: item[1] in next_variables):
+            if unique_name not in emitted:
+                emitted.add(unique_name)
+                order.append((name, unique_name))
+
+    return order
+
+
+def variable_order(contracts):
+    '''
+    Returns a list of unique names, representing a variable ordering for
+    the formulae of the given contracts.
+    Variables of different contracts associated to ports with the same base
+    name are placed next to each other.
+    '''
+    orders = [contract_order(contract) for contract in contracts]
+    if not orders:
+        return []
+
+    others = []
+    for other_order in orders[1:]:
+        by_name = {}
+        for (name, unique_name) in other_order:
+            by_name.setdefault(name, []).append(unique_name)
+        others.append(by_name)
+
+    result = []
+    emitted = set()
+
+    def emit(unique_name):
+        '''
+        add unique_name to the result, if not there yet
+        '''
+        if unique_name not in emitted:
+            emitted.add(unique_name)
+            result.append(unique_name)
+
+    for (name, unique_name) in orders[0]:
+        emit(unique_name)
+        for by_name in others:
+            for other_unique_name in by_name.get(name, []):
+                emit(other_unique_name)
+
+    for other_order in orders[1:]:
+        for (_, unique_name) in other_order:
+            emit(unique_name)
+
+    return result
@@ -124,6 +124,7 @@ setup(
     extras_require = {
         'dev': ['check-manifest'],
         'test': ['pytest'],
+        'batch': ['numpy'],
     },
 
     # If there are data files included in your packages that need to be